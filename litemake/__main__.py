@@ -2,33 +2,528 @@ import typing
 
 import os
 import sys
+import argparse
+import subprocess
 
-from litemake.folders import ProjectFolder
-from litemake.compile import NodesCollector
-from litemake.printer import DefaultProgressPrinter
+from litemake.daemon import client
+from litemake.exceptions import litemakeError, litemakePgoError
+from litemake.printer import litemakePrinter as Printer
 
+# The modules that build the project are imported only when they are used, so
+# a build that is forwarded to a running daemon starts quickly.
+if typing.TYPE_CHECKING:
+    from litemake.folders import ProjectFolder  # pragma: no cover
+    from litemake.compile.graph import CompilationGraph  # pragma: no cover
+    from litemake.compile.graph import CompilationFileNode  # pragma: no cover
+    from litemake.compile.collect import NodesCollector  # pragma: no cover
+    from litemake.compile.status import NodeCompilationStatus  # pragma: no cover
+
+
+def summarize(
+    collector: "NodesCollector",
+    statuses: typing.Dict["CompilationFileNode", "NodeCompilationStatus"],
+) -> None:
+    """Prints the nodes that haven't been generated by the build: the nodes
+    that have failed (with their errors), the nodes that have been skipped
+    because they depend on them, and the nodes that haven't been built because
+    the build has been cancelled."""
+
+    from litemake.compile.status import NodeFailed, NodeSkipped, NodeUnbuilt
+
+    def paths(status: "NodeCompilationStatus") -> typing.List[str]:
+        return sorted(
+            os.path.relpath(n.dest) for n, s in statuses.items() if s is status
+        )
+
+    for node, status in statuses.items():
+        if status is NodeFailed:
+            error = collector.errors.get(node)
+            details = error.msg[1:] if error is not None else list()
+            Printer.error(
+                "\n".join([f"*failed:* {os.path.relpath(node.dest)}", *details])
+            )
+
+    skipped = paths(NodeSkipped)
+    if skipped:
+        Printer.warning(
+            "\n".join(
+                [f"*skipped:* {len(skipped)} nodes depend on failed nodes", *skipped]
+            )
+        )
+
+    unbuilt = paths(NodeUnbuilt)
+    if unbuilt:
+        Printer.warning(
+            "\n".join(
+                [f"*unbuilt:* {len(unbuilt)} nodes (the build was cancelled)", *unbuilt]
+            )
+        )
+
+
+def build(
+    project: "ProjectFolder",
+    *targets: typing.Tuple[str],
+    jobs: int = None,
+    graph: "CompilationGraph" = None,
+    max_load: float = None,
+    max_memory: float = None,
+    fail_fast: bool = False,
+) -> bool:
+    """Builds the given targets of the given project, and installs their
+    executables in the current working directory. Returns True if all the
+    nodes have been generated successfully. If the graph of the targets isn't
+    given, it is collected from the project. New jobs aren't started while
+    the load average or the memory usage percentage of the machine are above
+    the given limits. By default, every node that doesn't depend on a failed
+    node is still generated. If 'fail_fast' is True, the build is cancelled at
+    the first failure instead (see 'JobScheduler'). The jobs share the
+    jobserver of the parent make, if there is one (see 'jobserver.py')."""
+
+    from litemake.compile import NodesCollector, JobScheduler
+    from litemake.compile.jobserver import jobserver
+    from litemake.compile.resources import ResourceLimits
+    from litemake.compile.status import NodePassed
+    from litemake.printer import DefaultProgressPrinter
+
+    if graph is None:
+        graph = project.collect(*targets)
+
+    collector = NodesCollector(graph)
+    progress = DefaultProgressPrinter(collector.count_total, collector.count_outdated)
+
+    scheduler = JobScheduler(
+        collector,
+        jobs=jobs,
+        batch=project.settings.batch_size,
+        pools=project.settings.pools,
+        limits=ResourceLimits(max_load=max_load, max_memory=max_memory),
+        fail_fast=fail_fast,
+    )
+    statuses = dict()
+    try:
+        with jobserver(scheduler.jobs) as server:
+            scheduler.jobserver = server
+            for node, status in scheduler.run():
+                progress.register_status(node, status)
+                print(progress)
+                statuses[node] = status
+        failed = {node for node, s in statuses.items() if s is not NodePassed}
+        success = not failed
+        project.install(graph, exclude=failed)
+        summarize(collector, statuses)
+    finally:
+        if scheduler.killed:
+            Printer.warning(
+                f"*killed:* {scheduler.killed} jobs have been killed (out of "
+                f"memory?), and have been retried with {scheduler.jobs} jobs"
+            )
+        if project.cache is not None:
+            stats = project.cache.session
+            Printer.info(
+                f"*cache:* {stats.hits} hits ({stats.remote_hits} remote), "
+                f"{stats.misses} misses"
+            )
+        project.close()
+
+    return success
 
-def make(*targets: typing.Tuple[str]):
-    project = ProjectFolder(os.getcwd())
-    graphs = project.collect(*targets)
 
-    for graph in graphs:
-        collector = NodesCollector(graph)
-        progress = DefaultProgressPrinter(
-            collector.count_total, collector.count_outdated
+def make(
+    *targets: typing.Tuple[str],
+    jobs: int = None,
+    profile: str = None,
+    max_load: float = None,
+    max_memory: float = None,
+    fail_fast: bool = False,
+) -> bool:
+    from litemake.folders import ProjectFolder
+
+    project = ProjectFolder(os.getcwd(), profile=profile)
+    return build(
+        project,
+        *targets,
+        jobs=jobs,
+        max_load=max_load,
+        max_memory=max_memory,
+        fail_fast=fail_fast,
+    )
+
+
+def watch(
+    *targets: typing.Tuple[str],
+    jobs: int = None,
+    profile: str = None,
+    max_load: float = None,
+    max_memory: float = None,
+    fail_fast: bool = False,
+) -> bool:
+    """Builds the given targets, and builds them again whenever a change that
+    affects them is made in the project folder, until interrupted. The graph
+    and the state of the files are kept between builds (see 'BuildSession').
+    Only files inside the project folder are watched, so changes in headers
+    of include paths outside of it don't start a build. Returns False if file
+    system notifications aren't available."""
+
+    from litemake.daemon.watcher import FileWatcher
+
+    if not FileWatcher.available():
+        litemakeError(
+            "*watch error:*", "file system notifications aren't available"
+        ).print()
+        return False
+
+    from litemake.daemon.server import BuildSession
+
+    session = BuildSession(os.getcwd())
+    try:
+        while True:
+            try:
+                session.build(
+                    *targets,
+                    jobs=jobs,
+                    profile=profile,
+                    max_load=max_load,
+                    max_memory=max_memory,
+                    fail_fast=fail_fast,
+                )
+            except litemakeError as error:
+                error.print()
+            Printer.info("*watching:* waiting for changes (press Ctrl+C to stop)")
+            session.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        session.close()
+    return True
+
+
+def forward(
+    *targets: typing.Tuple[str],
+    jobs: int = None,
+    profile: str = None,
+    max_load: float = None,
+    max_memory: float = None,
+    fail_fast: bool = False,
+) -> typing.Optional[bool]:
+    """Builds the given targets using the daemon of the project in the current
+    working directory. Returns `None` if the daemon isn't running, or if it
+    has been started with another environment (and the build should run in
+    this process instead)."""
+
+    message = {
+        "command": "build",
+        "environment": client.environment_digest(),
+        "targets": targets,
+        "jobs": jobs,
+        "profile": profile,
+        "max_load": max_load,
+        "max_memory": max_memory,
+        "fail_fast": fail_fast,
+    }
+    answer = client.request(os.getcwd(), message)
+    if answer is None:
+        return None
+    if answer.get("environment"):
+        Printer.warning(
+            "*daemon:* the daemon has been started with another environment "
+            "(or 'PATH'), so the build runs without it (restart it with "
+            "'litemake daemon stop' and 'litemake daemon start')"
+        )
+        return None
+    if "error" in answer:
+        raise litemakeError(*answer["error"])
+    return answer["result"]
+
+
+def daemon(action: str) -> None:
+    """Starts, stops or checks the daemon of the project in the current
+    working directory (see 'litemake.daemon'). The 'run' action runs the
+    daemon in the foreground."""
+
+    if not client.available():
+        raise litemakeError(
+            "*daemon error:*", "the daemon isn't supported on this platform"
         )
 
-        node = collector.pop_next()
-        while node is not None:
-            status = collector.generate(node)
-            progress.register_status(node, status)
-            node = collector.pop_next()
-            print(progress)
+    home = os.getcwd()
+    if action == "run":
+        from litemake.daemon.server import serve
+
+        serve(home)
+        return
+
+    if action == "start":
+        answer = client.request(home, {"command": "status"})
+        if answer is not None:
+            Printer.info(f"*daemon:* already running (pid {answer['pid']})")
+        elif not client.spawn(home):
+            raise litemakeError("*daemon error:*", "the daemon has failed to start")
+        else:
+            Printer.info("*daemon:* started")
+        return
+
+    answer = client.request(home, {"command": action})
+    if answer is None:
+        Printer.info("*daemon:* not running")
+    elif action == "stop":
+        Printer.info("*daemon:* stopped")
+    else:
+        Printer.info(f"*daemon:* running (pid {answer['pid']})")
+
+
+def pgo(
+    target: str,
+    command: typing.List[str],
+    jobs: int = None,
+    profile: str = None,
+) -> None:
+    """Builds the given target with profile-guided optimization: builds an
+    instrumented version of the target, runs the given training command (that
+    should run the instrumented executable), merges the profile data that it
+    writes, and builds the optimized version of the target. The instrumented
+    and optimized versions are built in separate folders, so every stage is
+    incremental, and the optimized objects are compiled again only if the
+    profile data has changed."""
+
+    from litemake.folders import ProjectFolder
+
+    instrumented = ProjectFolder(os.getcwd(), profile=profile, pgo="generate")
+    if not build(instrumented, target, jobs=jobs):
+        raise litemakePgoError("the instrumented build has failed")
+
+    optimized = ProjectFolder(os.getcwd(), profile=profile, pgo="use")
+    compiler = optimized.create_compiler()
+    compiler.clear_profiles(instrumented.output.objects)
+
+    Printer.info(f"*training:* {' '.join(command)}")
+    if subprocess.run(command).returncode != 0:
+        raise litemakePgoError("the training command has failed")
+
+    data = compiler.merge_profiles(
+        instrumented.output.objects, optimized.output.objects
+    )
+    if not data:
+        raise litemakePgoError("the training command didn't write profile data")
+    optimized.update_pgo_stamp(data)
+
+    if not build(optimized, target, jobs=jobs):
+        raise litemakePgoError("the optimized build has failed")
+
+
+def cache_stats() -> None:
+    """Prints the statistics of the compilation cache of the project in the
+    current working directory."""
+
+    from litemake.folders import ProjectFolder
+
+    project = ProjectFolder(os.getcwd())
+    if project.cache is None:
+        Printer.info("*cache:* disabled")
+        return
+
+    stats = project.cache.stats()
+    total = stats.hits + stats.misses
+    ratio = 100 * stats.hits / total if total else 0
+    Printer.info(
+        f"*cache:* {project.cache.path}\n"
+        f"hits: {stats.hits} ({ratio:.1f}%, {stats.remote_hits} remote)\n"
+        f"misses: {stats.misses}\n"
+        f"size: {stats.size / 1024**2:.1f} MB "
+        f"(max {project.cache.max_size / 1024**2:.0f} MB)"
+    )
+
+
+def positive_int(value: str) -> int:
+    """An argparse type that accepts only positive integers."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, not {value!r}")
+    return number
+
+
+def positive_float(value: str) -> float:
+    """An argparse type that accepts only positive numbers."""
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"expected a positive number, not {value!r}")
+    return number
+
+
+def percentage(value: str) -> float:
+    """An argparse type that accepts only percentages between 1 and 100."""
+    number = float(value)
+    if not 1 <= number <= 100:
+        raise argparse.ArgumentTypeError(f"expected a percentage, not {value!r}")
+    return number
+
+
+def parse_args(args: typing.List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="litemake",
+        epilog=(
+            "'litemake daemon' and 'litemake pgo' are commands (see their own "
+            "help). To build targets with these names, give the targets after "
+            "'--' (for example, 'litemake -- daemon')."
+        ),
+    )
+    parser.add_argument(
+        "targets",
+        nargs="*",
+        help="names of the targets to build (the first target by default)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=positive_int,
+        default=None,
+        help="number of nodes to generate concurrently (number of CPUs by default)",
+    )
+    parser.add_argument(
+        "-p",
+        "--profile",
+        default=None,
+        help="name of the build profile (the 'profile' setting by default)",
+    )
+    parser.add_argument(
+        "-l",
+        "--max-load",
+        type=positive_float,
+        default=None,
+        help="don't start new jobs while the load average is above this value",
+    )
+    parser.add_argument(
+        "--max-memory",
+        type=percentage,
+        default=None,
+        help="don't start new jobs while this percentage of the memory is used",
+    )
+    failures = parser.add_mutually_exclusive_group()
+    failures.add_argument(
+        "-k",
+        "--keep-going",
+        dest="fail_fast",
+        action="store_false",
+        help="build every node that doesn't depend on a failed node (default)",
+    )
+    failures.add_argument(
+        "--fail-fast",
+        dest="fail_fast",
+        action="store_true",
+        help="stop the build and kill the running compilers at the first error",
+    )
+    parser.set_defaults(fail_fast=False)
+    parser.add_argument(
+        "--cache-stats",
+        action="store_true",
+        help="print the statistics of the compilation cache and exit",
+    )
+    parser.add_argument(
+        "-w",
+        "--watch",
+        action="store_true",
+        help=(
+            "build again whenever the sources or the configuration change "
+            "(only files inside the project folder are watched)"
+        ),
+    )
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="build in this process, even if a daemon is running for the project",
+    )
+    return parser.parse_args(args)
+
+
+def parse_pgo_args(args: typing.List[str]) -> argparse.Namespace:
+    """Parses the arguments of 'litemake pgo <target> -- <training command>'."""
+
+    parser = argparse.ArgumentParser(
+        prog="litemake pgo",
+        usage="%(prog)s [-h] [-j JOBS] [-p PROFILE] target -- command ...",
+        description="build a target with profile-guided optimization",
+    )
+    parser.add_argument("target", help="name of the target to optimize")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=positive_int,
+        default=None,
+        help="number of nodes to generate concurrently (number of CPUs by default)",
+    )
+    parser.add_argument(
+        "-p",
+        "--profile",
+        default=None,
+        help="name of the build profile (the 'profile' setting by default)",
+    )
+
+    command = list()
+    if "--" in args:
+        index = args.index("--")
+        args, command = args[:index], args[index + 1 :]
+
+    namespace = parser.parse_args(args)
+    if not command:
+        parser.error("a training command is required after '--'")
+    namespace.command = command
+    return namespace
+
+
+def parse_daemon_args(args: typing.List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="litemake daemon",
+        description="manage the build daemon of the project",
+    )
+    parser.add_argument("action", choices=["start", "stop", "status", "run"])
+    return parser.parse_args(args)
+
+
+def main(argv: typing.List[str] = None) -> None:
+    """Runs litemake with the given command line arguments (the arguments of
+    the process by default). The first argument may be the 'daemon' or the
+    'pgo' command, and anything after '--' is a target, so targets with these
+    names can still be built. Exits with status 1 if the build has failed."""
+
+    argv = sys.argv[1:] if argv is None else argv
+
+    # Before any file is opened, since their descriptors may take the numbers
+    # of the jobserver.
+    from litemake.compile.jobserver import connect_parent, parent
+
+    connect_parent()
+    if argv[:1] == ["daemon"]:
+        daemon(parse_daemon_args(argv[1:]).action)
+        return
+
+    if argv[:1] == ["pgo"]:
+        args = parse_pgo_args(argv[1:])
+        pgo(args.target, args.command, jobs=args.jobs, profile=args.profile)
+        return
+
+    args = parse_args(argv)
+    if args.cache_stats:
+        cache_stats()
+        return
 
+    options = dict(
+        jobs=args.jobs,
+        profile=args.profile,
+        max_load=args.max_load,
+        max_memory=args.max_memory,
+        fail_fast=args.fail_fast,
+    )
+    # The daemon can't take tokens from the jobserver of a parent make
+    local = args.no_daemon or parent() is not None or not client.available()
+    if args.watch:
+        if not watch(*args.targets, **options):
+            sys.exit(1)
+        return
 
-def main():
-    args = sys.argv[1:]
-    make(*args)
+    success = None if local else forward(*args.targets, **options)
+    if success is None:
+        success = make(*args.targets, **options)
+    if not success:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
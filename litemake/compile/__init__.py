@@ -1 +1,2 @@
 from .collect import NodesCollector
+from .scheduler import JobScheduler
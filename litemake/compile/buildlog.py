@@ -0,0 +1,192 @@
+""" A compact, append-only log of the nodes that litemake has generated, which
+is stored in the output folder and remembers the state of each output (and
+the inputs it was generated from) between runs. """
+
+import os
+import json
+import typing
+import threading
+from dataclasses import dataclass, field
+
+
+LOG_HEADER = "# litemake log v1"
+
+# The log is rewritten (compacted) when it loads if it contains at least this
+# many lines, and the number of lines is larger than the number of unique
+# records multiplied by the ratio.
+RECOMPACT_MIN_LINES = 256
+RECOMPACT_RATIO = 3
+
+
+@dataclass
+class FileState:
+    """The state of a single file at a certain point in time."""
+
+    mtime: int  # in nanoseconds
+    size: int
+    digest: typing.Optional[str] = None
+
+    @classmethod
+    def from_path(cls, path: str) -> typing.Optional["FileState"]:
+        """Returns the current state of the file in the given path, without
+        its digest. Returns `None` if the file doesn't exist."""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return cls(mtime=stat.st_mtime_ns, size=stat.st_size)
+
+    def matches(self, other: typing.Optional["FileState"]) -> bool:
+        """True if the given state describes the same version of the file,
+        judging only by the modification time and the size."""
+        return other is not None and (self.mtime, self.size) == (
+            other.mtime,
+            other.size,
+        )
+
+
+@dataclass
+class BuildRecord:
+    """Information about the last successful generation of a single output."""
+
+    output: str
+    state: FileState  # state of the output right after it was generated
+    signature: typing.Optional[str] = None
+    duration: float = 0.0  # in seconds
+    inputs: typing.Dict[str, FileState] = field(default_factory=dict)
+
+    def dumps(self) -> str:
+        """Serializes the record into a single line of JSON."""
+        return json.dumps(
+            [
+                self.output,
+                self.state.mtime,
+                self.state.size,
+                self.state.digest,
+                self.signature,
+                round(self.duration, 3),
+                [[p, s.mtime, s.size, s.digest] for p, s in self.inputs.items()],
+            ],
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def loads(cls, line: str) -> "BuildRecord":
+        """Parses a single line that has been generated using 'dumps'."""
+        output, mtime, size, digest, signature, duration, inputs = json.loads(line)
+        return cls(
+            output=output,
+            state=FileState(mtime, size, digest),
+            signature=signature,
+            duration=duration,
+            inputs={p: FileState(m, s, d) for p, m, s, d in inputs},
+        )
+
+
+class BuildLog:
+    """Stores a single record per output. New records are appended to the end
+    of the log file, and override older records of the same output. If the
+    given path is `None`, the records are kept only in memory."""
+
+    def __init__(self, path: typing.Optional[str]) -> None:
+        self.path = path
+        self._records: typing.Dict[str, BuildRecord] = dict()
+        self._lines = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+        if path is not None:
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, output: str) -> bool:
+        return output in self._records
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, mode="r", encoding="utf8") as file:
+                content = file.read()
+        except FileNotFoundError:
+            return
+
+        lines = content.splitlines()
+        if not lines or lines[0] != LOG_HEADER:
+            # Unknown or old format. The log is only a cache, so we can safely
+            # start over with an empty one.
+            self.compact()
+            return
+
+        # If litemake was killed while writing, the last line may be cut. We
+        # must rewrite such log before appending new records to it.
+        broken = not content.endswith("\n")
+        for line in lines[1:]:
+            try:
+                record = BuildRecord.loads(line)
+            except (ValueError, TypeError):
+                broken = True
+                continue
+            self._records[record.output] = record
+            self._lines += 1
+
+        if broken or (
+            self._lines >= RECOMPACT_MIN_LINES
+            and self._lines > len(self._records) * RECOMPACT_RATIO
+        ):
+            self.compact()
+
+    def get(self, output: str) -> typing.Optional[BuildRecord]:
+        """Returns the last record of the given output, or `None` if there
+        isn't such record."""
+        return self._records.get(output)
+
+    def record(self, record: BuildRecord) -> None:
+        """Saves the given record, and overrides the previous record of the
+        same output. This method is thread safe."""
+
+        with self._lock:
+            self._records[record.output] = record
+            if self.path is None:
+                return
+
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or os.curdir, exist_ok=True)
+                empty = not os.path.exists(self.path)
+                self._file = open(self.path, mode="a", encoding="utf8")
+                if empty:
+                    self._file.write(LOG_HEADER + "\n")
+
+            self._file.write(record.dumps() + "\n")
+            self._file.flush()
+            self._lines += 1
+
+    def compact(self) -> None:
+        """Rewrites the log file so it will contain only the latest record
+        of each output."""
+
+        with self._lock:
+            self._close()
+            if self.path is None:
+                return
+
+            os.makedirs(os.path.dirname(self.path) or os.curdir, exist_ok=True)
+            temp = f"{self.path}.tmp"
+            with open(temp, mode="w", encoding="utf8") as file:
+                file.write(LOG_HEADER + "\n")
+                for record in self._records.values():
+                    file.write(record.dumps() + "\n")
+
+            os.replace(temp, self.path)
+            self._lines = len(self._records)
+
+    def _close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self) -> None:
+        """Closes the log file. It will be reopened if new records are
+        saved."""
+        with self._lock:
+            self._close()
@@ -0,0 +1,144 @@
+""" A minimal reference server of the remote build cache protocol (see
+'remote.py'), that stores the entries in a local folder. It is meant for
+tests and small teams, and can be started with:
+
+    python -m litemake.compile.cacheserver --port 8080 /path/to/folder
+"""
+
+import os
+import re
+import socket
+import typing
+import argparse
+import threading
+import socketserver
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+KEY_PATTERN = re.compile(r"^/cache/([0-9a-f]{16,128})$")
+
+
+class _CacheRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps the connections alive between requests
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args) -> None:
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _entry(self) -> typing.Optional[str]:
+        """The path to the file of the requested entry, or `None` if the
+        request path isn't valid."""
+        match = KEY_PATTERN.match(self.path)
+        if match is None:
+            return None
+        key = match.group(1)
+        return os.path.join(self.server.folder, key[:2], key)
+
+    def _respond(self, status: int, body: bytes = b"") -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        entry = self._entry()
+        if entry is None:
+            return self._respond(400)
+
+        try:
+            with open(entry, mode="rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return self._respond(404)
+        self._respond(200, data)
+
+    def do_PUT(self) -> None:
+        entry = self._entry()
+        length = int(self.headers.get("Content-Length", 0))
+        data = self.rfile.read(length)
+        if entry is None:
+            return self._respond(400)
+
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        temp = f"{entry}.{threading.get_ident()}.tmp"
+        with open(temp, mode="wb") as file:
+            file.write(data)
+        os.replace(temp, entry)
+        self._respond(201)
+
+
+class CacheServer(socketserver.ThreadingMixIn, HTTPServer):
+    """An HTTP server that serves the entries in the given folder, and
+    handles each connection in a new thread. Connections that are still open
+    when the server is closed are closed too."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        folder: str,
+        host: str = "localhost",
+        port: int = 0,
+        quiet: bool = False,
+    ) -> None:
+        """If the port is 0, a random free port is used (see 'url')."""
+        self.folder = folder
+        self.quiet = quiet
+        self._connections: typing.Set[socket.socket] = set()
+        self._lock = threading.Lock()
+        super().__init__((host, port), _CacheRequestHandler)
+
+    @property
+    def url(
+        self,
+    ) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> threading.Thread:
+        """Serves requests in a background thread, until 'shutdown' is
+        called."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def process_request(self, request: socket.socket, client_address) -> None:
+        with self._lock:
+            self._connections.add(request)
+        super().process_request(request, client_address)
+
+    def shutdown_request(self, request: socket.socket) -> None:
+        with self._lock:
+            self._connections.discard(request)
+        super().shutdown_request(request)
+
+    def server_close(self) -> None:
+        super().server_close()
+        with self._lock:
+            connections, self._connections = self._connections, set()
+        for request in connections:
+            try:
+                request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def main(args: typing.List[str] = None) -> None:
+    parser = argparse.ArgumentParser(prog="litemake.compile.cacheserver")
+    parser.add_argument("folder", help="the folder in which entries are stored")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args(args)
+
+    server = CacheServer(args.folder, host=args.host, port=args.port)
+    print(f"Serving the cache in {args.folder!r} on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
+import time
 import typing
+import threading
 
 if typing.TYPE_CHECKING:
-    from .graph import CompilationFileNode  # pragma: no cover
+    from .graph import CompilationFileNode, CompilationGraph  # pragma: no cover
     from .status import NodeCompilationStatus  # pragma: no cover
 
 import litemake.exceptions
@@ -9,14 +11,30 @@ from .status import (
     NodeFailed,
     NodePassed,
     NodeSkipped,
+    NodeUnbuilt,
 )
 
 
 class NodesCollector:
-    def __init__(self, tree: "CompilationFileNode") -> None:
+    def __init__(
+        self, tree: typing.Union["CompilationFileNode", "CompilationGraph"]
+    ) -> None:
         self._tree = list(tree.all_nodes())
         self._status = dict()
-        self._queue = (m for m in [n for n in self._tree if n.outdated_subtree])
+        self._lock = threading.Lock()
+
+        # Nodes are yielded in order of dependence, so the staleness of each
+        # node is calculated after the staleness of its dependencies is
+        # already calculated (and memoized).
+        self._outdated = [n for n in self._tree if n.outdated_subtree]
+        self._outdated_set = set(self._outdated)
+        self._queue = iter(self._outdated)
+
+        # The errors of the nodes that have failed, for the build summary.
+        self.errors: typing.Dict[
+            "CompilationFileNode", "litemake.exceptions.litemakeCompilationError"
+        ] = dict()
+        self._cancelled = False
 
     @property
     def count_total(
@@ -31,7 +49,15 @@ class NodesCollector:
     ) -> int:
         """The nubmer of outdated nodes that need to be regenerated in the
         tree."""
-        return sum(True for n in self._tree if n.outdated_subtree)
+        return len(self._outdated)
+
+    @property
+    def outdated_nodes(
+        self,
+    ) -> typing.List["CompilationFileNode"]:
+        """A list of all nodes that need to be regenerated, in order of
+        dependence."""
+        return list(self._outdated)
 
     def pop_next(
         self,
@@ -44,18 +70,165 @@ class NodesCollector:
         except StopIteration:
             return None
 
-    def generate(self, node: "CompilationFileNode") -> "NodeCompilationStatus":
-        if self._status.get(node) is None:
+    def status(
+        self, node: "CompilationFileNode"
+    ) -> typing.Optional["NodeCompilationStatus"]:
+        """Returns the compilation status of the given node, or `None` if the
+        node hasn't been generated (or skipped) yet."""
+        with self._lock:
+            return self._status.get(node)
+
+    def _skip_parents(self, node: "CompilationFileNode") -> None:
+        """Marks all the nodes that depend (directly or indirectly) on the given
+        node as skipped."""
+        stack = list(node.parents)
+        while stack:
+            parent = stack.pop()
+            if self._status.get(parent) is None:
+                self._status[parent] = NodeSkipped
+                stack.extend(parent.parents)
+
+    def cancel(self) -> None:
+        """Cancels the build: nodes that haven't been generated yet are marked
+        as unbuilt instead of being generated, and nodes whose compiler fails
+        from now on (usually because it has been killed by
+        'kill_running_processes') are marked as unbuilt instead of failed."""
+        with self._lock:
+            self._cancelled = True
+
+    @property
+    def cancelled(
+        self,
+    ) -> bool:
+        with self._lock:
+            return self._cancelled
+
+    def abandon(self, node: "CompilationFileNode") -> "NodeCompilationStatus":
+        """Marks the given node as unbuilt, unless it already has a status,
+        and returns its status."""
+        with self._lock:
+            return self._status.setdefault(node, NodeUnbuilt)
+
+    def _can_cutoff(self, node: "CompilationFileNode") -> bool:
+        """True if the given node is outdated only because some of its
+        dependencies were outdated, but the outputs of all of its dependencies
+        are identical to the outputs that the node was last generated from
+        (see 'CompilationFileNode.record'). Such node doesn't need to be
+        generated again (early cutoff). The outputs are compared with the
+        inputs of the node itself, and not with the previous outputs of the
+        dependencies, because the node may have missed a change of a
+        dependency in a build that has failed."""
+
+        if node.outdated:
+            return False
+
+        record = node.state.log.get(node.dest)
+        if record is None:
+            return False
+
+        for dep in node.dependencies:
+            consumed = record.inputs.get(dep.dest)
+            if consumed is None or consumed.digest is None:
+                return False
+            if consumed.digest != dep.output_digest():
+                return False
+        return True
+
+    def _failed(
+        self,
+        node: "CompilationFileNode",
+        error: "litemake.exceptions.litemakeCompilationError",
+    ) -> None:
+        node.reset()
+        with self._lock:
+            if self._cancelled:
+                self._status[node] = NodeUnbuilt
+                return
+            self._status[node] = NodeFailed
+            self.errors[node] = error
+            self._skip_parents(node)
+
+    def _passed(self, node: "CompilationFileNode", duration: float) -> None:
+        """Records the given node that has just been generated."""
+
+        node.reset()
+        node.record(duration)
+        with self._lock:
+            self._status[node] = NodePassed
+
+    def generate(
+        self, node: "CompilationFileNode", retry_killed: bool = False
+    ) -> typing.Optional["NodeCompilationStatus"]:
+        """Generates the given node and returns its compilation status. If the
+        generation fails, all nodes that depend on the given node are marked
+        as skipped. If 'retry_killed' is True and the compiler has been killed
+        (see 'litemakeCompilationError.killed'), the node isn't marked at all
+        and `None` is returned, so it can be generated again. After the build
+        is cancelled, nodes are marked as unbuilt instead (see 'cancel'). This
+        method is thread safe, and can be called for multiple nodes
+        concurrently."""
+
+        if self.cancelled:
+            return self.abandon(node)
+
+        if self.status(node) is None and self._can_cutoff(node):
+            # The output is already up to date. We only update the log with
+            # the new state of the inputs.
+            record = node.state.log.get(node.dest)
+            node.record(record.duration if record is not None else 0.0)
+            with self._lock:
+                self._status[node] = NodePassed
+
+        if self.status(node) is None:
+            start = time.monotonic()
             try:
                 node.generate()
 
-            except litemake.exceptions.litemakeCompilationError:
-                self._status[node] = NodeFailed
-                temp = node
-                while temp.parent is not None:
-                    self._status[temp.parent] = NodeSkipped
-                    temp = temp.parent
+            except litemake.exceptions.litemakeCompilationError as error:
+                if retry_killed and error.killed and not self.cancelled:
+                    node.reset()
+                    return None
+                self._failed(node, error)
 
             else:
-                self._status[node] = NodePassed
-        return self._status[node]
+                self._passed(node, time.monotonic() - start)
+        return self.status(node)
+
+    def generate_batch(
+        self, nodes: typing.List["CompilationFileNode"], retry_killed: bool = False
+    ) -> typing.Dict["CompilationFileNode", typing.Optional["NodeCompilationStatus"]]:
+        """Generates the given nodes (which have the same batch key) together,
+        and returns the compilation status of each one of them. If the batch
+        fails, it is split into two halves which are generated again, until
+        the nodes that fail are found. If the compiler is killed, the nodes
+        are handled like in 'generate'. This method is thread safe."""
+
+        if self.cancelled:
+            return {node: self.abandon(node) for node in nodes}
+
+        pending = [node for node in nodes if self.status(node) is None]
+        if len(pending) == 1:
+            self.generate(pending[0], retry_killed=retry_killed)
+
+        elif pending:
+            start = time.monotonic()
+            try:
+                type(pending[0]).generate_batch(pending)
+
+            except litemake.exceptions.litemakeCompilationError as error:
+                if retry_killed and error.killed and not self.cancelled:
+                    for node in pending:
+                        node.reset()
+                    return {node: self.status(node) for node in nodes}
+
+                middle = len(pending) // 2
+                self.generate_batch(pending[:middle], retry_killed)
+                self.generate_batch(pending[middle:], retry_killed)
+
+            else:
+                # The duration is split evenly between the nodes in the batch
+                duration = (time.monotonic() - start) / len(pending)
+                for node in pending:
+                    self._passed(node, duration)
+
+        return {node: self.status(node) for node in nodes}
@@ -1,10 +1,13 @@
 from .base import AbstractCompiler
+from .options import CompilerOptions, LINKERS
 from .generator import COMPILERS, Compiler
 from .gnu import GccCompiler, GplusplusCompiler
 from .llvm import ClangCompiler, ClangplusplusCompiler
 
 __all__ = [
     "AbstractCompiler",
+    "CompilerOptions",
+    "LINKERS",
     "COMPILERS",
     "Compiler",
     "GccCompiler",
@@ -1,26 +1,151 @@
+import os
 import typing
+import shutil
+import signal
+import hashlib
+import tempfile
+import threading
 import subprocess
 from abc import ABC, abstractmethod
 
+from litemake.compile.objcache import cache_key, clone_file
+from litemake.compile.hashcache import HashCache
+from litemake.compile.jobserver import inherited_fds
 from litemake.exceptions import litemakeCompilationError
 
+from .options import CompilerOptions, LINKERS
+
+if typing.TYPE_CHECKING:
+    from litemake.compile.objcache import ObjectCache  # pragma: no cover
+
+
+# The subprocesses that the compilers are currently running, so they can be
+# killed when the build is cancelled (see 'kill_running_processes').
+_running: typing.Set[subprocess.Popen] = set()
+_running_lock = threading.Lock()
+
+
+def kill_running_processes() -> None:
+    """Kills all the subprocesses that the compilers are currently running,
+    together with the processes that they have started (such as 'cc1' and
+    'as', which the compiler driver runs). The commands that ran them fail
+    with a compilation error."""
+    with _running_lock:
+        for process in _running:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except (AttributeError, ProcessLookupError):
+                process.kill()  # process groups aren't available on Windows
+
+
+def find_files(folder: str, extension: str) -> typing.List[str]:
+    """Returns the paths to all the files with the given extension in the given
+    folder and its subfolders."""
+    return [
+        os.path.join(dirpath, name)
+        for dirpath, _, names in os.walk(folder)
+        for name in names
+        if name.endswith(extension)
+    ]
+
 
 class AbstractCompiler(ABC):
-    def _exec_cmd(self, *cmd) -> None:
+    def __init__(
+        self,
+        cache: "ObjectCache" = None,
+        options: CompilerOptions = None,
+        hashes: HashCache = None,
+    ) -> None:
+        """If a cache is given, compiled object files are stored in it, and
+        are reused instead of being compiled again. The given options are
+        applied to all the commands of the compiler. The digests of files
+        (such as the members of archives) are calculated by the given hash
+        cache, which is usually the hash cache of the build state."""
+        self.cache = cache
+        self.options = options if options is not None else CompilerOptions()
+        self.hashes = hashes if hashes is not None else HashCache()
+        self._identities: typing.Dict[str, str] = dict()
+
+        # A linker that is selected explicitly is required too
+        if self.options.linker in LINKERS:
+            linker = LINKERS[self.options.linker]
+            self.required_clis = set(self.required_clis) | {linker}
+
+    def _lto_flags(self, link: bool) -> typing.List[str]:
+        """Returns the flags that enable link-time optimization (see
+        'CompilerOptions.lto') when compiling, or when linking if 'link' is
+        True. Compilers that support link-time optimization override it."""
+        return list()
+
+    def _pgo_flags(self, link: bool) -> typing.List[str]:
+        """Returns the flags of the current stage of profile-guided
+        optimization (see 'CompilerOptions.pgo') when compiling, or when
+        linking if 'link' is True. Compilers that support profile-guided
+        optimization override it."""
+        return list()
+
+    def _compile_flags(self) -> typing.List[str]:
+        """Flags that are added to every command that compiles a source or a
+        header."""
+        return (
+            self.options.compile_flags
+            + self._lto_flags(link=False)
+            + self._pgo_flags(link=False)
+        )
+
+    def _link_flags(self) -> typing.List[str]:
+        """Flags that are added to the command that links an executable."""
+        return (
+            self.options.link_flags
+            + self._lto_flags(link=True)
+            + self._pgo_flags(link=True)
+        )
+
+    def missing_clis(self) -> typing.Set[str]:
+        """Returns the required CLIs (see 'required_clis') that can't be found
+        on the current machine."""
+        return {cli for cli in self.required_clis if shutil.which(cli) is None}
+
+    def _exec_cmd(self, *cmd, cwd: str = None) -> str:
         """Recives a command that is represented as a list of arguments,
-        and runs it in a new subprocess. Raises an error if the return code
-        from the subprocess is a non-zero one."""
+        and runs it in a new subprocess (in the given working directory, if
+        provided). Raises an error if the return code from the subprocess is a
+        non-zero one. Returns the captured stdout stream, as a string. The
+        subprocess inherits the jobserver of the build (see 'jobserver')."""
 
-        result = subprocess.run(
-            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            cwd=cwd,
+            pass_fds=inherited_fds(),
+            start_new_session=True,  # a process group (see 'kill_running_processes')
         )
+        with _running_lock:
+            _running.add(process)
+        try:
+            stdout, stderr = process.communicate()
+        finally:
+            with _running_lock:
+                _running.discard(process)
 
-        if result.returncode != 0:
+        if process.returncode != 0:
             raise litemakeCompilationError(
                 subprocess=cmd[0],
-                msg=result.stderr,
+                msg=stderr,
+                returncode=process.returncode,
             )
 
+        return stdout
+
+    @staticmethod
+    def signature(cmd: typing.List[str]) -> str:
+        """Returns a short digest of the given command. Two commands have the
+        same signature only if they consist of the exact same arguments."""
+        digest = hashlib.blake2b("\0".join(cmd).encode("utf8"), digest_size=16)
+        return digest.hexdigest()
+
     @property
     @staticmethod
     @abstractmethod
@@ -36,15 +161,357 @@ class AbstractCompiler(ABC):
         """Returns a list of strings that represent names of required CLIs
         to run this compiler successfully."""
 
+    @property
+    @staticmethod
+    @abstractmethod
+    def pch_extension() -> str:
+        """The extension that is added to the path of a header, to get the path
+        of its precompiled version."""
+
+    @abstractmethod
+    def obj_cmd(
+        self,
+        src: str,
+        dest: str,
+        includes: typing.List[str],
+        depfile: str = None,
+        pch: str = None,
+    ) -> typing.List[str]:
+        """Returns the command (list of arguments) that compiles the given
+        source C/C++ file into an object file. If a 'depfile' path is given,
+        the command also writes a Makefile-style dependency file to it, that
+        lists all the headers that the source file includes. If a 'pch' header
+        is given, it is included before the source using its precompiled
+        version (see 'pch_cmd')."""
+
+    @abstractmethod
+    def pch_cmd(
+        self,
+        header: str,
+        includes: typing.List[str],
+        depfile: str = None,
+    ) -> typing.List[str]:
+        """Returns the command (list of arguments) that precompiles the given
+        header. The precompiled header is written next to the header, with the
+        'pch_extension' extension."""
+
+    @abstractmethod
+    def batch_obj_cmd(
+        self,
+        srcs: typing.List[str],
+        includes: typing.List[str],
+        pch: str = None,
+    ) -> typing.List[str]:
+        """Returns the command (list of arguments) that compiles all the given
+        source files in a single invocation of the compiler. The object file
+        and the dependency file of each source are written to the working
+        directory, and are named after the source (see 'batch_outputs')."""
+
+    @abstractmethod
+    def preprocess_cmd(
+        self,
+        src: str,
+        dest: str,
+        includes: typing.List[str],
+        depfile: str = None,
+        pch: str = None,
+    ) -> typing.List[str]:
+        """Returns the command (list of arguments) that preprocesses the given
+        source C/C++ file, and writes the result to stdout. If a 'depfile' path
+        is given, the command also writes the same dependency file that
+        'obj_cmd' writes when compiling the source into 'dest'."""
+
+    @abstractmethod
+    def archive_cmd(
+        self, dest: str, objs: typing.List[str], thin: bool = False
+    ) -> typing.List[str]:
+        """Returns the command (list of arguments) that combines the given
+        object files into a single archive (static library) file. If 'thin' is
+        True, the archive only references the object files in place, instead
+        of containing copies of them."""
+
+    @abstractmethod
+    def archive_update_cmd(self, dest: str, objs: typing.List[str]) -> typing.List[str]:
+        """Returns the command (list of arguments) that replaces the members of
+        an existing archive with the given object files (members are matched by
+        their file names), adds the objects that aren't members yet, and
+        updates the symbol index of the archive."""
+
+    @abstractmethod
+    def archive_delete_cmd(
+        self, dest: str, members: typing.List[str]
+    ) -> typing.List[str]:
+        """Returns the command (list of arguments) that removes the members
+        with the given file names from an existing archive."""
+
     @abstractmethod
-    def create_obj(self, src: str, dest: str, includes: typing.List[str]) -> None:
-        """Compile the given source C/C++ file into a object file."""
+    def clear_profiles(self, instrumented: str) -> None:
+        """Removes the profile data that instrumented programs have written in
+        previous runs, where 'instrumented' is the folder of the instrumented
+        objects (see 'CompilerOptions.pgo')."""
 
     @abstractmethod
-    def create_archive(self, dest: str, objs: typing.List[str]) -> None:
-        """Combine the given object files into a single archive (static
-        library) file."""
+    def merge_profiles(self, instrumented: str, optimized: str) -> typing.List[str]:
+        """Converts the profile data that the instrumented program has written
+        into the data that the optimized compilation reads. 'instrumented' and
+        'optimized' are the folders of the instrumented and optimized objects,
+        which have the same layout. Returns the paths to the data files."""
 
     @abstractmethod
+    def executable_cmd(self, dest: str, archives: typing.List[str]) -> typing.List[str]:
+        """Returns the command (list of arguments) that combines multiple
+        archives into a single executable."""
+
+    def identity(self, program: str) -> str:
+        """Returns a string that identifies the given program (the compiler or
+        the archiver): its name and a digest of its '--version' output. The
+        identity changes when the program is upgraded, but is the same for
+        identical toolchains on different machines, so they can share a
+        remote cache."""
+
+        if program not in self._identities:
+            try:
+                version = self._exec_cmd(program, "--version")
+            except (litemakeCompilationError, OSError):
+                version = shutil.which(program) or program
+            digest = hashlib.sha1(version.encode("utf8")).hexdigest()
+            self._identities[program] = f"{os.path.basename(program)}:{digest}"
+        return self._identities[program]
+
+    def obj_cache_key(
+        self,
+        src: str,
+        dest: str,
+        includes: typing.List[str],
+        depfile: str = None,
+        pch: str = None,
+    ) -> typing.Optional[str]:
+        """Returns the key of the object file in the cache. The key covers the
+        identity of the compiler, the compilation flags and the preprocessed
+        source, and thus doesn't depend on the paths of the source and the
+        object (the cache is shared between projects). Objects with debug
+        information refer to the paths and lines of the sources and to the
+        working directory, so their key covers the line markers of the
+        preprocessed source and the working directory as well. The dependency
+        file is written while preprocessing. Returns `None` if the source
+        can't be preprocessed, and shouldn't be cached."""
+
+        if not self.options.relocatable:
+            return None
+
+        try:
+            preprocessed = self._exec_cmd(
+                *self.preprocess_cmd(src, dest, includes, depfile=depfile, pch=pch)
+            )
+        except litemakeCompilationError:
+            return None
+
+        # Include paths and the precompiled header only affect the preprocessed
+        # source, which is already a part of the key.
+        flags = self.obj_cmd("", "", list(), pch=None if pch is None else "")
+        if self.options.debug_info:
+            flags.append(os.getcwd())
+        return cache_key(self.identity(flags[0]), *flags, preprocessed)
+
+    def archive_cache_key(self, objs: typing.List[str]) -> str:
+        """Returns the key of the archive of the given object files in the
+        cache. The key covers the identity of the archiver, its flags, and the
+        name and content of each object (in order)."""
+
+        flags = self.archive_cmd("", list())
+        digests = self.hashes.digest_many(objs)
+        members = [
+            part for obj in objs for part in (os.path.basename(obj), str(digests[obj]))
+        ]
+        return cache_key(self.identity(flags[0]), *flags, *members)
+
+    def _exec_cached(self, key: typing.Optional[str], dest: str, *cmd) -> None:
+        """Takes 'dest' from the cache if it has an entry with the given key.
+        Otherwise, runs the given command and stores 'dest' in the cache."""
+
+        if key is not None and self.cache.fetch(key, dest):
+            return
+
+        # The previous file may be a hard link to an entry in the cache, and
+        # the command must not overwrite the entry.
+        if os.path.lexists(dest):
+            os.remove(dest)
+
+        self._exec_cmd(*cmd)
+        if key is not None:
+            self.cache.store(key, dest)
+
+    def create_obj(
+        self,
+        src: str,
+        dest: str,
+        includes: typing.List[str],
+        depfile: str = None,
+        pch: str = None,
+    ) -> None:
+        """Compile the given source C/C++ file into a object file. If the
+        compiler has a cache, the object is taken from the cache if possible,
+        and stored in it otherwise."""
+
+        cmd = self.obj_cmd(src, dest, includes, depfile=depfile, pch=pch)
+        if self.cache is None:
+            self._exec_cmd(*cmd)
+        else:
+            key = self.obj_cache_key(src, dest, includes, depfile=depfile, pch=pch)
+            self._exec_cached(key, dest, *cmd)
+
+    def create_pch(
+        self,
+        header: str,
+        includes: typing.List[str],
+        depfile: str = None,
+    ) -> None:
+        """Precompiles the given header (see 'pch_cmd')."""
+        self._exec_cmd(*self.pch_cmd(header, includes, depfile=depfile))
+
+    @staticmethod
+    def batch_outputs(src: str) -> typing.Tuple[str, str]:
+        """Returns the names of the object file and the dependency file that
+        'batch_obj_cmd' writes for the given source."""
+        stem = os.path.splitext(os.path.basename(src))[0]
+        return f"{stem}.o", f"{stem}.d"
+
+    def create_objs(
+        self,
+        objs: typing.List[typing.Tuple[str, str, str]],
+        includes: typing.List[str],
+        pch: str = None,
+    ) -> None:
+        """Compiles multiple source files with the same include paths (and the
+        same precompiled header), using as few invocations of the compiler as
+        possible. Each item in 'objs' is a tuple of a source, its object file
+        and its dependency file. Raises an error if the compilation of at
+        least one source fails. Objects that are compiled together aren't
+        stored in the cache, since they are compiled in another folder, with
+        other paths than 'obj_cmd' (see '_create_batch')."""
+
+        if self.cache is not None:
+            keys = {
+                src: self.obj_cache_key(src, dest, includes, depfile=depfile, pch=pch)
+                for src, dest, depfile in objs
+            }
+            objs = [
+                obj
+                for obj in objs
+                if keys[obj[0]] is None or not self.cache.fetch(keys[obj[0]], obj[1])
+            ]
+
+        # The outputs of a batch are named after the sources, so sources with
+        # the same name must be compiled in separate batches. Objects that
+        # refer to their own paths, and objects with debug information (that
+        # refers to the folder in which they are compiled), are always
+        # compiled in place.
+        batched = self.options.relocatable and not self.options.debug_info
+        batches: typing.List[typing.Dict[str, tuple]] = list()
+        for obj in objs:
+            name, _ = self.batch_outputs(obj[0])
+            batch = None
+            if batched:
+                batch = next((b for b in batches if name not in b), None)
+            if batch is None:
+                batch = dict()
+                batches.append(batch)
+            batch[name] = obj
+
+        for batch in batches:
+            self._create_batch(list(batch.values()), includes, pch=pch)
+
+            if self.cache is not None and len(batch) == 1:
+                src, dest, _ = next(iter(batch.values()))
+                if keys[src] is not None:
+                    self.cache.store(keys[src], dest)
+
+    def _create_batch(
+        self,
+        objs: typing.List[typing.Tuple[str, str, str]],
+        includes: typing.List[str],
+        pch: str = None,
+    ) -> None:
+        """Compiles the given sources in a single invocation of the compiler,
+        in a temporary directory, and moves the outputs to their
+        destinations."""
+
+        if len(objs) == 1:
+            src, dest, depfile = objs[0]
+            if os.path.lexists(dest):
+                os.remove(dest)  # may be a hard link to an entry in the cache
+            self._exec_cmd(*self.obj_cmd(src, dest, includes, depfile=depfile, pch=pch))
+            return
+
+        # The compiler runs in another directory, so all paths must be absolute
+        srcs = [os.path.abspath(src) for src, _, _ in objs]
+        includes = [os.path.abspath(include) for include in includes]
+        pch = None if pch is None else os.path.abspath(pch)
+
+        folder = os.path.dirname(objs[0][1])
+        with tempfile.TemporaryDirectory(dir=folder) as temp:
+            self._exec_cmd(*self.batch_obj_cmd(srcs, includes, pch=pch), cwd=temp)
+
+            for src, dest, depfile in objs:
+                obj, deps = self.batch_outputs(src)
+
+                # The previous file may be a hard link to an entry in the cache
+                os.replace(os.path.join(temp, obj), dest)
+
+                # The target of the generated dependency file is the temporary
+                # object file, and it is replaced by the real object file.
+                with open(os.path.join(temp, deps), mode="r") as file:
+                    _, prerequisites = file.read().split(":", 1)
+                with open(depfile, mode="w") as file:
+                    file.write(f"{dest}:{prerequisites}")
+
+    def create_archive(
+        self, dest: str, objs: typing.List[str], thin: bool = False
+    ) -> None:
+        """Combine the given object files into a new archive (static library)
+        file, that replaces the previous one. If the compiler has a cache, the
+        archive is taken from the cache if possible, and stored in it
+        otherwise. Thin archives reference the objects by their paths, and
+        thus are never cached."""
+
+        key = None
+        if self.cache is not None and not thin:
+            key = self.archive_cache_key(objs)
+        self._exec_cached(key, dest, *self.archive_cmd(dest, objs, thin=thin))
+
+    def update_archive(
+        self,
+        dest: str,
+        objs: typing.List[str],
+        changed: typing.List[str],
+        removed: typing.List[str],
+    ) -> None:
+        """Updates an existing (regular) archive, so it contains exactly the
+        given object files: the members with the names in 'removed' are
+        deleted, and the 'changed' objects are replaced or added. Unlike
+        'create_archive', the objects that haven't changed aren't read again.
+        The names of all the objects must be unique. If the compiler has a
+        cache, the archive is taken from the cache if possible, and stored in
+        it otherwise."""
+
+        key = None
+        if self.cache is not None:
+            key = self.archive_cache_key(objs)
+            if self.cache.fetch(key, dest):
+                return
+
+        # The archiver modifies the archive in place, so an archive that is
+        # a hard link to an entry in the cache is copied first.
+        if os.stat(dest).st_nlink > 1:
+            clone_file(dest, dest, link=False)
+
+        if removed:
+            self._exec_cmd(*self.archive_delete_cmd(dest, removed))
+        self._exec_cmd(*self.archive_update_cmd(dest, changed))
+
+        if key is not None:
+            self.cache.store(key, dest)
+
     def create_executable(self, dest: str, archives: typing.List[str]) -> None:
         """Combine multiple archives into a single executable."""
+        self._exec_cmd(*self.executable_cmd(dest, archives))
@@ -1,19 +1,145 @@
 import os
+import shutil
 import typing
 
-from .base import AbstractCompiler
+from .base import AbstractCompiler, find_files
+from .options import CompilerOptions
+
+if typing.TYPE_CHECKING:
+    from litemake.compile.objcache import ObjectCache  # pragma: no cover
+    from litemake.compile.hashcache import HashCache  # pragma: no cover
 
 
 class GnuCompiler(AbstractCompiler):
-    def create_obj(self, src: str, dest: str, includes: typing.List[str]) -> None:
+    pch_extension = ".gch"
+
+    def __init__(
+        self,
+        cache: "ObjectCache" = None,
+        options: CompilerOptions = None,
+        hashes: "HashCache" = None,
+    ) -> None:
+        super().__init__(cache=cache, options=options, hashes=hashes)
+
+        # Objects that are compiled with link-time optimization contain GCC's
+        # intermediate representation, which only 'gcc-ar' can index.
+        self.archiver = "ar" if self.options.lto == "none" else "gcc-ar"
+        self.required_clis = (set(self.required_clis) - {"ar"}) | {self.archiver}
+
+    def _lto_flags(self, link: bool) -> typing.List[str]:
+        if self.options.lto == "none":
+            return list()
+
+        # GCC doesn't have ThinLTO, and its default (partitioned) mode is the
+        # closest to it: the optimization runs in parallel at link time. In
+        # 'full' mode, the whole program is optimized as a single partition.
+        flags = ["-flto=auto"]
+        if link and self.options.lto == "full":
+            flags.append("-flto-partition=one")
+        return flags
+
+    def _pgo_flags(self, link: bool) -> typing.List[str]:
+        if self.options.pgo == "generate":
+            # The instrumented program writes the profile data of each object
+            # next to it (in a '.gcda' file).
+            return ["-fprofile-generate"]
+        if self.options.pgo == "use" and not link:
+            # Objects that the training workload doesn't use have no data
+            return ["-fprofile-use", "-Wno-missing-profile"]
+        return list()
+
+    def clear_profiles(self, instrumented: str) -> None:
+        for path in find_files(instrumented, ".gcda"):
+            os.remove(path)
+
+    def merge_profiles(self, instrumented: str, optimized: str) -> typing.List[str]:
+        # The instrumented program already merges the data of multiple runs,
+        # and the data of each object is read from the file next to it, so the
+        # data is copied next to the optimized objects.
+        for path in find_files(optimized, ".gcda"):
+            os.remove(path)
+
+        data = list()
+        for path in find_files(instrumented, ".gcda"):
+            dest = os.path.join(optimized, os.path.relpath(path, instrumented))
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            shutil.copyfile(path, dest)
+            data.append(dest)
+        return data
+
+    def _pch_flags(self, pch: typing.Optional[str]) -> typing.List[str]:
+        # GCC uses the precompiled header next to the included header if it is
+        # valid, and falls back to the header itself otherwise.
+        return ["-include", pch] if pch else list()
+
+    def obj_cmd(
+        self,
+        src: str,
+        dest: str,
+        includes: typing.List[str],
+        depfile: str = None,
+        pch: str = None,
+    ) -> typing.List[str]:
+        includes = [f"-I{i}" for i in includes]
+        deps = ["-MMD", "-MF", depfile] if depfile else list()
+        pch = self._pch_flags(pch)
+        flags = self._compile_flags()
+        return [self.name, "-c", src, "-o", dest, *flags, *pch, *includes, *deps]
+
+    def pch_cmd(
+        self,
+        header: str,
+        includes: typing.List[str],
+        depfile: str = None,
+    ) -> typing.List[str]:
+        dest = f"{header}{self.pch_extension}"
+        includes = [f"-I{i}" for i in includes]
+        deps = ["-MMD", "-MF", depfile] if depfile else list()
+        flags = self._compile_flags()
+        return [self.name, header, "-o", dest, *flags, *includes, *deps]
+
+    def batch_obj_cmd(
+        self,
+        srcs: typing.List[str],
+        includes: typing.List[str],
+        pch: str = None,
+    ) -> typing.List[str]:
         includes = [f"-I{i}" for i in includes]
-        self._exec_cmd(self.name, "-c", src, "-o", dest, *includes)
+        pch = self._pch_flags(pch)
+        flags = self._compile_flags()
+        return [self.name, "-c", *srcs, *flags, *pch, *includes, "-MMD"]
+
+    def preprocess_cmd(
+        self,
+        src: str,
+        dest: str,
+        includes: typing.List[str],
+        depfile: str = None,
+        pch: str = None,
+    ) -> typing.List[str]:
+        includes = [f"-I{i}" for i in includes]
+        deps = ["-MMD", "-MF", depfile, "-MT", dest] if depfile else list()
+        pch = ["-include", pch] if pch else list()
+        flags = self.options.cflags  # may define macros
+        # Line markers are kept only for the debug information
+        markers = list() if self.options.debug_info else ["-P"]
+        return [self.name, "-E", *markers, src, *flags, *pch, *includes, *deps]
+
+    def archive_cmd(
+        self, dest: str, objs: typing.List[str], thin: bool = False
+    ) -> typing.List[str]:
+        return [self.archiver, "-crsT" if thin else "-crs", dest, *objs]
+
+    def archive_update_cmd(self, dest: str, objs: typing.List[str]) -> typing.List[str]:
+        return [self.archiver, "-rs", dest, *objs]
 
-    def create_archive(self, dest: str, objs: typing.List[str]) -> None:
-        self._exec_cmd("ar", "-crs", dest, *objs)
+    def archive_delete_cmd(
+        self, dest: str, members: typing.List[str]
+    ) -> typing.List[str]:
+        return [self.archiver, "-d", dest, *members]
 
-    def create_executable(self, dest: str, archives: typing.List[str]) -> None:
-        self._exec_cmd(self.name, "-o", dest, *archives)
+    def executable_cmd(self, dest: str, archives: typing.List[str]) -> typing.List[str]:
+        return [self.name, "-o", dest, *archives, *self._link_flags()]
 
 
 class GccCompiler(GnuCompiler):
@@ -1,19 +1,160 @@
 import os
 import typing
 
-from .base import AbstractCompiler
+from .base import AbstractCompiler, find_files
+from .options import CompilerOptions
+
+from litemake.exceptions import litemakeCompilationError, litemakePgoError
+
+if typing.TYPE_CHECKING:
+    from litemake.compile.objcache import ObjectCache  # pragma: no cover
+    from litemake.compile.hashcache import HashCache  # pragma: no cover
 
 
 class LlvmCompiler(AbstractCompiler):
-    def create_obj(self, src: str, dest: str, includes: typing.List[str]) -> None:
+    pch_extension = ".pch"
+
+    def __init__(
+        self,
+        cache: "ObjectCache" = None,
+        options: CompilerOptions = None,
+        hashes: "HashCache" = None,
+    ) -> None:
+        super().__init__(cache=cache, options=options, hashes=hashes)
+
+        # The raw profiles of instrumented programs are merged by 'llvm-profdata'
+        if self.options.pgo != "none":
+            self.required_clis = set(self.required_clis) | {"llvm-profdata"}
+
+    @property
+    def _raw_profiles(
+        self,
+    ) -> str:
+        return os.path.join(self.options.pgo_dir, "raw")
+
+    @property
+    def _profile_data(
+        self,
+    ) -> str:
+        return os.path.join(self.options.pgo_dir, "default.profdata")
+
+    def _pgo_flags(self, link: bool) -> typing.List[str]:
+        if self.options.pgo == "generate":
+            return [f"-fprofile-generate={self._raw_profiles}"]
+        if self.options.pgo == "use" and not link:
+            return [f"-fprofile-use={self._profile_data}"]
+        return list()
+
+    def clear_profiles(self, instrumented: str) -> None:
+        for path in find_files(self._raw_profiles, ".profraw"):
+            os.remove(path)
+
+    def merge_profiles(self, instrumented: str, optimized: str) -> typing.List[str]:
+        raw = find_files(self._raw_profiles, ".profraw")
+        if not raw:
+            raise litemakePgoError("the training command didn't write profile data")
+
+        try:
+            self._exec_cmd(
+                "llvm-profdata", "merge", f"-output={self._profile_data}", *raw
+            )
+        except litemakeCompilationError as error:
+            message = "\n".join(["merging the profile data has failed", *error.msg[1:]])
+            raise litemakePgoError(message)
+        return [self._profile_data]
+
+    def _lto_flags(self, link: bool) -> typing.List[str]:
+        if self.options.lto == "none":
+            return list()
+
+        if self.options.lto == "full":
+            return ["-flto=full"]
+
+        # The linker keeps the optimized modules in the cache folder, and
+        # reuses the modules whose inputs haven't changed in the next links.
+        flags = ["-flto=thin"]
+        cache = self.options.lto_cache
+        if link and cache:
+            if self.options.linker == "lld":
+                flags.append(f"-Wl,--thinlto-cache-dir={cache}")
+            else:
+                flags.append(f"-Wl,-plugin-opt,cache-dir={cache}")
+        return flags
+
+    def _pch_flags(self, pch: typing.Optional[str]) -> typing.List[str]:
+        # Clang uses the precompiled header only if it is given explicitly
+        return ["-include-pch", f"{pch}{self.pch_extension}"] if pch else list()
+
+    def obj_cmd(
+        self,
+        src: str,
+        dest: str,
+        includes: typing.List[str],
+        depfile: str = None,
+        pch: str = None,
+    ) -> typing.List[str]:
         includes = [f"-I{i}" for i in includes]
-        self._exec_cmd(self.name, "-c", src, "-o", dest, *includes)
+        deps = ["-MMD", "-MF", depfile] if depfile else list()
+        pch = self._pch_flags(pch)
+        flags = self._compile_flags()
+        return [self.name, "-c", src, "-o", dest, *flags, *pch, *includes, *deps]
+
+    def pch_cmd(
+        self,
+        header: str,
+        includes: typing.List[str],
+        depfile: str = None,
+    ) -> typing.List[str]:
+        dest = f"{header}{self.pch_extension}"
+        includes = [f"-I{i}" for i in includes]
+        deps = ["-MMD", "-MF", depfile] if depfile else list()
+        language = "c++-header" if self.name.endswith("++") else "c-header"
+        flags = self._compile_flags()
+        return [self.name, "-x", language, header, "-o", dest, *flags, *includes, *deps]
+
+    def batch_obj_cmd(
+        self,
+        srcs: typing.List[str],
+        includes: typing.List[str],
+        pch: str = None,
+    ) -> typing.List[str]:
+        includes = [f"-I{i}" for i in includes]
+        pch = self._pch_flags(pch)
+        flags = self._compile_flags()
+        return [self.name, "-c", *srcs, *flags, *pch, *includes, "-MMD"]
+
+    def preprocess_cmd(
+        self,
+        src: str,
+        dest: str,
+        includes: typing.List[str],
+        depfile: str = None,
+        pch: str = None,
+    ) -> typing.List[str]:
+        includes = [f"-I{i}" for i in includes]
+        deps = ["-MMD", "-MF", depfile, "-MT", dest] if depfile else list()
+        # The header itself is included, so its content is preprocessed
+        pch = ["-include", pch] if pch else list()
+        flags = self.options.cflags  # may define macros
+        # Line markers are kept only for the debug information
+        markers = list() if self.options.debug_info else ["-P"]
+        return [self.name, "-E", *markers, src, *flags, *pch, *includes, *deps]
+
+    def archive_cmd(
+        self, dest: str, objs: typing.List[str], thin: bool = False
+    ) -> typing.List[str]:
+        return ["llvm-ar", "-crsT" if thin else "-crs", dest, *objs]
+
+    def archive_update_cmd(self, dest: str, objs: typing.List[str]) -> typing.List[str]:
+        return ["llvm-ar", "-rs", dest, *objs]
 
-    def create_archive(self, dest: str, objs: typing.List[str]) -> None:
-        self._exec_cmd("llvm-ar", "-crs", dest, *objs)
+    def archive_delete_cmd(
+        self, dest: str, members: typing.List[str]
+    ) -> typing.List[str]:
+        return ["llvm-ar", "-d", dest, *members]
 
-    def create_executable(self, dest: str, archives: typing.List[str]) -> None:
-        self._exec_cmd(self.name, "-o", dest, *archives)
+    def executable_cmd(self, dest: str, archives: typing.List[str]) -> typing.List[str]:
+        return [self.name, "-o", dest, *archives, *self._link_flags()]
 
 
 class ClangCompiler(LlvmCompiler):
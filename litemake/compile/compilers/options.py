@@ -0,0 +1,88 @@
+""" Options that change how files are compiled and linked, on top of the
+commands that each compiler class generates. The options are shared by all
+the compilers, since GCC and Clang accept the same flags for them. """
+
+import typing
+from dataclasses import dataclass, field
+
+# The linkers that can be selected instead of the default linker of the
+# compiler, and the programs that the compiler runs for them.
+LINKERS = {
+    "bfd": "ld.bfd",
+    "gold": "ld.gold",
+    "lld": "ld.lld",
+    "mold": "ld.mold",
+}
+
+
+@dataclass
+class CompilerOptions:
+    linker: str = "default"  # 'default', or one of 'LINKERS'
+    link_threads: int = 0  # 0 uses the default number of threads of the linker
+    split_dwarf: bool = False
+    lto: str = "none"  # 'none', 'thin' or 'full'
+    lto_cache: typing.Optional[str] = None  # a folder for ThinLTO to reuse
+    pgo: str = "none"  # 'none', 'generate' (instrumented) or 'use' (optimized)
+    pgo_dir: typing.Optional[str] = None  # a folder for the profile data
+    cflags: typing.List[str] = field(default_factory=list)  # of the profile
+    ldflags: typing.List[str] = field(default_factory=list)  # of the profile
+
+    @property
+    def relocatable(
+        self,
+    ) -> bool:
+        """False if the compiled objects refer to their own paths (to their
+        split debug information, or to their profile data), and thus can't be
+        compiled in another folder or shared through the cache."""
+        return not self.split_dwarf and self.pgo == "none"
+
+    @property
+    def debug_info(
+        self,
+    ) -> bool:
+        """True if the compiled objects contain debug information, which refers
+        to the paths and the line numbers of the sources, and to the working
+        directory of the compiler."""
+        flags = [f for f in self.compile_flags if f.startswith("-g")]
+        return bool(flags) and flags[-1] != "-g0"
+
+    @property
+    def compile_flags(
+        self,
+    ) -> typing.List[str]:
+        """Flags that are added to every command that compiles a source or a
+        header."""
+        flags = list(self.cflags)
+        if self.split_dwarf:
+            # The debug information is written into a '.dwo' file next to each
+            # object, and the linker doesn't have to copy it into the
+            # executable.
+            flags += ["-g", "-gsplit-dwarf"]
+        return flags
+
+    @property
+    def link_flags(
+        self,
+    ) -> typing.List[str]:
+        """Flags that are added to the command that links an executable."""
+
+        if self.linker not in LINKERS:
+            return list(self.ldflags)
+
+        flags = [f"-fuse-ld={self.linker}"]
+        threads = f"={self.link_threads}" if self.link_threads else ""
+        if self.linker == "lld" and threads:
+            flags.append(f"-Wl,--threads{threads}")
+        elif self.linker == "mold" and threads:
+            flags.append(f"-Wl,--thread-count{threads}")
+        elif self.linker == "gold":
+            # Gold links in a single thread unless it is asked otherwise
+            flags.append("-Wl,--threads")
+            if threads:
+                flags.append(f"-Wl,--thread-count{threads}")
+
+        if self.split_dwarf and self.linker != "bfd":
+            # An index of the split debug information speeds up the debugger
+            flags.append("-Wl,--gdb-index")
+
+        return flags + self.ldflags
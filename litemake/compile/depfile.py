@@ -0,0 +1,82 @@
+""" Parsing of the Makefile-style dependency files that are generated by the
+compilers (using the '-MMD -MF' flags), and list the headers that each source
+file includes. """
+
+import typing
+
+
+def parse_depfile(content: str) -> typing.List[str]:
+    """Parses the content of a dependency file, and returns a list of all the
+    prerequisites (files that the target depends on) that are listed in it, in
+    the order in which they appear and without duplicates."""
+
+    # Lines that end with a backslash are continued on the next line
+    content = content.replace("\\\r\n", " ").replace("\\\n", " ")
+
+    deps = dict()  # used as an ordered set
+    for line in content.splitlines():
+        is_target = True
+        for word in _split_words(line):
+            if is_target:
+                # Words until the rule separator (a colon followed by a
+                # whitespace) are targets. A colon inside a word is a part of
+                # a Windows path (like 'C:\file.h').
+                if word.endswith(":"):
+                    is_target = False
+                continue
+
+            deps[word] = None
+
+    return list(deps)
+
+
+def _split_words(line: str) -> typing.Generator[str, None, None]:
+    """Splits a single line of a dependency file into words. Spaces that are
+    escaped with a backslash are part of the word, and '$$' stands for a
+    single dollar sign."""
+
+    word = str()
+    index = 0
+    while index < len(line):
+        char = line[index]
+        after = line[index + 1] if index + 1 < len(line) else ""
+
+        if char == "\\" and after in " #":
+            word += after
+            index += 2
+            continue
+
+        if char == "$" and after == "$":
+            word += "$"
+            index += 2
+            continue
+
+        if char.isspace():
+            if word:
+                yield word
+            word = str()
+
+        elif char == ":" and not after.strip() and word:
+            # The rule separator, which can also be attached to the last
+            # target (like 'main.o: main.c').
+            yield word + ":"
+            word = str()
+
+        else:
+            word += char
+
+        index += 1
+
+    if word:
+        yield word
+
+
+def read_depfile(path: str) -> typing.Optional[typing.List[str]]:
+    """Reads and parses the dependency file in the given path. Returns `None`
+    if the file doesn't exist."""
+
+    try:
+        with open(path, mode="r", encoding="utf8") as file:
+            return parse_depfile(file.read())
+    except FileNotFoundError:
+        return None
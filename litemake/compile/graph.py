@@ -2,6 +2,17 @@ import typing
 import os
 from abc import ABC, abstractmethod
 from .compilers import AbstractCompiler
+from .depfile import read_depfile
+from .includer import includer_content, write_includer
+from .buildlog import BuildRecord
+from .objcache import cache_key
+from .state import BuildState
+from .unity import CHUNK_COMMENT, write_chunk
+
+
+# The first bytes of a regular archive (as opposed to a thin archive, that
+# starts with '!<thin>').
+ARCHIVE_MAGIC = b"!<arch>\n"
 
 
 class CompilationFileNode(ABC):
@@ -10,13 +21,28 @@ class CompilationFileNode(ABC):
         dest: str,
         compiler: AbstractCompiler,
         parent: typing.Optional["CompilationFileNode"],
+        state: BuildState = None,
     ) -> None:
         self.dest = dest
         self.compiler = compiler
-        self.parent = parent
+        self.state = state if state is not None else BuildState()
+        self.parents: typing.List["CompilationFileNode"] = list()
+
+        # The staleness of the node is calculated once, and is reused until
+        # the node is generated (see 'reset').
+        self._outdated: typing.Optional[bool] = None
+        self._outdated_subtree: typing.Optional[bool] = None
 
-    def set_parent(self, parent: "CompilationFileNode") -> None:
-        self.parent = parent
+        if parent is not None:
+            self.add_parent(parent)
+
+    def add_parent(self, parent: "CompilationFileNode") -> bool:
+        """Registers the given node as a node that depends on the current one.
+        A node can have multiple parents if it is shared between targets."""
+        good = parent not in self.parents
+        if good:
+            self.parents.append(parent)
+        return good
 
     @abstractmethod
     def generate(
@@ -25,26 +51,184 @@ class CompilationFileNode(ABC):
         """A method that generates (compiles) the current node only.
         It assumes that the dependencies are already generated."""
 
+    @property
+    def batch_key(
+        self,
+    ) -> typing.Optional[tuple]:
+        """Nodes with the same batch key can be generated together, in a single
+        call to 'generate_batch'. `None` if the node can only be generated on
+        its own."""
+        return None
+
+    @property
+    def pool(
+        self,
+    ) -> typing.Optional[str]:
+        """The name of the job pool of the node. The number of nodes of each
+        pool that are generated concurrently may be limited (see
+        'JobScheduler'). `None` if the node isn't in any pool."""
+        return None
+
+    @staticmethod
+    def generate_batch(nodes: typing.List["CompilationFileNode"]) -> None:
+        """Generates all the given nodes, which have the same batch key.
+        Raises an error if the generation of at least one of them fails."""
+        for node in nodes:
+            node.generate()
+
+    @property
+    @abstractmethod
+    def command(
+        self,
+    ) -> typing.List[str]:
+        """The exact command (list of arguments) that generates the node."""
+
+    @property
+    def signature(
+        self,
+    ) -> str:
+        """A digest of the command that generates the node. If the signature
+        changes, the node should be generated again."""
+        return self.compiler.signature(self.command)
+
+    def reset(
+        self,
+    ) -> None:
+        """Forgets the cached staleness of the node, and the cached state of
+        the files it generates. Called after the node is generated, or when
+        files have been changed outside of litemake."""
+        self.state.stats.invalidate(*self.outputs)
+        self._outdated = None
+        self._outdated_subtree = None
+
+    @property
+    def outputs(
+        self,
+    ) -> typing.List[str]:
+        """Paths to all the files that are written while the node is generated."""
+        return [self.dest]
+
     @property
     def outdated(
         self,
     ) -> bool:
-        return not os.path.exists(self.dest)
+        """True if the node itself needs to be generated again. Calculated
+        once, until the node is reset."""
+        if self._outdated is None:
+            self._outdated = self._check_outdated()
+        return self._outdated
 
     @property
-    @abstractmethod
     def outdated_subtree(
         self,
     ) -> bool:
         """True at least one node in the subtree that this node is the head
-        node in is outdated, or if this node is outdated."""
+        node in is outdated, or if this node is outdated. Calculated once,
+        until the node is reset."""
+        if self._outdated_subtree is None:
+            self._outdated_subtree = self.outdated or any(
+                dep.outdated_subtree for dep in self.dependencies
+            )
+        return self._outdated_subtree
+
+    def _check_outdated(
+        self,
+    ) -> bool:
+        """Checks if the node itself needs to be generated again."""
+        if not self.state.stats.exists(self.dest):
+            return True
+
+        # Outputs that were generated with a different command (for example,
+        # with another compiler or other include paths) are outdated.
+        record = self.state.log.get(self.dest)
+        return (
+            record is not None
+            and record.signature is not None
+            and record.signature != self.signature
+        )
+
+    @property
+    @abstractmethod
+    def inputs(
+        self,
+    ) -> typing.Optional[typing.List[str]]:
+        """A list of paths to all the files that the node is generated from.
+        Returns `None` if the inputs are unknown."""
+
+    def output_digest(
+        self,
+    ) -> typing.Optional[str]:
+        """A digest of everything that the parents of the node read from its
+        output: by default, the content of the output file."""
+        return self.state.hashes.digest(self.dest)
+
+    def record(self, duration: float) -> None:
+        """Saves the current state of the node's output and inputs in the build
+        log. Called after the node has been generated successfully, with the
+        number of seconds it took."""
+
+        output = self.state.stats.file_state(self.dest)
+        if output is None:
+            return
+
+        if self.parents:
+            # The digest of the output is used to check if the output has
+            # actually changed, and if its parents should be generated again.
+            output.digest = self.output_digest()
+
+        paths = self.inputs or list()
+        digests = dict()
+        if self.state.use_hashes:
+            digests = self.state.hashes.digest_many(paths)
+
+        # The outputs of the dependencies are always recorded with what the
+        # node has read from them, for the early cutoff of the node (see
+        # 'NodesCollector._can_cutoff').
+        for dep in self.dependencies:
+            if dep.dest in paths:
+                digests[dep.dest] = dep.output_digest()
+
+        inputs = dict()
+        for path in paths:
+            state = self.state.stats.file_state(path)
+            if state is not None:
+                state.digest = digests.get(path)
+                inputs[path] = state
+
+        record = BuildRecord(
+            self.dest,
+            output,
+            signature=self.signature,
+            duration=duration,
+            inputs=inputs,
+        )
+        self.state.log.record(record)
 
+    @property
     @abstractmethod
+    def dependencies(
+        self,
+    ) -> typing.List["CompilationFileNode"]:
+        """A list of the nodes that should be generated before the current
+        node can be generated."""
+
     def all_nodes(
         self,
+        visited: typing.Set["CompilationFileNode"] = None,
     ) -> typing.Generator["CompilationFileNode", None, None]:
         """Generator that yields all nodes in the sub-tree in which the current
-        node is the head node. Nodes are yielded in order of dependence."""
+        node is the head node. Nodes are yielded in order of dependence, and
+        nodes that are shared between multiple parents are yielded only once.
+        Nodes that are in the given 'visited' set are not yielded."""
+
+        visited = set() if visited is None else visited
+        if self in visited:
+            return
+
+        visited.add(self)
+        for dep in self.dependencies:
+            yield from dep.all_nodes(visited)
+        yield self
 
 
 class ObjectFileNode(CompilationFileNode):
@@ -58,37 +242,301 @@ class ObjectFileNode(CompilationFileNode):
         compiler: AbstractCompiler,
         includes: typing.List[str],
         parent: "ArchiveFileNode",
+        state: BuildState = None,
+        pch: "PrecompiledHeaderNode" = None,
+        extra_inputs: typing.List[str] = None,
     ) -> None:
-        super().__init__(dest, compiler, parent)
+        """If a precompiled header node is given, the object is compiled with
+        the precompiled header, and depends on it. Extra inputs are files that
+        the compiler reads, but aren't listed in the dependency file (such as
+        profile data)."""
+        super().__init__(dest, compiler, parent, state=state)
         self.src = src
         self.includes = includes
+        self.pch = pch
+        self.extra_inputs = extra_inputs or list()
+
+    @property
+    def key(
+        self,
+    ) -> tuple:
+        """A tuple that identifies the object file: two object nodes with the
+        same key generate the same object file, and can be shared."""
+        pch = None if self.pch is None else self.pch.forwarder
+        return (self.src, self.compiler.name, tuple(self.includes), pch)
+
+    @property
+    def _pch_header(
+        self,
+    ) -> typing.Optional[str]:
+        return None if self.pch is None else self.pch.forwarder
+
+    @property
+    def depfile(
+        self,
+    ) -> str:
+        """Path to the dependency file that the compiler generates alongside
+        the object file, and lists the headers that the source includes."""
+        return f"{self.dest}.d"
+
+    @property
+    def inputs(
+        self,
+    ) -> typing.Optional[typing.List[str]]:
+        """A list of all files that the object file is generated from: the
+        source file, and all the headers that it includes. Returns `None` if
+        the headers are unknown (the dependency file is missing)."""
+
+        # The build log already knows the inputs, unless the object file has
+        # been modified since it was recorded.
+        record = self.state.log.get(self.dest)
+        if record is not None and record.state.matches(
+            self.state.stats.file_state(self.dest)
+        ):
+            return list(record.inputs)
+
+        deps = read_depfile(self.depfile)
+        if deps is None:
+            return None
+
+        # The precompiled header isn't listed in the dependency file
+        inputs = [self.src] + [dep for dep in deps if dep != self.src]
+        if self.pch is not None and self.pch.dest not in inputs:
+            inputs.append(self.pch.dest)
+        inputs += [path for path in self.extra_inputs if path not in inputs]
+        return inputs
+
+    @property
+    def command(
+        self,
+    ) -> typing.List[str]:
+        return self.compiler.obj_cmd(
+            self.src,
+            self.dest,
+            self.includes,
+            depfile=self.depfile,
+            pch=self._pch_header,
+        )
 
     def generate(
         self,
     ) -> None:
         os.makedirs(os.path.dirname(self.dest), exist_ok=True)
-        self.compiler.create_obj(self.src, self.dest, self.includes)
+        self.compiler.create_obj(
+            self.src,
+            self.dest,
+            self.includes,
+            depfile=self.depfile,
+            pch=self._pch_header,
+        )
 
     @property
-    def outdated(
+    def batch_key(
         self,
-    ) -> bool:
-        return super().outdated or os.path.getmtime(self.src) > os.path.getmtime(
-            self.dest
+    ) -> typing.Optional[tuple]:
+        # Objects that are compiled by the same compiler with the same include
+        # paths can be compiled in a single invocation of the compiler.
+        return (self.compiler, tuple(self.includes), self.pch)
+
+    @property
+    def pool(
+        self,
+    ) -> typing.Optional[str]:
+        return "compile"
+
+    @staticmethod
+    def generate_batch(nodes: typing.List["ObjectFileNode"]) -> None:
+        for node in nodes:
+            os.makedirs(os.path.dirname(node.dest), exist_ok=True)
+
+        first = nodes[0]
+        first.compiler.create_objs(
+            [(node.src, node.dest, node.depfile) for node in nodes],
+            first.includes,
+            pch=first._pch_header,
         )
 
     @property
-    def outdated_subtree(
+    def outputs(
+        self,
+    ) -> typing.List[str]:
+        return [self.dest, self.depfile]
+
+    def _check_outdated(
         self,
     ) -> bool:
-        return self.outdated
+        if super()._check_outdated():
+            return True
+
+        inputs = self.inputs
+        if inputs is None:
+            # Without the dependency file, we can't know which headers are used.
+            return True
+
+        record = self.state.log.get(self.dest)
+        if self.state.use_hashes and record is not None:
+            return self._changed_content(record, inputs)
+
+        dest_mtime = self.state.stats.file_state(self.dest).mtime
+        for path in inputs:
+            state = self.state.stats.file_state(path)
+            if state is None or state.mtime > dest_mtime:
+                # Rebuild if a header has been removed, or modified after the
+                # object file was generated.
+                return True
+
+        return False
+
+    def _changed_content(self, record: "BuildRecord", inputs: typing.List[str]) -> bool:
+        """Returns True if the content of at least one of the given inputs is
+        different from its content when the given record was saved."""
+
+        digests = self.state.hashes.digest_many(inputs)
+        for path in inputs:
+            recorded = record.inputs.get(path)
+            if recorded is None or digests[path] is None:
+                # A new or removed input
+                return True
+
+            if recorded.digest is None:
+                # The record was saved without digests (in 'mtime' mode), so
+                # we fall back to comparing modification times.
+                if self.state.stats.file_state(path).mtime > record.state.mtime:
+                    return True
+
+            elif recorded.digest != digests[path]:
+                return True
+
+        return False
 
-    def all_nodes(
+    @property
+    def dependencies(
         self,
-    ) -> typing.Generator["CompilationFileNode", None, None]:
-        # There are no nodes that are dependent on an object file, and thus
-        # this generator only yields the current node.
-        yield self
+    ) -> typing.List["CompilationFileNode"]:
+        # An object file depends only on its source file (which is not a node),
+        # and on its precompiled header.
+        return list() if self.pch is None else [self.pch]
+
+
+class PrecompiledHeaderNode(ObjectFileNode):
+    """A node that represents the precompiled version of a header, that is
+    included by all the objects of a target. The header is included through a
+    forwarding header in the output folder, and the precompiled header is
+    written next to it (where GCC looks for it). The node is invalidated when
+    one of the headers that the header includes changes, exactly like an
+    object file."""
+
+    def __init__(
+        self,
+        header: str,
+        forwarder: str,
+        compiler: AbstractCompiler,
+        includes: typing.List[str],
+        state: BuildState = None,
+    ) -> None:
+        dest = f"{forwarder}{compiler.pch_extension}"
+        super().__init__(header, dest, compiler, includes, parent=None, state=state)
+        self.forwarder = forwarder
+
+    @property
+    def key(
+        self,
+    ) -> tuple:
+        return ("pch", self.src, self.compiler.name, tuple(self.includes))
+
+    @property
+    def command(
+        self,
+    ) -> typing.List[str]:
+        return self.compiler.pch_cmd(
+            self.forwarder, self.includes, depfile=self.depfile
+        )
+
+    def generate(
+        self,
+    ) -> None:
+        write_includer(self.forwarder, [self.src], "precompiled header")
+        self.compiler.create_pch(self.forwarder, self.includes, depfile=self.depfile)
+
+    @property
+    def outputs(
+        self,
+    ) -> typing.List[str]:
+        return [self.dest, self.depfile, self.forwarder]
+
+    @property
+    def batch_key(
+        self,
+    ) -> typing.Optional[tuple]:
+        return None
+
+
+class UnityObjectNode(ObjectFileNode):
+    """A node that represents a unity chunk (a generated source that includes
+    multiple sources of a target) that is compiled into an object file. The
+    chunk is written only when the node is generated, and the node is
+    outdated when the members of the chunk change."""
+
+    def __init__(
+        self,
+        chunk: str,
+        members: typing.List[str],
+        dest: str,
+        compiler: AbstractCompiler,
+        includes: typing.List[str],
+        state: BuildState = None,
+        pch: "PrecompiledHeaderNode" = None,
+        extra_inputs: typing.List[str] = None,
+    ) -> None:
+        super().__init__(
+            chunk,
+            dest,
+            compiler,
+            includes,
+            parent=None,
+            state=state,
+            pch=pch,
+            extra_inputs=extra_inputs,
+        )
+        self.members = members
+
+    @property
+    def key(
+        self,
+    ) -> tuple:
+        return super().key + (tuple(self.members),)
+
+    def generate(
+        self,
+    ) -> None:
+        write_chunk(self.src, self.members)
+        super().generate()
+
+    @property
+    def outputs(
+        self,
+    ) -> typing.List[str]:
+        return [self.dest, self.depfile, self.src]
+
+    @property
+    def batch_key(
+        self,
+    ) -> typing.Optional[tuple]:
+        # The chunk must be written before it's compiled
+        return None
+
+    def _check_outdated(
+        self,
+    ) -> bool:
+        try:
+            with open(self.src, mode="r", encoding="utf8") as file:
+                content = file.read()
+        except FileNotFoundError:
+            return True
+
+        if content != includer_content(self.members, CHUNK_COMMENT):
+            return True
+        return super()._check_outdated()
 
 
 class ArchiveDependentFileNode(CompilationFileNode):
@@ -97,8 +545,9 @@ class ArchiveDependentFileNode(CompilationFileNode):
         dest: str,
         compiler: AbstractCompiler,
         parent,
+        state: BuildState = None,
     ) -> None:
-        super().__init__(dest, compiler, parent)
+        super().__init__(dest, compiler, parent, state=state)
         self.dep_archives: typing.List["ArchiveFileNode"] = list()
 
     def add_dep_archive(self, node: "ArchiveFileNode") -> None:
@@ -107,6 +556,40 @@ class ArchiveDependentFileNode(CompilationFileNode):
             self.dep_archives.append(node)
         return good
 
+    def _check_outdated(
+        self,
+    ) -> bool:
+        if super()._check_outdated():
+            return True
+
+        # An input that has changed since the node was generated hasn't been
+        # linked yet (for example, when the build has been cancelled after
+        # the input was generated).
+        record = self.state.log.get(self.dest)
+        dest_mtime = self.state.stats.file_state(self.dest).mtime
+        inputs = set(self.inputs)
+        for dep in self.dependencies:
+            if dep.dest not in inputs:
+                continue
+
+            state = self.state.stats.file_state(dep.dest)
+            if record is None:
+                if state is None or state.mtime > dest_mtime:
+                    return True
+                continue
+
+            recorded = record.inputs.get(dep.dest)
+            if recorded is None:
+                return True
+            if recorded.matches(state):
+                continue
+
+            # The file has been touched, so its content is compared instead
+            if recorded.digest is None or recorded.digest != dep.output_digest():
+                return True
+
+        return False
+
 
 class ArchiveFileNode(ArchiveDependentFileNode):
     """A node that represents an archive (collection) of multiple object
@@ -117,9 +600,14 @@ class ArchiveFileNode(ArchiveDependentFileNode):
         dest: str,
         compiler: AbstractCompiler,
         parent: "ExecutableFileNode" = None,
+        state: BuildState = None,
+        thin: bool = False,
     ) -> None:
-        super().__init__(dest, compiler, parent=parent)
+        """If 'thin' is True, the archive is a thin archive, that references
+        the object files in place instead of containing copies of them."""
+        super().__init__(dest, compiler, parent=parent, state=state)
         self.dep_objects: typing.List["ObjectFileNode"] = list()
+        self.thin = thin
 
     @property
     def is_empty(self) -> bool:
@@ -132,29 +620,94 @@ class ArchiveFileNode(ArchiveDependentFileNode):
             self.dep_objects.append(node)
         return good
 
+    def _changes(
+        self,
+    ) -> typing.Optional[typing.Tuple[typing.List[str], typing.List[str]]]:
+        """Compares the objects with the members of the archive when it was
+        last generated, and returns the objects that have changed (or are new),
+        and the names of the members that should be removed. Returns `None` if
+        the archive can't be updated in place, and should be created again."""
+
+        if self.thin:
+            # Thin archives are cheap to create, since they don't contain
+            # copies of the objects.
+            return None
+
+        record = self.state.log.get(self.dest)
+        if record is None or not record.state.matches(
+            self.state.stats.file_state(self.dest)
+        ):
+            return None
+
+        # Members are identified by their file names, so objects with the
+        # same name can't be updated separately.
+        objs = self.inputs
+        for paths in (objs, list(record.inputs)):
+            names = [os.path.basename(path) for path in paths]
+            if len(set(names)) != len(names):
+                return None
+
+        try:
+            with open(self.dest, mode="rb") as file:
+                if file.read(len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC:
+                    return None  # a thin archive, or an unknown format
+        except OSError:
+            return None
+
+        changed = [
+            path
+            for path in objs
+            if path not in record.inputs
+            or not record.inputs[path].matches(self.state.stats.file_state(path))
+        ]
+        removed = [os.path.basename(path) for path in record.inputs if path not in objs]
+        return changed, removed
+
     def generate(
         self,
     ) -> None:
         os.makedirs(os.path.dirname(self.dest), exist_ok=True)
-        objs = [obj.dest for obj in self.dep_objects]
-        self.compiler.create_archive(self.dest, objs)
+        changes = self._changes()
+        if changes is None:
+            self.compiler.create_archive(self.dest, self.inputs, thin=self.thin)
+        else:
+            self.compiler.update_archive(self.dest, self.inputs, *changes)
 
     @property
-    def outdated_subtree(
+    def pool(
         self,
-    ) -> bool:
-        return self.outdated or any(
-            dep.outdated_subtree for dep in self.dep_archives + self.dep_objects
-        )
+    ) -> typing.Optional[str]:
+        return "archive"
 
-    def all_nodes(
+    @property
+    def command(
         self,
-    ) -> typing.Generator["CompilationFileNode", None, None]:
-        for dep in self.dep_archives:
-            yield from dep.all_nodes()
-        for obj in self.dep_objects:
-            yield from obj.all_nodes()
-        yield self
+    ) -> typing.List[str]:
+        return self.compiler.archive_cmd(self.dest, self.inputs, thin=self.thin)
+
+    def output_digest(
+        self,
+    ) -> typing.Optional[str]:
+        digest = super().output_digest()
+        if not self.thin or digest is None:
+            return digest
+
+        # A thin archive doesn't contain the objects, so it may stay the same
+        # when one of them changes.
+        digests = self.state.hashes.digest_many(self.inputs)
+        return cache_key(digest, *(str(digests[path]) for path in self.inputs))
+
+    @property
+    def inputs(
+        self,
+    ) -> typing.List[str]:
+        return [obj.dest for obj in self.dep_objects]
+
+    @property
+    def dependencies(
+        self,
+    ) -> typing.List["CompilationFileNode"]:
+        return self.dep_archives + self.dep_objects
 
 
 class ExecutableFileNode(ArchiveDependentFileNode):
@@ -166,8 +719,9 @@ class ExecutableFileNode(ArchiveDependentFileNode):
         self,
         dest: str,
         compiler: AbstractCompiler,
+        state: BuildState = None,
     ) -> None:
-        super().__init__(dest, compiler, parent=None)
+        super().__init__(dest, compiler, parent=None, state=state)
 
     @property
     def is_empty(
@@ -179,18 +733,61 @@ class ExecutableFileNode(ArchiveDependentFileNode):
         self,
     ) -> None:
         os.makedirs(os.path.dirname(self.dest), exist_ok=True)
-        deps = [arc.dest for arc in self.dep_archives]
-        self.compiler.create_executable(self.dest, deps)
+        self.compiler.create_executable(self.dest, self.inputs)
 
     @property
-    def outdated_subtree(
+    def pool(
         self,
-    ) -> bool:
-        return self.outdated or any(dep.outdated_subtree for dep in self.dep_archives)
+    ) -> typing.Optional[str]:
+        return "link"
+
+    @property
+    def command(
+        self,
+    ) -> typing.List[str]:
+        return self.compiler.executable_cmd(self.dest, self.inputs)
+
+    @property
+    def inputs(
+        self,
+    ) -> typing.List[str]:
+        return [arc.dest for arc in self.dep_archives]
+
+    @property
+    def dependencies(
+        self,
+    ) -> typing.List["CompilationFileNode"]:
+        return list(self.dep_archives)
+
+
+class CompilationGraph:
+    """A directed acyclic graph that merges the compilation trees of multiple
+    targets. Object nodes that are identical between the targets (see
+    'ObjectFileNode.key') are stored only once, and are shared between all the
+    archives that contain them."""
+
+    def __init__(self) -> None:
+        self.heads: typing.List["CompilationFileNode"] = list()
+        self._objects: typing.Dict[tuple, "ObjectFileNode"] = dict()
+
+    def add_head(self, node: "CompilationFileNode") -> None:
+        """Registers the head node of a target (an archive or an executable)."""
+        if node not in self.heads:
+            self.heads.append(node)
+
+    def add_object(self, node: "ObjectFileNode") -> "ObjectFileNode":
+        """Returns the object node in the graph that is identical to the given
+        one. If there isn't such node yet, the given node is registered and
+        returned."""
+        return self._objects.setdefault(node.key, node)
 
     def all_nodes(
         self,
     ) -> typing.Generator["CompilationFileNode", None, None]:
-        for dep in self.dep_archives:
-            yield from dep.all_nodes()
-        yield self
+        """Generator that yields all nodes of all targets in the graph. Nodes
+        are yielded in order of dependence, and shared nodes are yielded only
+        once."""
+
+        visited = set()
+        for head in self.heads:
+            yield from head.all_nodes(visited)
@@ -0,0 +1,160 @@
+""" Content digests of files, memoized against the (inode, mtime, size) of
+the files so that unchanged files are never read twice. """
+
+import os
+import mmap
+import json
+import typing
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .scheduler import available_cpus
+
+if typing.TYPE_CHECKING:
+    from .statcache import StatCache  # pragma: no cover
+
+
+# Files that are at least this large are hashed through a memory map instead
+# of being read into memory.
+MMAP_THRESHOLD = 1024 * 1024
+
+
+def file_digest(path: str) -> str:
+    """Reads the file in the given path, and returns a hex digest of its
+    content."""
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, mode="rb") as file:
+        if os.fstat(file.fileno()).st_size >= MMAP_THRESHOLD:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                digest.update(mapped)
+        else:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+class HashCache:
+    """Calculates digests of files, and remembers them together with the
+    inode, modification time and size of each file. A file is read again only
+    if one of those changes. If a path is given, the cache is loaded from it
+    and saved to it, and it survives between runs. If a stat cache is given,
+    files are stat'ed through it."""
+
+    def __init__(
+        self,
+        path: typing.Optional[str] = None,
+        stats: "StatCache" = None,
+    ) -> None:
+        self.path = path
+        self._stats = stats
+        self._entries: typing.Dict[str, list] = dict()
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._pool = None
+
+        if path is not None:
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, mode="r", encoding="utf8") as file:
+                entries = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return
+
+        if isinstance(entries, dict):
+            self._entries = entries
+
+    def save(self) -> None:
+        """Saves the cache to its file, if it has been changed since it was
+        loaded."""
+
+        with self._lock:
+            if self.path is None or not self._dirty:
+                return
+
+            os.makedirs(os.path.dirname(self.path) or os.curdir, exist_ok=True)
+            temp = f"{self.path}.tmp"
+            with open(temp, mode="w", encoding="utf8") as file:
+                json.dump(self._entries, file, separators=(",", ":"))
+            os.replace(temp, self.path)
+            self._dirty = False
+
+    def close(self) -> None:
+        """Saves the cache, and stops the threads that are used for hashing."""
+        self.save()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _cached(self, path: str) -> typing.Tuple[typing.Optional[str], tuple]:
+        """Returns the cached digest of the given file (or `None` if it isn't
+        cached or outdated), and the current identity of the file. Raises
+        FileNotFoundError if the file doesn't exist."""
+
+        if self._stats is None:
+            stat = os.stat(path)
+        else:
+            stat = self._stats.stat(path)
+            if stat is None:
+                raise FileNotFoundError(path)
+
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is not None and tuple(entry[:3]) == identity:
+            return entry[3], identity
+        return None, identity
+
+    def _calculate(self, path: str, identity: tuple) -> typing.Optional[str]:
+        try:
+            digest = file_digest(path)
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            self._entries[path] = list(identity) + [digest]
+            self._dirty = True
+        return digest
+
+    def digest(self, path: str) -> typing.Optional[str]:
+        """Returns the digest of the file in the given path, or `None` if the
+        file doesn't exist."""
+        return self.digest_many([path])[path]
+
+    def digest_many(
+        self, paths: typing.Iterable[str]
+    ) -> typing.Dict[str, typing.Optional[str]]:
+        """Returns a dictionary that maps each of the given paths to the digest
+        of the file, or to `None` if the file doesn't exist. Files that need to
+        be read are hashed concurrently."""
+
+        digests = dict()
+        missing = dict()
+        for path in paths:
+            try:
+                digests[path], identity = self._cached(path)
+            except FileNotFoundError:
+                digests[path] = None
+                continue
+
+            if digests[path] is None:
+                missing[path] = identity
+
+        if len(missing) == 1:
+            path, identity = missing.popitem()
+            digests[path] = self._calculate(path, identity)
+
+        elif missing:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=available_cpus())
+            futures = {
+                path: self._pool.submit(self._calculate, path, identity)
+                for path, identity in missing.items()
+            }
+            for path, future in futures.items():
+                digests[path] = future.result()
+
+        return digests
@@ -0,0 +1,34 @@
+""" Generated source files that only include other files: unity chunks and
+forwarding headers of precompiled headers. """
+
+import os
+import typing
+
+
+def includer_content(paths: typing.List[str], comment: str) -> str:
+    """Returns the content of a file that includes the given files (by their
+    absolute paths), after a comment that describes the file."""
+
+    lines = [f"/* Generated by litemake ({comment}). Do not edit. */"]
+    for path in paths:
+        path = os.path.abspath(path).replace("\\", "/").replace('"', '\\"')
+        lines.append(f'#include "{path}"')
+    return "\n".join(lines) + "\n"
+
+
+def write_includer(path: str, paths: typing.List[str], comment: str) -> bool:
+    """Writes a file that includes the given files to the given path. The
+    file is written only if its content changes, so the modification time of
+    an unchanged file is kept. Returns True if the file has been written."""
+
+    content = includer_content(paths, comment)
+    try:
+        with open(path, mode="r", encoding="utf8") as file:
+            if file.read() == content:
+                return False
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, mode="w", encoding="utf8") as file:
+        file.write(content)
+    return True
@@ -0,0 +1,229 @@
+""" Support for the jobserver protocol of GNU make, which bounds the number of
+concurrent jobs across a whole tree of processes. A jobserver is a pipe (or a
+named pipe) that holds one token (a single byte) for each job that may run in
+addition to the first one. Every process holds one implicit token, and takes
+another token out of the pipe before it starts each additional job, and
+writes it back when the job is done.
+
+If litemake is called by make (with 'MAKEFLAGS' that carry the jobserver),
+it takes tokens from the jobserver of make. Otherwise, it creates its own
+jobserver, so the tools that it calls (such as sub-makes, or
+'-flto=jobserver') share its jobs instead of adding their own. The jobserver
+is a pair of file descriptors, since make understands named pipes only since
+version 4.4, so it reaches only the subprocesses that inherit them (see
+'inherited_fds'). """
+
+import os
+import stat
+import select
+import typing
+import threading
+from contextlib import contextmanager
+
+from litemake.printer import litemakePrinter as Printer
+
+# The token that litemake writes into the jobservers that it creates.
+TOKEN = b"+"
+
+# The jobserver of the parent make (see 'connect_parent').
+_parent: typing.Optional["JobServer"] = None
+
+# The jobserver that the current build uses (see 'jobserver'), so the
+# subprocesses of the compilers can inherit it.
+_current: typing.Optional["JobServer"] = None
+
+
+def parse_auth(makeflags: str) -> typing.Optional[str]:
+    """Returns the value of the last jobserver flag in the given 'MAKEFLAGS'
+    value ('--jobserver-auth', or the older '--jobserver-fds'), or `None` if
+    there isn't one."""
+
+    auth = None
+    for flag in makeflags.split():
+        for prefix in ("--jobserver-auth=", "--jobserver-fds="):
+            if flag.startswith(prefix):
+                auth = flag[len(prefix) :]
+    return auth or None
+
+
+def _is_pipe(fd: int) -> bool:
+    try:
+        return stat.S_ISFIFO(os.fstat(fd).st_mode)
+    except OSError:
+        return False
+
+
+class JobServer:
+    """A client of a jobserver, that reads tokens from the given file
+    descriptor and writes them back into the other given file descriptor.
+    'auth' is the value of the '--jobserver-auth' flag that gives the
+    jobserver to other processes. This class is thread safe."""
+
+    def __init__(
+        self, read_fd: int, write_fd: int, auth: str, owned: bool = True
+    ) -> None:
+        """If 'owned' is False, the file descriptors belong to the parent
+        make, and they aren't closed by 'close'."""
+
+        self.read_fd = read_fd
+        self.write_fd = write_fd
+        self.auth = auth
+        self.owned = owned
+        self._implicit = True  # whether the implicit token is free
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, jobs: int) -> "JobServer":
+        """Creates a new jobserver (a pipe) for the given number of jobs."""
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, TOKEN * (jobs - 1))
+        return cls(read_fd, write_fd, f"{read_fd},{write_fd}")
+
+    @classmethod
+    def from_makeflags(cls, makeflags: str) -> typing.Optional["JobServer"]:
+        """Connects to the jobserver in the given 'MAKEFLAGS' value: a named
+        pipe ('--jobserver-auth=fifo:PATH', since make 4.4) or a pair of
+        inherited file descriptors ('--jobserver-auth=R,W', or the older
+        '--jobserver-fds=R,W'). Returns `None` if the flags don't carry a
+        jobserver, or if it can't be reached (for example, when the parent
+        make hasn't passed its file descriptors, because the command isn't
+        marked as recursive with '+'). File descriptors that aren't pipes are
+        never used, since their numbers may have been reused for other files,
+        but they may still belong to this process (see 'connect_parent')."""
+
+        auth = parse_auth(makeflags)
+        if auth is None:
+            return None
+
+        if auth.startswith("fifo:"):
+            try:
+                fd = os.open(auth[len("fifo:") :], os.O_RDWR | os.O_NONBLOCK)
+            except OSError:
+                return None
+            if not _is_pipe(fd):
+                os.close(fd)
+                return None
+            return cls(fd, fd, auth)
+
+        try:
+            read_fd, write_fd = (int(fd) for fd in auth.split(","))
+        except ValueError:
+            return None
+        if not (_is_pipe(read_fd) and _is_pipe(write_fd)):
+            return None
+
+        # Another child of make may take the token between 'select' and
+        # 'read', so reading must never block (see 'try_acquire').
+        os.set_blocking(read_fd, False)
+        return cls(read_fd, write_fd, auth, owned=False)
+
+    @property
+    def fds(
+        self,
+    ) -> typing.Tuple[int, ...]:
+        """The file descriptors that subprocesses must inherit to use the
+        jobserver. A named pipe is reached by its path instead."""
+        if self.auth.startswith("fifo:"):
+            return tuple()
+        return (self.read_fd, self.write_fd)
+
+    def try_acquire(self) -> typing.Optional[bytes]:
+        """Returns the token of a new job, or `None` if no token is available
+        right now. The implicit token is an empty token."""
+
+        with self._lock:
+            if self._implicit:
+                self._implicit = False
+                return b""
+
+        readable, _, _ = select.select([self.read_fd], [], [], 0)
+        if not readable:
+            return None
+        try:
+            return os.read(self.read_fd, 1) or None
+        except BlockingIOError:
+            return None  # another process has taken the token first
+
+    def acquire(self) -> bytes:
+        """Blocks until a job may start, and returns the token of the job."""
+
+        while True:
+            token = self.try_acquire()
+            if token is not None:
+                return token
+            select.select([self.read_fd], [], [])
+
+    def release(self, token: bytes) -> None:
+        """Returns the given token (see 'acquire') after its job is done."""
+
+        if not token:
+            with self._lock:
+                self._implicit = True
+        else:
+            os.write(self.write_fd, token)
+
+    def close(self) -> None:
+        if self.owned:
+            for fd in {self.read_fd, self.write_fd}:
+                os.close(fd)
+
+
+def connect_parent() -> typing.Optional[JobServer]:
+    """Connects to the jobserver of the parent make, if 'MAKEFLAGS' carries
+    one, and returns it. Must be called when litemake starts, before it opens
+    any file, because the file descriptors of the jobserver are valid only if
+    the parent make has passed them, and otherwise their numbers may be taken
+    by the files of litemake. If the jobserver can't be reached, a warning is
+    printed, and the builds create their own jobserver instead."""
+
+    global _parent
+
+    makeflags = os.environ.get("MAKEFLAGS", "")
+    _parent = JobServer.from_makeflags(makeflags)
+    if _parent is None and parse_auth(makeflags) is not None:
+        Printer.warning(
+            "*jobserver unavailable:* the jobserver of the parent make can't be "
+            "reached (add '+' to the parent make rule)"
+        )
+    return _parent
+
+
+def parent() -> typing.Optional[JobServer]:
+    """The jobserver of the parent make (see 'connect_parent')."""
+    return _parent
+
+
+def inherited_fds() -> typing.Tuple[int, ...]:
+    """The file descriptors that the subprocesses of the current build must
+    inherit to use its jobserver."""
+    return _current.fds if _current is not None else tuple()
+
+
+@contextmanager
+def jobserver(jobs: int) -> typing.Iterator[typing.Optional[JobServer]]:
+    """Uses the jobserver of the parent make (see 'connect_parent'), or
+    creates a new jobserver for the given number of jobs. While the context
+    is active, 'MAKEFLAGS' gives the jobserver to the subprocesses that
+    inherit 'inherited_fds'. Yields `None` if jobservers aren't supported on
+    this platform."""
+
+    global _current
+
+    makeflags = os.environ.get("MAKEFLAGS")
+    server = _parent
+    if server is None and os.name == "posix":
+        server = JobServer.create(jobs)
+        flags = f"-j{jobs} --jobserver-auth={server.auth}"
+        os.environ["MAKEFLAGS"] = f"{makeflags} {flags}" if makeflags else flags
+
+    _current = server
+    try:
+        yield server
+    finally:
+        _current = None
+        if makeflags is None:
+            os.environ.pop("MAKEFLAGS", None)
+        else:
+            os.environ["MAKEFLAGS"] = makeflags
+        if server is not None and server is not _parent:
+            server.close()
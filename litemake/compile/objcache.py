@@ -0,0 +1,283 @@
+""" A content-addressed cache of compiled object files and archives. The cache
+is stored in a user-level directory, and is shared between all projects,
+clones and branches on the machine, similar to ccache. It may also be backed
+by a remote cache that is shared between machines (see 'remote.py'). """
+
+import os
+import json
+import shutil
+import typing
+import hashlib
+import threading
+from dataclasses import dataclass, asdict
+
+if typing.TYPE_CHECKING:
+    from .remote import RemoteCache  # pragma: no cover
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+# The 'FICLONE' ioctl request, that creates a copy-on-write clone (reflink) of
+# a file on file systems that support it (btrfs, xfs).
+FICLONE = 0x40049409
+
+# The default maximum size of the cache, in megabytes.
+DEFAULT_MAX_SIZE = 5 * 1024
+
+# When the cache grows above its maximum size, the least recently used entries
+# are removed until it shrinks to this fraction of the maximum size.
+CLEANUP_RATIO = 0.8
+
+
+def default_cache_path() -> str:
+    """The directory of the cache, if it isn't configured explicitly:
+    '$LITEMAKE_CACHE_DIR', or 'litemake' under '$XDG_CACHE_HOME' (which
+    defaults to '~/.cache')."""
+
+    path = os.environ.get("LITEMAKE_CACHE_DIR")
+    if path:
+        return path
+
+    base = os.environ.get("XDG_CACHE_HOME")
+    if not base:
+        base = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "litemake")
+
+
+def cache_key(*parts: str) -> str:
+    """Returns a digest of the given strings, that is used as the key of an
+    entry in the cache."""
+    digest = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        digest.update(part.encode("utf8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _reflink(src: str, dest: str) -> bool:
+    if fcntl is None:
+        return False
+
+    try:
+        with open(src, mode="rb") as source, open(dest, mode="wb") as target:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+    except OSError:
+        if os.path.lexists(dest):
+            os.remove(dest)
+        return False
+    return True
+
+
+def _hardlink(src: str, dest: str) -> bool:
+    try:
+        os.link(src, dest)
+    except OSError:
+        return False
+    return True
+
+
+def clone_file(src: str, dest: str, link: bool = True) -> None:
+    """Creates a copy of the file in 'src' at 'dest', replacing 'dest' if it
+    already exists. The file is cloned with a reflink if possible, then with a
+    hard link (only if 'link' is True), and is copied only if both fail."""
+
+    temp = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if not _reflink(src, temp) and not (link and _hardlink(src, temp)):
+        shutil.copyfile(src, temp)
+    os.replace(temp, dest)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    size: int = 0  # in bytes
+    remote_hits: int = 0  # included in 'hits'
+
+    def __add__(self, other: "CacheStats") -> "CacheStats":
+        return CacheStats(
+            hits=self.hits + other.hits,
+            misses=self.misses + other.misses,
+            size=self.size + other.size,
+            remote_hits=self.remote_hits + other.remote_hits,
+        )
+
+
+class ObjectCache:
+    """Stores compiled object files and archives under keys that describe
+    exactly how they were generated (see 'AbstractCompiler.create_obj'). Cache
+    hits are materialized by a reflink when possible, and are copied
+    otherwise. They are never hard linked, since the modification time of an
+    entry is updated whenever it is used, and it must not change files in the
+    output folders of other builds. Statistics are kept in the cache directory, and when the cache grows above
+    its maximum size, the least recently used entries are removed."""
+
+    def __init__(
+        self,
+        path: typing.Optional[str] = None,
+        max_size: int = DEFAULT_MAX_SIZE * 1024 * 1024,
+        remote: "RemoteCache" = None,
+    ) -> None:
+        """If a path isn't provided, the default path is used (see
+        'default_cache_path'). The maximum size is given in bytes. If a remote
+        cache is given, entries that are missing locally are downloaded from
+        it, and new entries are uploaded to it."""
+        self.path = path or default_cache_path()
+        self.max_size = max_size
+        self.remote = remote
+        self.session = CacheStats()  # changes made by this process
+        self._lock = threading.Lock()
+
+    @property
+    def stats_file(
+        self,
+    ) -> str:
+        return os.path.join(self.path, "stats.json")
+
+    def entry(self, key: str) -> str:
+        """Returns the path to the file of the entry with the given key."""
+        return os.path.join(self.path, key[:2], key)
+
+    def fetch(self, key: str, dest: str) -> bool:
+        """Copies the entry with the given key to 'dest', and returns True. If
+        the cache doesn't have such entry, returns False."""
+
+        entry = self.entry(key)
+        try:
+            # The modification time of the entry marks when it was last used
+            # (see 'cleanup').
+            os.utime(entry)
+            clone_file(entry, dest, link=False)
+        except FileNotFoundError:
+            if not self._download(key):
+                with self._lock:
+                    self.session.misses += 1
+                return False
+
+            clone_file(entry, dest, link=False)
+            with self._lock:
+                self.session.remote_hits += 1
+
+        with self._lock:
+            self.session.hits += 1
+        return True
+
+    def _download(self, key: str) -> bool:
+        """Downloads the entry with the given key from the remote cache.
+        Returns False if there is no remote cache, or if it doesn't have the
+        entry."""
+
+        if self.remote is None:
+            return False
+
+        data = self.remote.get(key)
+        if data is None:
+            return False
+
+        entry = self.entry(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        temp = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp, mode="wb") as file:
+            file.write(data)
+        os.replace(temp, entry)
+
+        with self._lock:
+            self.session.size += len(data)
+        return True
+
+    def store(self, key: str, src: str) -> None:
+        """Stores a copy of the file in 'src' under the given key. The entry
+        is uploaded to the remote cache in the background."""
+
+        entry = self.entry(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        clone_file(src, entry, link=False)
+
+        with self._lock:
+            self.session.size += os.path.getsize(entry)
+
+        if self.remote is not None:
+            self.remote.put(key, entry)
+
+    def _load_stats(self) -> CacheStats:
+        try:
+            with open(self.stats_file, mode="r", encoding="utf8") as file:
+                return CacheStats(**json.load(file))
+        except (FileNotFoundError, ValueError, TypeError):
+            return CacheStats()
+
+    def _save_stats(self, stats: CacheStats) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        temp = f"{self.stats_file}.{os.getpid()}.tmp"
+        with open(temp, mode="w", encoding="utf8") as file:
+            json.dump(asdict(stats), file)
+        os.replace(temp, self.stats_file)
+
+    def stats(self) -> CacheStats:
+        """The statistics of the cache, including changes that haven't been
+        saved yet. The size is approximated between cleanups, since multiple
+        processes can store the same entry."""
+        with self._lock:
+            return self._load_stats() + self.session
+
+    def _entries(self) -> typing.List[typing.Tuple[float, int, str]]:
+        """The modification time, size and path of all the entries."""
+
+        entries = list()
+        for dirpath, _, filenames in os.walk(self.path):
+            if dirpath == self.path:
+                continue  # only the statistics are stored in the top folder
+            for name in filenames:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def cleanup(self) -> None:
+        """Removes the least recently used entries, until the size of the
+        cache is below its maximum size (by some margin)."""
+
+        entries = sorted(self._entries())
+        size = sum(entry[1] for entry in entries)
+        limit = self.max_size * CLEANUP_RATIO
+
+        for _, entry_size, path in entries:
+            if size <= limit:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+        with self._lock:
+            stats = self._load_stats() + self.session
+            stats.size = size
+            self._save_stats(stats)
+            self.session = CacheStats()
+
+    def close(self) -> None:
+        """Waits for the uploads to the remote cache, saves the statistics of
+        this process, and cleans the cache if it has grown above its maximum
+        size."""
+
+        if self.remote is not None:
+            self.remote.close()
+
+        with self._lock:
+            if self.session == CacheStats():
+                return
+            stats = self._load_stats() + self.session
+            self._save_stats(stats)
+            self.session = CacheStats()
+
+        if stats.size > self.max_size:
+            self.cleanup()
@@ -0,0 +1,196 @@
+""" A client of a remote build cache, that is shared between machines (CI
+runners and developers). The protocol is plain HTTP: entries are downloaded
+with 'GET <url>/cache/<key>' and uploaded with 'PUT <url>/cache/<key>', where
+the key is the same key that is used by the local cache (see 'objcache.py').
+A reference server is available in 'cacheserver.py'. """
+
+import queue
+import typing
+import threading
+import http.client
+import urllib.parse
+from contextlib import contextmanager
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+from litemake.exceptions import litemakeError
+
+
+@dataclass
+class RemoteStats:
+    hits: int = 0
+    misses: int = 0
+    uploads: int = 0
+    errors: int = 0
+
+
+class RemoteCache:
+    """Downloads and uploads cache entries over HTTP. Connections are kept
+    alive and reused between requests, and uploads run in background threads
+    so they never block the compilation. The remote cache is only an
+    optimization, and thus network errors never fail the build: they are
+    counted, the entry is treated as missing, and the remote cache isn't
+    used again until the client is recreated (so an unreachable server
+    doesn't slow down every compilation)."""
+
+    def __init__(
+        self,
+        url: str,
+        upload: bool = True,
+        jobs: int = 4,
+        timeout: float = 10,
+    ) -> None:
+        """If 'upload' is False, entries are only downloaded from the remote
+        cache (a read-only client). 'jobs' is the maximum number of concurrent
+        uploads."""
+
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise litemakeError(f"*invalid remote cache url:* {url!r}")
+
+        self.url = url
+        self.upload = upload
+        self.timeout = timeout
+        self.stats = RemoteStats()
+        self.available = True
+
+        self._scheme = parts.scheme
+        self._host = parts.hostname
+        self._port = parts.port
+        self._base = parts.path.rstrip("/")
+
+        self._idle = queue.LifoQueue()  # idle connections, most recent first
+        self._jobs = jobs
+        self._uploads = None  # created on the first upload
+        self._lock = threading.Lock()
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        if self._scheme == "https":
+            cls = http.client.HTTPSConnection
+        else:
+            cls = http.client.HTTPConnection
+        return cls(self._host, self._port, timeout=self.timeout)
+
+    @contextmanager
+    def _connection(self, reuse: bool = True) -> typing.Generator[tuple, None, None]:
+        """Borrows an idle connection from the pool (or opens a new one, if
+        there isn't one or if 'reuse' is False), and returns it to the pool
+        after the request. Connections that fail in the middle of a request
+        are closed and aren't reused. Yields the connection, and True if it
+        has been used before."""
+
+        try:
+            if not reuse:
+                raise queue.Empty()
+            conn, reused = self._idle.get_nowait(), True
+        except queue.Empty:
+            conn, reused = self._new_connection(), False
+
+        try:
+            yield conn, reused
+        except BaseException:
+            conn.close()
+            raise
+        else:
+            self._idle.put(conn)
+
+    @staticmethod
+    def _send(
+        conn: http.client.HTTPConnection, method: str, path: str, body: bytes
+    ) -> typing.Tuple[int, bytes]:
+        conn.request(method, path, body=body)
+        response = conn.getresponse()
+        return response.status, response.read()
+
+    def _request(
+        self, method: str, key: str, body: bytes = None
+    ) -> typing.Tuple[int, bytes]:
+        """Sends a request for the given key, and returns the status and the
+        body of the response. If a reused connection fails, the request is
+        sent once more over a new connection, since the server may have closed
+        the idle connection. Raises an error if the request fails again."""
+
+        path = f"{self._base}/cache/{key}"
+        reused = False
+        try:
+            with self._connection() as (conn, reused):
+                return self._send(conn, method, path, body)
+        except (OSError, http.client.HTTPException):
+            if not reused:
+                raise
+
+        with self._connection(reuse=False) as (conn, _):
+            return self._send(conn, method, path, body)
+
+    def _count(self, field: str) -> None:
+        with self._lock:
+            setattr(self.stats, field, getattr(self.stats, field) + 1)
+
+    def _fail(self) -> None:
+        self._count("errors")
+        self.available = False
+
+    def get(self, key: str) -> typing.Optional[bytes]:
+        """Returns the content of the entry with the given key, or `None` if
+        the remote cache doesn't have it (or can't be reached)."""
+
+        if not self.available:
+            return None
+
+        try:
+            status, data = self._request("GET", key)
+        except (OSError, http.client.HTTPException):
+            self._fail()
+            return None
+
+        if status == 200:
+            self._count("hits")
+            return data
+
+        self._count("misses" if status == 404 else "errors")
+        return None
+
+    def _put(self, key: str, path: str) -> None:
+        if not self.available:
+            return
+
+        try:
+            with open(path, mode="rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return  # the entry has already been removed from the local cache
+
+        try:
+            status, _ = self._request("PUT", key, body=data)
+        except (OSError, http.client.HTTPException):
+            self._fail()
+            return
+
+        self._count("uploads" if status in (200, 201, 204) else "errors")
+
+    def put(self, key: str, path: str) -> None:
+        """Uploads the file in the given path under the given key, in the
+        background. The file must not be modified after this call. Does
+        nothing if the client is read-only."""
+
+        if not self.upload:
+            return
+
+        with self._lock:
+            if self._uploads is None:
+                self._uploads = ThreadPoolExecutor(max_workers=self._jobs)
+            self._uploads.submit(self._put, key, path)
+
+    def close(self) -> None:
+        """Waits for all the pending uploads, and closes the connections. The
+        client can still be used after it is closed."""
+
+        with self._lock:
+            uploads, self._uploads = self._uploads, None
+        if uploads is not None:
+            uploads.shutdown(wait=True)
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
@@ -0,0 +1,64 @@
+""" Limits on the load of the machine. New jobs are deferred while the machine
+is saturated, so parallel compilations of heavy sources don't exhaust the
+memory of the machine (and aren't killed by the kernel). """
+
+import os
+import typing
+from dataclasses import dataclass
+
+MEMINFO_PATH = "/proc/meminfo"
+
+
+def load_average() -> typing.Optional[float]:
+    """The average number of runnable processes over the last minute, or
+    `None` if it isn't available on this platform."""
+    try:
+        return os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return None
+
+
+def memory_usage() -> typing.Optional[float]:
+    """The percentage of the memory of the machine that is in use (not
+    available for new processes without swapping), or `None` if it isn't
+    available on this platform."""
+
+    info = dict()
+    try:
+        with open(MEMINFO_PATH, mode="r") as file:
+            for line in file:
+                name, _, value = line.partition(":")
+                info[name] = int(value.split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+    total, available = info.get("MemTotal"), info.get("MemAvailable")
+    if not total or available is None:
+        return None
+    return 100 * (total - available) / total
+
+
+@dataclass
+class ResourceLimits:
+    """The maximum load average (see 'load_average') and the maximum memory
+    usage percentage (see 'memory_usage') under which new jobs are started.
+    `None` means no limit."""
+
+    max_load: typing.Optional[float] = None
+    max_memory: typing.Optional[float] = None
+
+    def saturated(self) -> bool:
+        """True if the machine is above one of the limits. Limits that can't be
+        measured on this platform are ignored."""
+
+        if self.max_load is not None:
+            load = load_average()
+            if load is not None and load >= self.max_load:
+                return True
+
+        if self.max_memory is not None:
+            usage = memory_usage()
+            if usage is not None and usage >= self.max_memory:
+                return True
+
+        return False
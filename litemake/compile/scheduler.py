@@ -0,0 +1,338 @@
+import os
+import heapq
+import typing
+import itertools
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from .status import NodeFailed
+
+if typing.TYPE_CHECKING:
+    from .jobserver import JobServer  # pragma: no cover
+    from .resources import ResourceLimits  # pragma: no cover
+    from .collect import NodesCollector  # pragma: no cover
+    from .graph import CompilationFileNode  # pragma: no cover
+    from .status import NodeCompilationStatus  # pragma: no cover
+
+
+def available_cpus() -> int:
+    """Returns the number of CPUs that the current process is allowed to run
+    on. Used as the default number of concurrent jobs."""
+
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        # 'sched_getaffinity' isn't avaliable on Windows and MacOS.
+        return os.cpu_count() or 1
+
+
+# The expected duration of a node that has never been generated, if no other
+# node of the same type has been generated either (in seconds).
+DEFAULT_DURATION = 1.0
+
+# The number of times that a node is generated again after its compiler has
+# been killed (see 'litemakeCompilationError.killed'), before it fails.
+MAX_KILL_RETRIES = 3
+
+# While the machine is saturated, the limits are checked again after this
+# number of seconds (or when a job finishes, if it is sooner).
+THROTTLE_INTERVAL = 0.5
+
+# While no token of the jobserver is available, the jobserver is checked again
+# after this number of seconds (or when a job finishes, if it is sooner).
+TOKEN_INTERVAL = 0.05
+
+
+def expected_durations(
+    nodes: typing.List["CompilationFileNode"],
+) -> typing.Dict["CompilationFileNode", float]:
+    """Returns the expected duration of each of the given nodes: the duration
+    of its last generation in the build log. Nodes that have never been
+    generated are expected to take the average duration of the nodes of the
+    same type."""
+
+    durations = dict()
+    known = defaultdict(list)
+    for node in nodes:
+        record = node.state.log.get(node.dest)
+        if record is not None:
+            durations[node] = record.duration
+            known[type(node)].append(record.duration)
+
+    for node in nodes:
+        if node not in durations:
+            same = known[type(node)]
+            durations[node] = sum(same) / len(same) if same else DEFAULT_DURATION
+    return durations
+
+
+class JobScheduler:
+    """Generates the outdated nodes of a collector using multiple concurrent
+    jobs. A node is handed to a job only after all of its outdated dependencies
+    are done (passed, failed or skipped), and no more than `jobs` jobs run at
+    the same time. If `batch` is larger than 1, a job may generate up to
+    `batch` ready nodes with the same batch key together (see
+    'CompilationFileNode.batch_key').
+
+    Ready nodes are handed to jobs in order of their critical path: the
+    expected duration of the longest chain of outdated nodes from the node to
+    the top of the graph (see 'expected_durations'). Long compilations that
+    the final link waits for start first, instead of stretching the build at
+    its end.
+
+    'pools' limits the number of concurrent jobs of each job pool (see
+    'CompilationFileNode.pool'), for example to run fewer links than
+    compilations. Pools that aren't given, or whose size is 0, are limited
+    only by the number of jobs. While the machine is above the given resource
+    limits, new jobs are deferred (but at least one job always runs). If a
+    compiler is killed, which usually means that the machine has run out of
+    memory, the number of jobs is halved and the node is generated again.
+
+    By default, the build keeps going after a node fails, and every node that
+    doesn't depend on a failed node is still generated. If `fail_fast` is
+    True, the build is cancelled at the first failure instead: no new jobs are
+    started, the running compilers are killed, and all the nodes that haven't
+    been generated are marked as unbuilt.
+
+    If a jobserver is given (see 'jobserver.py'), each job takes a token from
+    it before it starts, so the build shares its jobs with the other
+    processes that use the same jobserver. Tokens are taken before nodes
+    leave the ready queue, so nodes still start in order of their critical
+    path."""
+
+    def __init__(
+        self,
+        collector: "NodesCollector",
+        jobs: int = None,
+        batch: int = 1,
+        pools: typing.Dict[str, int] = None,
+        limits: "ResourceLimits" = None,
+        fail_fast: bool = False,
+        jobserver: "JobServer" = None,
+    ) -> None:
+        self._collector = collector
+        self.jobs = jobs if jobs else available_cpus()
+        self.batch = batch
+        self.pools = {name: size for name, size in (pools or dict()).items() if size}
+        self.limits = limits
+        self.fail_fast = fail_fast
+        self.jobserver = jobserver
+        self.killed = 0  # the number of killed jobs, that have been retried
+        self.cancelled = False
+
+        self._active = defaultdict(int)  # the running jobs of each pool
+        self._retries = defaultdict(int)
+
+        nodes = collector.outdated_nodes
+        outdated = set(nodes)
+
+        # For each outdated node, count the outdated dependencies that it is
+        # waiting for, and remember which nodes are waiting for it.
+        self._waiting = dict()
+        self._dependents = defaultdict(list)
+        for node in nodes:
+            deps = [dep for dep in node.dependencies if dep in outdated]
+            self._waiting[node] = len(deps)
+            for dep in deps:
+                self._dependents[dep].append(node)
+
+        # Nodes are ordered by dependence, so the dependents of each node are
+        # handled before the node itself.
+        durations = expected_durations(nodes)
+        self.priority = dict()
+        for node in reversed(nodes):
+            chains = [self.priority[d] for d in self._dependents[node]]
+            self.priority[node] = durations[node] + max(chains, default=0.0)
+
+        # A heap of the ready nodes, with the longest critical path first.
+        # Nodes with the same critical path keep their order of dependence.
+        self._order = itertools.count()
+        self._ready = list()
+        for node in nodes:
+            if not self._waiting[node]:
+                self._push(node)
+
+    def _push(self, node: "CompilationFileNode") -> None:
+        entry = (-self.priority[node], next(self._order), node)
+        heapq.heappush(self._ready, entry)
+
+    def _release(self, node: "CompilationFileNode") -> None:
+        """Called after the given node is done. Moves all nodes that were
+        waiting only for the given node into the ready queue."""
+
+        for dependent in self._dependents[node]:
+            self._waiting[dependent] -= 1
+            if not self._waiting[dependent]:
+                self._push(dependent)
+
+    def _take_batch(
+        self, node: "CompilationFileNode", free: int
+    ) -> typing.List["CompilationFileNode"]:
+        """Returns a list of the given node, and ready nodes with the same
+        batch key that are taken out of the ready queue. The ready nodes are
+        divided evenly between the given number of free jobs, so batching
+        never leaves jobs idle."""
+
+        key = node.batch_key
+        size = min(self.batch, -(-(len(self._ready) + 1) // free))
+        if key is None or size < 2:
+            return [node]
+
+        batch = [node]
+        others = list()
+        while self._ready and len(batch) < size:
+            entry = heapq.heappop(self._ready)
+            other = entry[-1]
+            if other.batch_key == key and self._collector.status(other) is None:
+                batch.append(other)
+            else:
+                others.append(entry)
+
+        for entry in others:
+            heapq.heappush(self._ready, entry)
+        return batch
+
+    def _pool_full(self, node: "CompilationFileNode") -> bool:
+        size = self.pools.get(node.pool)
+        return size is not None and self._active[node.pool] >= size
+
+    def _saturated(self, running: int) -> bool:
+        return bool(running) and self.limits is not None and self.limits.saturated()
+
+    def _retry(self, nodes: typing.List["CompilationFileNode"], running: int) -> None:
+        """Called when the compiler of the given nodes has been killed while
+        the given number of other jobs were running. Halves the number of
+        concurrent jobs, and moves the nodes back into the ready queue."""
+
+        self.killed += 1
+        self.jobs = max(1, min(self.jobs, running + 1) // 2)
+        for node in nodes:
+            self._retries[node] += 1
+            self._push(node)
+
+    def _cancel(self) -> None:
+        """Called when a node fails in fail fast mode. Stops the build as soon
+        as possible."""
+
+        # The compilers import 'available_cpus' from this module
+        from .compilers.base import kill_running_processes
+
+        self.cancelled = True
+        self._collector.cancel()
+        kill_running_processes()
+
+    def _acquire(self) -> typing.Optional[bytes]:
+        """Takes a token of the jobserver for a new job, without blocking.
+        Returns `None` if no token is available."""
+        if self.jobserver is None:
+            return b""
+        return self.jobserver.try_acquire()
+
+    def _generate(
+        self,
+        batch: typing.List["CompilationFileNode"],
+        retry_killed: bool,
+        token: bytes,
+    ) -> typing.Dict["CompilationFileNode", "NodeCompilationStatus"]:
+        try:
+            if len(batch) == 1:
+                return {batch[0]: self._collector.generate(batch[0], retry_killed)}
+            return self._collector.generate_batch(batch, retry_killed)
+        finally:
+            if self.jobserver is not None:
+                self.jobserver.release(token)
+
+    def run(
+        self,
+    ) -> typing.Generator[
+        typing.Tuple["CompilationFileNode", "NodeCompilationStatus"], None, None
+    ]:
+        """Generates all outdated nodes, and yields a `(node, status)` pair
+        after each node is done, in the order of completion. If the build is
+        cancelled, the nodes that haven't been generated are yielded last."""
+
+        done_nodes = set()
+        running = dict()
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            while (self._ready and not self.cancelled) or running:
+                deferred = list()
+                throttled = False
+                starved = False  # no token of the jobserver is available
+                while self._ready and not self.cancelled and len(running) < self.jobs:
+                    entry = heapq.heappop(self._ready)
+                    node = entry[-1]
+                    status = self._collector.status(node)
+
+                    if status is not None:
+                        # The node is already marked as skipped because one of
+                        # its dependencies failed. No need to generate it.
+                        self._release(node)
+                        done_nodes.add(node)
+                        yield node, status
+
+                    elif self._pool_full(node):
+                        # Nodes of other pools may still be started
+                        deferred.append(entry)
+
+                    elif self._saturated(len(running)):
+                        deferred.append(entry)
+                        throttled = True
+                        break
+
+                    else:
+                        token = self._acquire()
+                        if token is None:
+                            deferred.append(entry)
+                            starved = True
+                            break
+
+                        batch = self._take_batch(node, self.jobs - len(running))
+                        retry = all(self._retries[n] < MAX_KILL_RETRIES for n in batch)
+                        future = pool.submit(self._generate, batch, retry, token)
+                        running[future] = batch
+                        self._active[node.pool] += 1
+
+                for entry in deferred:
+                    heapq.heappush(self._ready, entry)
+
+                if not running:
+                    continue
+
+                timeout = None
+                if throttled:
+                    timeout = THROTTLE_INTERVAL
+                elif starved:
+                    timeout = TOKEN_INTERVAL
+                try:
+                    done, _ = wait(
+                        running, timeout=timeout, return_when=FIRST_COMPLETED
+                    )
+                except KeyboardInterrupt:
+                    # The compilers run in their own process groups, so they
+                    # don't receive the interrupt themselves.
+                    self._cancel()
+                    raise
+                for future in done:
+                    batch = running.pop(future)
+                    self._active[batch[0].pool] -= 1
+                    results = future.result()
+
+                    killed = [
+                        node for node, status in results.items() if status is None
+                    ]
+                    if killed:
+                        self._retry(killed, len(running))
+
+                    for node, status in results.items():
+                        if status is None:
+                            continue
+                        if status is NodeFailed and self.fail_fast:
+                            if not self.cancelled:
+                                self._cancel()
+                        self._release(node)
+                        done_nodes.add(node)
+                        yield node, status
+
+        for node in self._collector.outdated_nodes:
+            if node not in done_nodes:
+                yield node, self._collector.abandon(node)
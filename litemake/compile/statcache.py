@@ -0,0 +1,62 @@
+""" A cache of 'os.stat' calls, so that each file is stat'ed at most once
+while litemake decides which nodes are outdated. """
+
+import os
+import typing
+
+from .buildlog import FileState
+
+
+class StatCache:
+    """Remembers the result of 'os.stat' for each path. Paths that are
+    modified by litemake itself (outputs of generated nodes) must be
+    invalidated, so their new state will be read."""
+
+    def __init__(self) -> None:
+        self._stats: typing.Dict[str, typing.Optional[os.stat_result]] = dict()
+
+    def __contains__(self, path: str) -> bool:
+        """True if the state of the given path is cached."""
+        return path in self._stats
+
+    def stat(self, path: str) -> typing.Optional[os.stat_result]:
+        """Returns the stat result of the given path, or `None` if the path
+        doesn't exist."""
+
+        try:
+            return self._stats[path]
+        except KeyError:
+            pass
+
+        try:
+            result = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            result = None
+
+        self._stats[path] = result
+        return result
+
+    def exists(self, path: str) -> bool:
+        return self.stat(path) is not None
+
+    def file_state(self, path: str) -> typing.Optional[FileState]:
+        """Returns the current state of the file in the given path, without
+        its digest. Returns `None` if the file doesn't exist."""
+        result = self.stat(path)
+        if result is None:
+            return None
+        return FileState(mtime=result.st_mtime_ns, size=result.st_size)
+
+    def invalidate(self, *paths: str) -> None:
+        """Forgets the cached state of the given paths."""
+        for path in paths:
+            self._stats.pop(path, None)
+
+    def retain(self, predicate: typing.Callable[[str], bool]) -> None:
+        """Forgets the cached state of all paths, except the paths for which
+        the given predicate returns True."""
+        self._stats = {p: s for p, s in self._stats.items() if predicate(p)}
+
+    def clear(self) -> None:
+        """Forgets the cached state of all paths."""
+        self._stats.clear()
@@ -0,0 +1,31 @@
+import typing
+
+from .buildlog import BuildLog
+from .hashcache import HashCache
+from .statcache import StatCache
+
+
+class BuildState:
+    """Everything that litemake remembers about previous builds. A single
+    instance is shared between all the nodes of a compilation graph, and the
+    nodes consult it when deciding if they are outdated."""
+
+    def __init__(
+        self,
+        log: typing.Optional[str] = None,
+        hashes: typing.Optional[str] = None,
+        use_hashes: bool = False,
+    ) -> None:
+        """If paths to the log file and the hash cache file aren't provided,
+        the state is kept only in memory and is forgotten when litemake exits.
+        If 'use_hashes' is True, inputs are considered changed only if their
+        content differs from their content in the last successful build."""
+        self.log = BuildLog(log)
+        self.stats = StatCache()
+        self.hashes = HashCache(hashes, stats=self.stats)
+        self.use_hashes = use_hashes
+
+    def close(self) -> None:
+        """Flushes and closes all the files that the state is stored in."""
+        self.log.close()
+        self.hashes.close()
@@ -50,6 +50,12 @@ class NodePassed(NodeCompilationStatus):
     priority: int = 0
 
 
+class NodeUnbuilt(NodeCompilationStatus):
+    title: str = "unbuilt"
+    color: str = Color.GREY
+    priority: int = 64
+
+
 class NodeSkipped(NodeCompilationStatus):
     title: str = "skipped"
     color: str = Color.YELLOW
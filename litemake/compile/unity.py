@@ -0,0 +1,61 @@
+""" Unity (jumbo) builds: the sources of a target are amalgamated into a few
+translation units ("chunks") that include multiple sources each, so common
+headers are parsed once per chunk instead of once per source. """
+
+import os
+import typing
+import hashlib
+
+from .includer import write_includer
+
+# The comment at the top of the chunks.
+CHUNK_COMMENT = "unity build"
+
+
+def _bucket(source: str, base: str, buckets: int) -> int:
+    """Returns the chunk of the given source, out of the given number of
+    chunks. The chunk depends only on the path of the source (relative to
+    the given folder), and not on the other sources."""
+    rel = os.path.relpath(source, base).replace("\\", "/")
+    digest = hashlib.sha1(rel.encode("utf8")).digest()
+    return int.from_bytes(digest[:8], "big") % buckets
+
+
+def split_chunks(
+    sources: typing.List[str], size: int, base: str = os.curdir
+) -> typing.List[typing.Tuple[int, typing.List[str]]]:
+    """Splits the given sources into chunks of about the given size, and
+    returns the index and the sources of each chunk. Sources of different
+    languages (extensions) are never in the same chunk, and the order of the
+    sources is kept in each chunk.
+
+    Each source is assigned to a chunk by a hash of its path, so adding or
+    removing a source changes only the chunk it belongs to, and the objects
+    of the other chunks aren't compiled again. The number of chunks is a
+    power of two, so sources move between chunks only when the number of
+    sources doubles or halves."""
+
+    groups: typing.Dict[str, typing.List[str]] = dict()
+    for source in sources:
+        ext = os.path.splitext(source)[1]
+        groups.setdefault(ext, list()).append(source)
+
+    chunks = list()
+    for group in groups.values():
+        buckets = 1
+        while buckets * size < len(group):
+            buckets *= 2
+
+        members: typing.Dict[int, typing.List[str]] = dict()
+        for source in group:
+            members.setdefault(_bucket(source, base, buckets), list()).append(source)
+        chunks += sorted(members.items())
+
+    return chunks
+
+
+def write_chunk(path: str, members: typing.List[str]) -> bool:
+    """Writes the chunk that includes the given sources to the given path,
+    only if its content changes (see 'write_includer'). Returns True if the
+    file has been written."""
+    return write_includer(path, members, CHUNK_COMMENT)
@@ -0,0 +1,5 @@
+""" A build daemon, that keeps the state of a project in memory between
+builds (see 'server.py'). Only the client is imported here, since it is
+used by every invocation of litemake and must be imported quickly. """
+
+from .client import available, socket_path, connect, request, spawn
@@ -0,0 +1,142 @@
+""" The client side of the build daemon. The client imports only the standard
+library, so forwarding a build to a running daemon is fast. Messages are
+single lines of JSON in both directions: the client sends a single request,
+and the daemon answers with the output of the request ('output' messages),
+followed by a single 'result' or 'error' message. """
+
+import os
+import sys
+import json
+import stat
+import socket
+import typing
+import time
+import hashlib
+import tempfile
+import subprocess
+
+
+# Variables that describe only the shell or the terminal of the client, and
+# don't change the builds (see 'environment_digest').
+SESSION_VARIABLES = {"_", "PWD", "OLDPWD", "SHLVL", "TERM", "COLUMNS", "LINES"}
+
+
+def available() -> bool:
+    """True if daemons are supported on this platform (they are reached over
+    Unix sockets, in a folder that is checked by its owner)."""
+    return os.name == "posix" and hasattr(socket, "AF_UNIX")
+
+
+def socket_folder() -> str:
+    """The folder of the sockets of the daemons of the current user, in the
+    runtime folder of the user, or in the temporary folder, since the length
+    of a socket path is limited. The folder is created accessible only by
+    the user. Raises a PermissionError if the existing folder belongs to
+    another user, or if other users can access it, since they could replace
+    the sockets and receive the builds of the user."""
+
+    base = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    folder = os.path.join(base, f"litemake-{os.getuid()}")
+    try:
+        os.mkdir(folder, mode=0o700)
+    except FileExistsError:
+        pass
+
+    info = os.lstat(folder)
+    if (
+        not stat.S_ISDIR(info.st_mode)
+        or info.st_uid != os.getuid()
+        or info.st_mode & 0o077
+    ):
+        raise PermissionError(f"{folder!r} must be a private folder of the user")
+    return folder
+
+
+def socket_path(home: str) -> str:
+    """The path to the socket of the daemon of the project in the given
+    folder (see 'socket_folder')."""
+
+    home = os.path.realpath(home)
+    digest = hashlib.sha1(home.encode("utf8")).hexdigest()[:16]
+    return os.path.join(socket_folder(), f"{digest}.sock")
+
+
+def environment_digest(environ: typing.Mapping[str, str] = None) -> str:
+    """A digest of the given environment variables (of the current process by
+    default), except for 'SESSION_VARIABLES'. The daemon builds with the
+    environment that it has been started with, so it accepts only builds of
+    clients with the same environment (and thus the same 'PATH')."""
+
+    environ = os.environ if environ is None else environ
+    items = sorted(
+        (key, value) for key, value in environ.items() if key not in SESSION_VARIABLES
+    )
+    return hashlib.sha1(json.dumps(items).encode("utf8")).hexdigest()
+
+
+def connect(home: str) -> typing.Optional[socket.socket]:
+    """Connects to the daemon of the project in the given folder. Returns
+    `None` if the daemon isn't running, if its socket can't be trusted (see
+    'socket_folder'), or if daemons aren't supported (see 'available')."""
+
+    if not available():
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path(home))
+    except (FileNotFoundError, ConnectionRefusedError, PermissionError):
+        sock.close()
+        return None
+    return sock
+
+
+def request(
+    home: str, message: dict, stream: typing.TextIO = None
+) -> typing.Optional[dict]:
+    """Sends the given request to the daemon of the project in the given
+    folder, and writes its output to the given stream (stdout by default).
+    Returns the last message of the daemon (with a 'result' or an 'error'
+    key), or `None` if the daemon isn't running."""
+
+    sock = connect(home)
+    if sock is None:
+        return None
+
+    stream = stream or sys.stdout
+    with sock, sock.makefile(mode="rwb") as file:
+        file.write(json.dumps(message).encode("utf8") + b"\n")
+        file.flush()
+
+        for line in file:
+            answer = json.loads(line)
+            if "output" not in answer:
+                return answer
+            stream.write(answer["output"])
+            stream.flush()
+
+    return {"error": ["*daemon error:*", "the daemon has closed the connection"]}
+
+
+def spawn(home: str, timeout: float = 10) -> bool:
+    """Starts the daemon of the project in the given folder in the background,
+    and waits until it accepts connections. Returns False if the daemon
+    hasn't started in time."""
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "litemake", "daemon", "run"],
+        cwd=home,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and process.poll() is None:
+        sock = connect(home)
+        if sock is not None:
+            sock.close()
+            return True
+        time.sleep(0.05)
+    return False
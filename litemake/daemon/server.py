@@ -0,0 +1,376 @@
+""" The build daemon: a background server per project, that keeps the parsed
+configuration, the compilation graphs and the state of the files in memory
+between builds, and is reached over a Unix socket (see 'client.py'). Changes
+in the project folder are tracked by file system notifications, so a build
+checks again only the files that have actually changed. The daemon can be
+started with:
+
+    litemake daemon start
+"""
+
+import os
+import json
+import time
+import typing
+import threading
+import traceback
+import socketserver
+from fnmatch import fnmatch
+from contextlib import redirect_stdout, redirect_stderr
+
+from litemake.__main__ import build
+from litemake.constants import (
+    PACKAGE_CONFIG_FILENAME,
+    TARGETS_CONFIG_FILENAME,
+    SETTINGS_FILENAME,
+)
+from litemake.exceptions import litemakeError
+from litemake.folders import ProjectFolder
+
+from .client import socket_path, connect, environment_digest
+from .watcher import FileWatcher, Changes
+
+if typing.TYPE_CHECKING:
+    from litemake.compile.graph import CompilationGraph  # pragma: no cover
+
+
+def _inside(path: str, folder: str) -> bool:
+    return path.startswith(folder + os.sep)
+
+
+class BuildSession:
+    """Keeps a project folder for each build profile, and a compilation graph
+    for each set of targets that has been built, and reuses them between
+    builds. Before each build, the changes that have been made in the project
+    folder are applied: the cached state of modified files is forgotten, the
+    graphs are collected again if files have been added or removed, and
+    everything is parsed again if the configuration files have changed. If
+    file system notifications aren't available, nothing is reused."""
+
+    def __init__(self, home: str) -> None:
+        self.home = os.path.abspath(home)
+        self._projects: typing.Dict[typing.Optional[str], ProjectFolder] = dict()
+        self._graphs: typing.Dict[tuple, "CompilationGraph"] = dict()
+        self._watcher: typing.Optional[FileWatcher] = None
+        self._pending = Changes()  # read by 'wait', but not applied yet
+
+    @property
+    def configs(
+        self,
+    ) -> typing.Set[str]:
+        return {
+            os.path.join(self.home, PACKAGE_CONFIG_FILENAME),
+            os.path.join(self.home, TARGETS_CONFIG_FILENAME),
+            os.path.join(self.home, SETTINGS_FILENAME),
+        }
+
+    def reset(self) -> None:
+        """Forgets everything, so the next build starts from scratch."""
+        self._projects.clear()
+        self._graphs.clear()
+        self._pending = Changes()
+        if self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
+
+    def refresh(self) -> None:
+        """Applies the changes that have been made in the project folder since
+        the last build."""
+
+        if self._watcher is None:
+            self.reset()
+            return
+
+        changes, self._pending = self._pending, Changes()
+        changes.update(self._watcher.poll())
+        if changes.overflow or changes.modified & self.configs:
+            self.reset()
+            return
+
+        if any(self._adds_sources(p, changes) for p in self._projects.values()):
+            self._graphs.clear()
+        for project in self._projects.values():
+            project.state.stats.invalidate(*changes.modified)
+
+    def _affects_build(self, changes: Changes) -> bool:
+        """True if the given changes may change the result of a build: if the
+        configuration or the sources may have changed, or if a file that the
+        last build has read has changed."""
+
+        if changes.overflow or changes.modified & self.configs:
+            return True
+        return any(
+            self._adds_sources(project, changes)
+            or any(path in project.state.stats for path in changes.modified)
+            for project in self._projects.values()
+        )
+
+    def wait(self, debounce: float = 0.2, timeout: float = None) -> bool:
+        """Blocks until a change that affects the build is made in the project
+        folder, or until the given number of seconds has passed. Bursts of
+        changes (such as saving many files at once) are merged: the session
+        waits until no change is made for 'debounce' seconds. Returns True if
+        the build is affected. Raises an error if file system notifications
+        aren't available."""
+
+        if self._watcher is None:
+            if not FileWatcher.available():
+                raise litemakeError(
+                    "*watch error:*", "file system notifications aren't available"
+                )
+
+            # The configuration can't be parsed, so nothing is excluded until
+            # it is fixed.
+            self._watcher = FileWatcher(self.home)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            if not self._watcher.wait(remaining):
+                return False
+
+            while self._watcher.wait(debounce):
+                self._pending.update(self._watcher.poll())
+            if self._affects_build(self._pending):
+                return True
+
+    def project(self, profile: str = None) -> ProjectFolder:
+        """The project folder of the given build profile."""
+
+        project = self._projects.get(profile)
+        if project is not None:
+            return project
+
+        project = ProjectFolder(self.home, profile=profile)
+        if self._watcher is None and FileWatcher.available():
+            self._watcher = FileWatcher(self.home, exclude=[project.settings.output])
+        self._projects[profile] = project
+        return project
+
+    def watches(self, project: ProjectFolder, path: str) -> bool:
+        """True if changes in the given path are noticed by the session. The
+        output folder of the project isn't watched."""
+        output = os.path.abspath(project.settings.output)
+        return (
+            self._watcher is not None
+            and _inside(path, self.home)
+            and not _inside(path, output)
+        )
+
+    def graph(self, project: ProjectFolder, *targets: str) -> "CompilationGraph":
+        """The compilation graph of the given targets. A graph is reused only
+        if all the sources of the project are inside the watched folder, so
+        sources that are added elsewhere are found."""
+
+        key = (project.profile.name, targets)
+        graph = self._graphs.get(key)
+        if graph is not None:
+            for node in graph.all_nodes():
+                node.reset()
+            return graph
+
+        graph = project.collect(*targets)
+        if self._globs_watched(project):
+            self._graphs[key] = graph
+        return graph
+
+    @staticmethod
+    def _patterns(project: ProjectFolder) -> typing.List[str]:
+        """The absolute glob patterns of the sources of all the targets."""
+        return [
+            os.path.abspath(os.path.join(project.settings.home, glb))
+            for name in project.targets.targets
+            for glb in project.targets.target(name).sources
+        ]
+
+    def _globs_watched(self, project: ProjectFolder) -> bool:
+        return all(self.watches(project, p) for p in self._patterns(project))
+
+    def _adds_sources(self, project: ProjectFolder, changes: Changes) -> bool:
+        """True if the given changes may add or remove sources of the given
+        project. Files that don't match any of the patterns of the sources
+        (such as installed executables) and hidden folders are ignored."""
+
+        if any(not os.path.basename(f).startswith(".") for f in changes.folders):
+            return True
+
+        patterns = self._patterns(project)
+        return any(fnmatch(f, p) for f in changes.files for p in patterns)
+
+    def build(
+        self,
+        *targets: str,
+        jobs: int = None,
+        profile: str = None,
+        max_load: float = None,
+        max_memory: float = None,
+        fail_fast: bool = False,
+    ) -> bool:
+        """Builds the given targets, like 'litemake.__main__.make' does."""
+
+        self.refresh()
+        project = self.project(profile)
+        graph = self.graph(project, *targets)
+
+        # The state of files outside the watched folder (such as system
+        # headers and the outputs) can't be trusted between builds.
+        project.state.stats.retain(lambda path: self.watches(project, path))
+
+        return build(
+            project,
+            *targets,
+            jobs=jobs,
+            graph=graph,
+            max_load=max_load,
+            max_memory=max_memory,
+            fail_fast=fail_fast,
+        )
+
+    def close(self) -> None:
+        self.reset()
+
+
+class _OutputWriter:
+    """A text stream that sends everything that is written to it to the
+    client. If the client has disconnected, the output is discarded, so the
+    build isn't interrupted."""
+
+    def __init__(self, file: typing.BinaryIO) -> None:
+        self._file = file
+        self._closed = False
+
+    def send(self, message: dict) -> None:
+        if self._closed:
+            return
+        try:
+            self._file.write(json.dumps(message).encode("utf8") + b"\n")
+            self._file.flush()
+        except OSError:
+            self._closed = True
+
+    def write(self, text: str) -> int:
+        if text:
+            self.send({"output": text})
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+    def isatty(self) -> bool:
+        return False
+
+
+class _DaemonRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        try:
+            message = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+
+        writer = _OutputWriter(self.wfile)
+        with redirect_stdout(writer), redirect_stderr(writer):
+            try:
+                answer = self.server.execute(message)
+            except litemakeError as error:
+                answer = {"error": list(error.msg)}
+            except Exception:
+                traceback.print_exc()
+                answer = {"error": ["*daemon error:*", "the request has failed"]}
+        writer.send(answer)
+
+
+class DaemonServer(socketserver.UnixStreamServer):
+    """Serves the requests of the clients of the project in the given folder,
+    one request at a time. Requests are JSON objects with a 'command' key:
+    'build' (with the arguments of 'BuildSession.build'), 'status' or 'stop'.
+    Builds are rejected (with an 'environment' key in the error) if their
+    'environment' isn't the digest of the environment of the daemon (see
+    'environment_digest')."""
+
+    def __init__(self, home: str) -> None:
+        """Raises an error if a daemon is already running for the project."""
+
+        self.home = os.path.abspath(home)
+        self.session = BuildSession(self.home)
+        self.environment = environment_digest()
+        try:
+            self.path = socket_path(self.home)
+        except PermissionError as error:
+            raise litemakeError("*daemon error:*", str(error))
+
+        sock = connect(self.home)
+        if sock is not None:
+            sock.close()
+            raise litemakeError(
+                "*daemon error:*", f"a daemon is already running for {self.home!r}"
+            )
+
+        if os.path.exists(self.path):
+            os.remove(self.path)  # left by a daemon that has been killed
+        super().__init__(self.path, _DaemonRequestHandler)
+
+    def execute(self, message: dict) -> dict:
+        """Executes a single request, and returns the last message of the
+        answer."""
+
+        command = message.get("command")
+        if command == "build":
+            if message.get("environment") != self.environment:
+                return {
+                    "error": [
+                        "*daemon error:*",
+                        "the daemon has been started with another environment",
+                    ],
+                    "environment": True,
+                }
+            success = self.session.build(
+                *message.get("targets", list()),
+                jobs=message.get("jobs"),
+                profile=message.get("profile"),
+                max_load=message.get("max_load"),
+                max_memory=message.get("max_memory"),
+                fail_fast=message.get("fail_fast", False),
+            )
+            return {"result": success}
+
+        if command == "status":
+            return {"result": True, "pid": os.getpid(), "home": self.home}
+
+        if command == "stop":
+            # 'shutdown' waits for the current request, so it can't be called
+            # from the thread that handles it.
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {"result": True}
+
+        raise litemakeError("*daemon error:*", f"unknown command {command!r}")
+
+    def start(self) -> threading.Thread:
+        """Serves requests in a background thread, until 'shutdown' is
+        called."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.session.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def serve(home: str) -> None:
+    """Runs the daemon of the project in the given folder, until it is
+    stopped by a client (or interrupted)."""
+
+    os.chdir(home)
+    server = DaemonServer(home)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,183 @@
+""" Watches a folder tree for changes using the Linux 'inotify' API (through
+ctypes, so no extra dependency is needed). The daemon uses the watcher to
+know which files have changed between builds, instead of checking the state
+of every file again. """
+
+import os
+import sys
+import errno
+import select
+import struct
+import typing
+import ctypes
+import ctypes.util
+from dataclasses import dataclass, field
+
+
+# Flags and event masks, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+# Events that change the content of a file, but not the list of files
+CONTENT_EVENTS = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE
+
+# Events that add, remove or rename files or folders
+STRUCTURE_EVENTS = (
+    IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+)
+
+WATCH_MASK = CONTENT_EVENTS | STRUCTURE_EVENTS | IN_ONLYDIR
+
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, length of the name
+
+
+@dataclass
+class Changes:
+    """The changes that have been made in the watched tree since they were
+    last polled. 'modified' contains all the changed paths, while 'files' and
+    'folders' contain only the files and the folders that have been created,
+    removed or renamed. If 'overflow' is True, some events have been lost,
+    and anything may have changed."""
+
+    modified: typing.Set[str] = field(default_factory=set)
+    files: typing.Set[str] = field(default_factory=set)
+    folders: typing.Set[str] = field(default_factory=set)
+    overflow: bool = False
+
+    def __bool__(self) -> bool:
+        return self.overflow or bool(self.modified)
+
+    def update(self, other: "Changes") -> None:
+        """Adds the given changes to these changes."""
+        self.modified |= other.modified
+        self.files |= other.files
+        self.folders |= other.folders
+        self.overflow = self.overflow or other.overflow
+
+
+def _load_libc() -> typing.Optional[ctypes.CDLL]:
+    if not sys.platform.startswith("linux"):
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):  # pragma: no cover
+        return None
+    return libc
+
+
+class FileWatcher:
+    """Watches all the (non hidden) folders under the given root, except the
+    excluded folders. New folders are watched as soon as they are created."""
+
+    _libc = _load_libc()
+
+    def __init__(self, root: str, exclude: typing.List[str] = None) -> None:
+        """Raises an 'OSError' if the watcher can't be created (see
+        'available')."""
+
+        if self._libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+
+        self.root = os.path.abspath(root)
+        self.exclude = {os.path.abspath(path) for path in exclude or list()}
+        self._watches: typing.Dict[int, str] = dict()
+
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+        self._fd = fd
+
+        self._watch_tree(self.root)
+
+    @classmethod
+    def available(cls) -> bool:
+        """True if file system notifications are supported on this platform."""
+        return cls._libc is not None
+
+    def _watch_tree(self, folder: str) -> None:
+        """Watches the given folder and all the folders under it."""
+
+        for dirpath, dirnames, _ in os.walk(folder):
+            if dirpath in self.exclude:
+                dirnames[:] = list()
+                continue
+
+            dirnames[:] = [n for n in dirnames if not n.startswith(".")]
+            wd = self._libc.inotify_add_watch(
+                self._fd, os.fsencode(dirpath), WATCH_MASK
+            )
+            if wd >= 0:
+                self._watches[wd] = dirpath
+
+    def _events(self) -> typing.Generator[typing.Tuple[int, int, str], None, None]:
+        """Reads all the pending events, without blocking. Yields the watch
+        descriptor, the mask and the name of each event."""
+
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                yield wd, mask, os.fsdecode(name)
+
+    def wait(self, timeout: float = None) -> bool:
+        """Blocks until there are pending changes, or until the given number of
+        seconds has passed. Returns True if there are pending changes."""
+        ready, _, _ = select.select([self._fd], list(), list(), timeout)
+        return bool(ready)
+
+    def poll(self) -> Changes:
+        """Returns the changes that have been made since the last call."""
+
+        changes = Changes()
+        for wd, mask, name in self._events():
+            if mask & IN_Q_OVERFLOW:
+                changes.overflow = True
+                continue
+
+            folder = self._watches.get(wd)
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            if folder is None:
+                continue
+
+            path = os.path.join(folder, name) if name else folder
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                if not name.startswith("."):
+                    self._watch_tree(path)
+
+            if mask & STRUCTURE_EVENTS:
+                folder_event = mask & IN_ISDIR or not name
+                added = changes.folders if folder_event else changes.files
+                added.add(path)
+            changes.modified.add(path)
+
+        return changes
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
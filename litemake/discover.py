@@ -0,0 +1,186 @@
+""" discover.py - litemake - Alon Krymgand Osovsky (2021)
+
+    Expands the glob patterns of the source files of targets. The content of
+    each directory that is walked is cached together with the modification
+    time of the directory, and only directories that have been changed since
+    the last run are listed again. """
+
+import os
+import json
+import typing
+import threading
+from fnmatch import fnmatch
+from glob import has_magic
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _ishidden(name: str) -> bool:
+    return name.startswith(".")
+
+
+class SourcesDiscovery:
+    """Expands glob patterns exactly like `glob.glob(pattern, recursive=True)`
+    does, but returns only files, in sorted order, and caches the listing of
+    the walked directories. If a path is given, the cache is loaded from it
+    and saved to it, and it survives between runs."""
+
+    def __init__(self, path: typing.Optional[str] = None) -> None:
+        self.path = path
+        self._dirs: typing.Dict[str, list] = dict()
+        self._fresh: typing.Set[str] = set()  # directories checked in this run
+        self._dirty = False
+        self._lock = threading.Lock()
+
+        if path is not None:
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, mode="r", encoding="utf8") as file:
+                dirs = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return
+
+        if isinstance(dirs, dict):
+            self._dirs = dirs
+
+    def save(self) -> None:
+        """Saves the cached directories to the file, if they have been changed
+        since they were loaded."""
+
+        with self._lock:
+            if self.path is None or not self._dirty:
+                return
+
+            os.makedirs(os.path.dirname(self.path) or os.curdir, exist_ok=True)
+            temp = f"{self.path}.tmp"
+            with open(temp, mode="w", encoding="utf8") as file:
+                json.dump(self._dirs, file, separators=(",", ":"))
+            os.replace(temp, self.path)
+            self._dirty = False
+
+    def _listdir(self, dirname: str) -> typing.Tuple[typing.List[str], list]:
+        """Returns two lists with the names of the files and the names of the
+        directories inside the given directory. The directory is listed only
+        if it has been modified since it was listed last time."""
+
+        path = os.path.normpath(dirname) if dirname else os.curdir
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except (FileNotFoundError, NotADirectoryError):
+            return list(), list()
+
+        with self._lock:
+            cached = self._dirs.get(path)
+            if cached is not None and cached[0] == mtime:
+                self._fresh.add(path)
+                return cached[1], cached[2]
+
+        files, dirs = list(), list()
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        dirs.append(entry.name)
+                    elif entry.is_file():
+                        files.append(entry.name)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            return list(), list()
+
+        with self._lock:
+            self._dirs[path] = [mtime, files, dirs]
+            self._fresh.add(path)
+            self._dirty = True
+        return files, dirs
+
+    def _glob1(self, dirname: str, pattern: str, dironly: bool) -> typing.List[str]:
+        """Names inside the given directory that match a pattern without
+        slashes."""
+        files, dirs = self._listdir(dirname)
+        names = dirs if dironly else files + dirs
+        if not _ishidden(pattern):
+            names = [n for n in names if not _ishidden(n)]
+        return [n for n in names if fnmatch(n, pattern)]
+
+    def _glob2(self, dirname: str, dironly: bool) -> typing.Generator[str, None, None]:
+        """Relative paths of all the (non hidden) files and directories under
+        the given directory, for the recursive '**' pattern."""
+        yield ""
+        yield from self._rlistdir(dirname, dironly)
+
+    def _rlistdir(
+        self, dirname: str, dironly: bool
+    ) -> typing.Generator[str, None, None]:
+        files, dirs = self._listdir(dirname)
+        names = dirs if dironly else files + dirs
+        for name in names:
+            if _ishidden(name):
+                continue
+            yield name
+            if name in dirs:
+                path = os.path.join(dirname, name) if dirname else name
+                for sub in self._rlistdir(path, dironly):
+                    yield os.path.join(name, sub)
+
+    def _iglob(self, pathname: str, dironly: bool) -> typing.Generator[str, None, None]:
+        dirname, basename = os.path.split(pathname)
+
+        if not has_magic(pathname):
+            if basename:
+                if os.path.lexists(pathname):
+                    yield pathname
+            elif os.path.isdir(dirname):
+                yield pathname
+            return
+
+        if not dirname:
+            if basename == "**":
+                yield from self._glob2(dirname, dironly)
+            else:
+                yield from self._glob1(dirname, basename, dironly)
+            return
+
+        if dirname != pathname and has_magic(dirname):
+            dirs = self._iglob(dirname, dironly=True)
+        else:
+            dirs = [dirname]
+
+        for parent in dirs:
+            if basename == "**":
+                names = self._glob2(parent, dironly)
+            elif has_magic(basename):
+                names = self._glob1(parent, basename, dironly)
+            elif os.path.lexists(os.path.join(parent, basename)):
+                names = [basename]
+            else:
+                names = list()
+
+            for name in names:
+                yield os.path.join(parent, name)
+
+    def _isfile(self, path: str) -> bool:
+        """Checks if the given path is a file, using the cached listing of its
+        parent directory when possible."""
+        dirname, basename = os.path.split(path)
+        if not basename:
+            return False
+
+        path_dir = os.path.normpath(dirname) if dirname else os.curdir
+        with self._lock:
+            if path_dir in self._fresh:
+                return basename in self._dirs[path_dir][1]
+        return os.path.isfile(path)
+
+    def glob(self, pattern: str) -> typing.List[str]:
+        """Returns a sorted list of all files that match the given pattern."""
+        return sorted(p for p in self._iglob(pattern, False) if self._isfile(p))
+
+    def glob_many(self, patterns: typing.List[str]) -> typing.List[typing.List[str]]:
+        """Expands all the given patterns concurrently, and returns a list of
+        sorted lists of files, one for each pattern."""
+
+        if len(patterns) < 2:
+            return [self.glob(pattern) for pattern in patterns]
+
+        with ThreadPoolExecutor(max_workers=len(patterns)) as pool:
+            return list(pool.map(self.glob, patterns))
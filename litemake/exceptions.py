@@ -1,9 +1,17 @@
 import typing
+import signal
 from .printer import litemakePrinter as Printer
 
 
 T = typing.TypeVar("T")
 
+# Messages of compiler drivers whose own subprocess (such as 'cc1plus') has
+# been killed, usually by the out-of-memory killer of the kernel.
+KILLED_MESSAGES = (
+    "Killed signal terminated program",  # GCC
+    "unable to execute command: Killed",  # Clang
+)
+
 
 def stringify_fieldpath(path: list) -> str:
     return ".".join(str(p) for p in path)
@@ -81,12 +89,24 @@ class litemakeCompilationError(litemakeError):
     """Raised by the 'compiler' object if when calling the compiler (gcc, g++,
     clang), it returned a non-zero code."""
 
-    def __init__(self, subprocess: str, msg: str):
+    def __init__(self, subprocess: str, msg: str, returncode: int = 1):
+        self.returncode = returncode
         super().__init__(
             f"*error while calling {subprocess!r}:*",
             msg,
         )
 
+    @property
+    def killed(
+        self,
+    ) -> bool:
+        """True if the subprocess (or a subprocess of the compiler driver) has
+        been killed by SIGKILL, rather than failing on its own."""
+        sigkill = getattr(signal, "SIGKILL", None)  # not available on Windows
+        if sigkill is not None and self.returncode == -sigkill:
+            return True
+        return any(message in self.msg[-1] for message in KILLED_MESSAGES)
+
 
 class litemakeUnknownTargetsError(litemakeError):
     """Raised by '__main__.py' if the user want to execute a target that is not
@@ -101,6 +121,41 @@ class litemakeUnknownTargetsError(litemakeError):
         super().__init__(f"*unknown {title}:* {targets_str}")
 
 
+class litemakeUnknownProfileError(litemakeError):
+    """Raised if the user selects a build profile that isn't a built-in profile
+    and isn't specified in the settings file."""
+
+    def __init__(self, profile: str, known: typing.Set[str]):
+        self.profile = profile
+
+        known_str = ", ".join(repr(p_) for p_ in sorted(known))
+        super().__init__(
+            f"*unknown profile:* {profile!r}",
+            f"Available profiles are {known_str}",
+        )
+
+
+class litemakeMissingProgramsError(litemakeError):
+    """Raised if programs that the compiler needs (such as the archiver or the
+    selected linker) can't be found on the current machine."""
+
+    def __init__(self, programs: typing.Set[str]):
+        self.programs = programs
+
+        title = "programs" if len(programs) > 1 else "program"
+        programs_str = ", ".join(repr(p_) for p_ in sorted(programs))
+
+        super().__init__(f"*missing {title}:* {programs_str}")
+
+
+class litemakePgoError(litemakeError):
+    """Raised if a stage of the profile-guided optimization workflow (see
+    'litemake pgo') fails."""
+
+    def __init__(self, msg: str):
+        super().__init__("*profile-guided optimization failed:*", msg)
+
+
 class litemakePluginInitError(litemakeError):
     """Raised by the plugin collector when it stumbles upon a plugin that is
     not configured correctly and can't be initialized."""
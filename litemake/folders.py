@@ -1,6 +1,7 @@
 import os
+import hashlib
+import dataclasses
 from abc import ABC
-from glob import glob
 
 from litemake.constants import (
     TARGETS_CONFIG_FILENAME,
@@ -12,18 +13,32 @@ from litemake.parse import (
     SettingsParser,
 )
 
+from litemake.compile.state import BuildState
+from litemake.compile.objcache import ObjectCache, cache_key, clone_file
+from litemake.compile.hashcache import file_digest
+from litemake.compile.remote import RemoteCache
 from litemake.compile.graph import (
+    CompilationGraph,
     ExecutableFileNode,
     ArchiveFileNode,
     ObjectFileNode,
+    PrecompiledHeaderNode,
+    UnityObjectNode,
+)
+from litemake.compile.unity import split_chunks
+from litemake.discover import SourcesDiscovery
+from litemake.exceptions import (
+    litemakeUnknownTargetsError,
+    litemakeUnknownProfileError,
+    litemakeMissingProgramsError,
 )
-from litemake.exceptions import litemakeUnknownTargetsError
 
 import typing
 
 if typing.TYPE_CHECKING:
     from litemake.parse.targets import TargetInfo  # pragma: no cover
     from litemake.compile.graph import CompilationFileNode  # pragma: no cover
+    from litemake.compile.compilers import AbstractCompiler  # pragma: no cover
 
 
 class Folder(ABC):
@@ -43,25 +58,119 @@ class Folder(ABC):
 
 
 class OutputFolder(Folder):
-    """Represents the folder that litemake caches it's data in."""
+    """Represents the folder that litemake caches it's data in. Everything that
+    is compiled is stored in a separate subfolder for each build profile, so
+    switching between profiles doesn't invalidate the outputs of the other
+    profiles."""
+
+    def __init__(self, basepath: str, profile: str, pgo: str = "none") -> None:
+        """The instrumented and optimized stages of profile-guided optimization
+        (see 'CompilerOptions.pgo') are stored in separate subfolders of the
+        folder of the profile."""
+        super().__init__(basepath)
+        self.profile = profile
+        self.pgo = pgo
+
+    @property
+    def profile_folder(
+        self,
+    ) -> str:
+        if self.pgo == "none":
+            return self.join(self.profile)
+        return self.join(self.profile, f"pgo-{self.pgo}")
+
+    @property
+    def pgo_data(
+        self,
+    ) -> str:
+        """The folder of the profile data, which is shared by both stages of
+        profile-guided optimization."""
+        return self.join(self.profile, "pgo")
+
+    @property
+    def pgo_stamp(
+        self,
+    ) -> str:
+        """A file that changes when the merged profile data changes, and is an
+        input of all the optimized objects."""
+        return os.path.join(self.pgo_data, "profile.stamp")
 
     @property
     def archives(
         self,
     ) -> str:
-        return self.join("archives")
+        return os.path.join(self.profile_folder, "archives")
 
     @property
     def objects(
         self,
     ) -> str:
-        return self.join("objects")
+        return os.path.join(self.profile_folder, "objects")
+
+    @property
+    def executables(
+        self,
+    ) -> str:
+        return os.path.join(self.profile_folder, "bin")
+
+    @property
+    def build_log(
+        self,
+    ) -> str:
+        return os.path.join(self.profile_folder, "build.log")
+
+    @property
+    def lto_cache(
+        self,
+    ) -> str:
+        return os.path.join(self.profile_folder, "lto")
+
+    @property
+    def sources_cache(
+        self,
+    ) -> str:
+        return self.join("sources.json")
+
+    @property
+    def hash_cache(
+        self,
+    ) -> str:
+        return self.join("hashes.json")
+
+    @property
+    def unity(
+        self,
+    ) -> str:
+        return self.join("unity")
+
+    @property
+    def pch(
+        self,
+    ) -> str:
+        return os.path.join(self.profile_folder, "pch")
+
+    def pch_name(self, variant: str, relative: str) -> str:
+        """Returns the path to the forwarding header of the given header (path
+        relative to the home folder), next to which its precompiled version is
+        written."""
+        return os.path.join(self.pch, variant, relative)
+
+    def unity_name(self, target: "TargetInfo", index: int, ext: str) -> str:
+        """Returns the path to a generated unity chunk of the given target."""
+        return os.path.join(self.unity, target.name, f"unity_{index}{ext}")
 
     def archive_name(self, target: "TargetInfo") -> str:
         return os.path.join(self.archives, f"{target.name}.a")
 
-    def object_name(self, target: "TargetInfo", relative: str) -> str:
-        folder = os.path.join(self.objects, target.name)
+    def executable_name(self, target: "TargetInfo") -> str:
+        return os.path.join(self.executables, target.name)
+
+    def object_name(self, variant: str, relative: str) -> str:
+        """Returns the path to the object file of the given source file (path
+        relative to the home folder). Objects that are compiled with different
+        compilers or include paths are separated by a variant string, and
+        objects with the same variant are shared between all targets."""
+        folder = os.path.join(self.objects, variant)
         return os.path.join(folder, relative)
 
 
@@ -73,7 +182,12 @@ class ProjectFolder(Folder):
     def __init__(
         self,
         basepath: str,
+        profile: str = None,
+        pgo: str = "none",
     ) -> None:
+        """If a build profile isn't given, the default profile in the settings
+        is used. 'pgo' selects a stage of profile-guided optimization (see
+        'CompilerOptions.pgo')."""
         super().__init__(basepath)
 
         targets_path = self.join(TARGETS_CONFIG_FILENAME)
@@ -83,12 +197,101 @@ class ProjectFolder(Folder):
         self.settings = SettingsParser(settings_path)
         # TODO: make the settings file not mandatory
 
-        self.output = OutputFolder(self.settings.output)
+        profile = profile or self.settings.profile
+        profiles = self.settings.profiles
+        if profile not in profiles:
+            raise litemakeUnknownProfileError(profile, set(profiles))
+        self.profile = profiles[profile]
+
+        self.output = OutputFolder(self.settings.output, self.profile.name, pgo=pgo)
+        self.discovery = SourcesDiscovery(self.output.sources_cache)
+        self.state = BuildState(
+            log=self.output.build_log,
+            hashes=self.output.hash_cache,
+            use_hashes=self.settings.staleness == "hash",
+        )
+
+        cache = self.settings.cache
+        self.cache = None
+        if cache.enabled:
+            remote = None
+            if cache.remote:
+                remote = RemoteCache(cache.remote, upload=cache.upload)
+            self.cache = ObjectCache(
+                cache.path,
+                max_size=cache.max_size * 1024**2,
+                remote=remote,
+            )
 
-    def collect(
-        self, *targets: typing.Tuple[str]
-    ) -> typing.List["CompilationFileNode"]:
-        """Collect all files that are needed to generate the given targets."""
+    def close(self) -> None:
+        """Saves everything that litemake remembers between runs."""
+        self.state.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def install(
+        self,
+        graph: "CompilationGraph",
+        exclude: typing.Collection["CompilationFileNode"] = (),
+    ) -> None:
+        """Makes the executables of the given graph, which are linked into the
+        folder of the profile, available in the current working directory.
+        The executables are cloned (or hard linked) when possible, so
+        switching between profiles doesn't copy them. Executables in
+        'exclude' (that haven't been linked successfully) aren't installed,
+        so an outdated executable doesn't replace the installed one."""
+
+        for head in graph.heads:
+            if head in exclude:
+                continue
+            if isinstance(head, ExecutableFileNode) and os.path.isfile(head.dest):
+                name = os.path.basename(head.dest)
+                clone_file(head.dest, os.path.join(os.getcwd(), name))
+
+    def create_compiler(self) -> "AbstractCompiler":
+        """Creates the compiler that compiles the project, with the options of
+        the settings and of the build profile. Raises an error if a program
+        that the compiler requires is missing."""
+
+        options = self.settings.compiler_options
+        options = dataclasses.replace(
+            options,
+            cflags=self.profile.flags,
+            ldflags=self.profile.link_flags,
+            lto=self.profile.lto or options.lto,
+            lto_cache=self.output.lto_cache,
+            pgo=self.output.pgo,
+            pgo_dir=self.output.pgo_data,
+        )
+        compiler = self.settings.compiler(
+            cache=self.cache, options=options, hashes=self.state.hashes
+        )
+        missing = compiler.missing_clis()
+        if missing:
+            raise litemakeMissingProgramsError(missing)
+        return compiler
+
+    def update_pgo_stamp(self, data: typing.List[str]) -> bool:
+        """Writes the digest of the given profile data files into the stamp
+        file of the profile data (see 'OutputFolder.pgo_stamp'), only if it
+        has changed. Returns True if the stamp has been written."""
+
+        digest = cache_key(*(file_digest(path) for path in sorted(data)))
+        try:
+            with open(self.output.pgo_stamp, mode="r") as file:
+                if file.read() == digest:
+                    return False
+        except FileNotFoundError:
+            pass
+
+        os.makedirs(os.path.dirname(self.output.pgo_stamp), exist_ok=True)
+        with open(self.output.pgo_stamp, mode="w") as file:
+            file.write(digest)
+        return True
+
+    def collect(self, *targets: typing.Tuple[str]) -> "CompilationGraph":
+        """Collect all files that are needed to generate the given targets into
+        a single graph, in which objects are shared between the targets."""
 
         # If no targets are provided, select default target
         if not targets:
@@ -102,51 +305,135 @@ class ProjectFolder(Folder):
         if unknown:
             raise litemakeUnknownTargetsError(unknown)
 
-        # Build compilation graphs for all targets
-        graphs = list()
+        # Merge the compilation trees of all targets into a single graph
+        graph = CompilationGraph()
+        compiler = self.create_compiler()
         for name in targets:
             info = self.targets.target(name)
-            graphs.append(self._build_compilation_graph(info))
+            head = self._build_compilation_graph(info, graph, compiler)
+            graph.add_head(head)
 
-        return graphs
+        self.discovery.save()
+        return graph
 
-    def _build_compilation_graph(self, target: "TargetInfo") -> "CompilationFileNode":
+    @staticmethod
+    def _object_variant(
+        compiler: "AbstractCompiler", includes: typing.List[str], *extra: str
+    ) -> str:
+        """Returns a short string that represents the given compilation
+        configuration, and is used to name the folder of the objects that
+        are compiled with that configuration."""
+        config = "\0".join([compiler.name] + list(includes) + list(extra))
+        digest = hashlib.sha1(config.encode("utf8")).hexdigest()[:10]
+        return f"{compiler.name}-{digest}"
+
+    def _unity_chunks(
+        self, target: "TargetInfo", sources: typing.List[str]
+    ) -> typing.List[typing.Tuple[str, typing.List[str]]]:
+        """Returns the paths to the unity chunks of the given target in the
+        output folder, with the sources that each chunk includes. The chunks
+        themselves are written when their objects are compiled (see
+        'UnityObjectNode')."""
+
+        chunks = list()
+        split = split_chunks(sources, target.unity_batch, base=self.settings.home)
+        for index, members in split:
+            ext = os.path.splitext(members[0])[1]
+            chunks.append((self.output.unity_name(target, index, ext), members))
+        return chunks
+
+    def _build_compilation_graph(
+        self,
+        target: "TargetInfo",
+        graph: "CompilationGraph",
+        compiler: "AbstractCompiler",
+    ) -> "CompilationFileNode":
         """Converts the target information info a graph that represents the
         relashionships between source files, object files, archives, and
-        executables in the program."""
-
-        compiler = self.settings.compiler()
+        executables in the program. Object files that already exist in the
+        given graph are reused instead of created again."""
 
         # Each litemake target is compiled into an archive, and thus it is the
         # first instance that we create.
         archive = ArchiveFileNode(
             dest=self.output.archive_name(target),
             compiler=compiler,
+            state=self.state,
+            thin=self.settings.thin_archives,
         )
 
         # Now, its time to collect all needed source files
-        sources = list()
-        for glb in target.sources:
-            if not os.path.isabs(glb):
-                # if relative glob
-                # TODO: all globs should be relative
-                glb = os.path.join(self.settings.home, glb)
-
-            sources += [
-                g for g in sorted(glob(glb, recursive=True)) if os.path.isfile(g)
-            ]
+        # TODO: all globs should be relative
+        patterns = [
+            glb if os.path.isabs(glb) else os.path.join(self.settings.home, glb)
+            for glb in target.sources
+        ]
+        sources = [
+            path for found in self.discovery.glob_many(patterns) for path in found
+        ]
+
+        # In a unity build, the amalgamated chunks are compiled instead of the
+        # sources themselves.
+        units: typing.List[typing.Tuple[str, typing.Optional[typing.List[str]]]]
+        units = [(source, None) for source in sources]
+        if target.unity:
+            units = self._unity_chunks(target, sources)
 
         # Now that all source files are collected, we create instances
-        # of object files that they will be compiled to!
-        for source in sources:
-            rel = os.path.relpath(source, self.settings.home)
-            obj = ObjectFileNode(
-                src=source,
-                dest=self.output.object_name(target, rel),
-                compiler=compiler,
-                includes=target.include,
-                parent=archive,
+        # of object files that they will be compiled to! If another target
+        # already compiles the same source in the same way, we share its node.
+        # A precompiled header is built before all the objects of the target,
+        # and it is shared with other targets that have the same configuration.
+        pch = None
+        variant = self._object_variant(compiler, target.include)
+        if target.pch:
+            header = os.path.join(self.settings.home, target.pch)
+            rel = os.path.relpath(header, self.settings.home)
+            pch = graph.add_object(
+                PrecompiledHeaderNode(
+                    header=header,
+                    forwarder=self.output.pch_name(variant, rel),
+                    compiler=compiler,
+                    includes=target.include,
+                    state=self.state,
+                )
             )
+            variant = self._object_variant(compiler, target.include, rel)
+
+        # Optimized objects are compiled again when the profile data changes
+        extra_inputs = list()
+        if self.output.pgo == "use":
+            extra_inputs.append(self.output.pgo_stamp)
+
+        for source, members in units:
+            if members is not None:
+                rel = os.path.relpath(source, self.output.basepath)
+                obj = UnityObjectNode(
+                    chunk=source,
+                    members=members,
+                    dest=self.output.object_name(variant, rel),
+                    compiler=compiler,
+                    includes=target.include,
+                    state=self.state,
+                    pch=pch,
+                    extra_inputs=extra_inputs,
+                )
+            else:
+                rel = os.path.relpath(source, self.settings.home)
+                obj = ObjectFileNode(
+                    src=source,
+                    dest=self.output.object_name(variant, rel),
+                    compiler=compiler,
+                    includes=target.include,
+                    parent=None,
+                    state=self.state,
+                    pch=pch,
+                    extra_inputs=extra_inputs,
+                )
+            obj = graph.add_object(obj)
+            if pch is not None:
+                pch.add_parent(obj)
+            obj.add_parent(archive)
             archive.add_object(obj)
 
         if target.library:
@@ -156,9 +443,10 @@ class ProjectFolder(Folder):
             # If the current target represnets an executable, we create it
             # too and return it instead of the archive.
             exe = ExecutableFileNode(
-                dest=os.path.join(os.getcwd(), target.name),
+                dest=self.output.executable_name(target),
                 compiler=compiler,
+                state=self.state,
             )
-            archive.set_parent(exe)
+            archive.add_parent(exe)
             exe.add_dep_archive(archive)
             return exe
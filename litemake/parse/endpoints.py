@@ -130,6 +130,24 @@ class CompilerTemplate(StringTemplate):
         return COMPILERS.get(value)
 
 
+class ChoiceTemplate(StringTemplate):
+    def __init__(self, choices: typing.Iterable[str], default=MISSING) -> None:
+        super().__init__(default=default)
+        self.choices = list(choices)
+
+    def validate(self, value, fieldpath: typing.List[str]) -> str:
+        value = super().validate(value, fieldpath)
+        value = value.lower().strip()
+
+        if value not in self.choices:
+            options = ", ".join(repr(c) for c in self.choices)
+            raise litemakeTemplateError(
+                fieldpath, f"Unknown value {value!r} (expected one of {options})"
+            )
+
+        return value
+
+
 class IntegerTemplate(TemplateEndpoint):
     def __init__(
         self,
@@ -1,13 +1,22 @@
 import os
+from dataclasses import dataclass
 
 from .file import OptionalFileParser
 from .templates import Template
 from .endpoints import (
     FolderPathTemplate,
     CompilerTemplate,
+    ChoiceTemplate,
+    BoolTemplate,
+    IntegerTemplate,
+    StringTemplate,
+    ListTemplate,
+    DictTemplate,
 )
 
-from litemake.constants import CACHE_FOLDERNAME
+from litemake.constants import CACHE_FOLDERNAME, NAME_CHARS, SPECIAL_CHARS
+from litemake.compile.objcache import DEFAULT_MAX_SIZE, default_cache_path
+from litemake.compile.compilers.options import CompilerOptions, LINKERS
 
 import typing
 
@@ -15,12 +24,73 @@ if typing.TYPE_CHECKING:
     from litemake.compile.compilers.base import AbstractCompiler  # pragma: no cover
 
 
+@dataclass
+class CacheInfo:
+    enabled: bool
+    path: str
+    max_size: int  # in megabytes
+    remote: str  # an empty string if there is no remote cache
+    upload: bool
+
+
+@dataclass
+class ProfileInfo:
+    name: str
+    flags: typing.List[str]  # added to every compilation
+    link_flags: typing.List[str]  # added when linking executables
+    lto: str = ""  # overrides the 'lto' setting, unless empty
+
+
+LTO_MODES = ["none", "thin", "full"]
+
+# Profiles that are always available. Profiles with the same names in the
+# settings file replace them.
+BUILTIN_PROFILES = {
+    "debug": ProfileInfo("debug", flags=["-O0", "-g"], link_flags=list()),
+    "release": ProfileInfo("release", flags=["-O2", "-DNDEBUG"], link_flags=list()),
+}
+
+
 class SettingsParser(OptionalFileParser):
 
     TEMPLATE = Template(
         home=FolderPathTemplate(default=""),
         output=FolderPathTemplate(default=CACHE_FOLDERNAME),
         compiler=CompilerTemplate(default="g++"),
+        staleness=ChoiceTemplate(["mtime", "hash"], default="mtime"),
+        batch_size=IntegerTemplate(range_min=1, default=1),
+        thin_archives=BoolTemplate(default=False),
+        linker=ChoiceTemplate(["default", *LINKERS], default="default"),
+        link_threads=IntegerTemplate(range_min=0, default=0),
+        split_dwarf=BoolTemplate(default=False),
+        lto=ChoiceTemplate(LTO_MODES, default="none"),
+        profile=StringTemplate(default="debug"),
+        profiles=DictTemplate(
+            keys=StringTemplate(
+                min_len=1,
+                max_len=30,
+                allowed_chars=NAME_CHARS,
+                no_on_edges=SPECIAL_CHARS,
+            ),
+            values=Template(
+                flags=ListTemplate(default=list(), listof=StringTemplate()),
+                link_flags=ListTemplate(default=list(), listof=StringTemplate()),
+                lto=ChoiceTemplate(["", *LTO_MODES], default=""),
+            ),
+            default=dict(),
+        ),
+        pools=Template(
+            compile=IntegerTemplate(range_min=0, default=0),
+            archive=IntegerTemplate(range_min=0, default=0),
+            link=IntegerTemplate(range_min=0, default=0),
+        ),
+        cache=Template(
+            enabled=BoolTemplate(default=False),
+            path=StringTemplate(default=""),
+            max_size=IntegerTemplate(range_min=1, default=DEFAULT_MAX_SIZE),
+            remote=StringTemplate(default=""),
+            upload=BoolTemplate(default=True),
+        ),
     )
 
     @property
@@ -63,3 +133,114 @@ class SettingsParser(OptionalFileParser):
         """A compiler instance that is used to compile different files
         in litemake."""
         return self._data["compiler"]
+
+    @property
+    def staleness(
+        self,
+    ) -> str:
+        """The method that is used to check if source files have changed since
+        the last build: 'mtime' compares modification times, and 'hash'
+        compares the content of the files with their content in the last
+        successful build."""
+        return self._data["staleness"]
+
+    @property
+    def batch_size(
+        self,
+    ) -> int:
+        """The maximum number of object files that are compiled together in a
+        single invocation of the compiler. Batches amortize the startup time of
+        the compiler for projects with many small sources. 1 (no batching) by
+        default."""
+        return self._data["batch_size"]
+
+    @property
+    def thin_archives(
+        self,
+    ) -> bool:
+        """If true, the archives of the targets are thin archives, that only
+        reference the object files in the output folder instead of containing
+        copies of them. Thin archives are much faster to create, but can't be
+        used outside of the output folder. False by default."""
+        return self._data["thin_archives"]
+
+    @property
+    def profile(
+        self,
+    ) -> str:
+        """The name of the profile that is built if another profile isn't
+        selected explicitly. 'debug' by default."""
+        return self._data["profile"]
+
+    @property
+    def profiles(
+        self,
+    ) -> typing.Dict[str, ProfileInfo]:
+        """All the available build profiles, by their names: the built-in
+        'debug' and 'release' profiles, and the profiles in the settings file.
+        Each profile is built into its own folder, and has its own compilation
+        and link flags, and optionally its own link-time optimization mode."""
+
+        profiles = dict(BUILTIN_PROFILES)
+        for name, data in self._data["profiles"].items():
+            profiles[name] = ProfileInfo(name=name, **data)
+        return profiles
+
+    @property
+    def compiler_options(
+        self,
+    ) -> CompilerOptions:
+        """Options that are applied to all the commands of the compiler: the
+        linker that links the executables ('bfd', 'gold', 'lld' or 'mold', or
+        the default linker of the compiler), the number of threads that the
+        linker uses (0 for the default of the linker), and whether the debug
+        information is split into '.dwo' files next to the objects. Link-time
+        optimization ('lto') is disabled by default, and can be 'thin' (a
+        parallel and incremental link, which isn't supported by GCC, and is
+        replaced by its partitioned mode) or 'full'."""
+        return CompilerOptions(
+            linker=self._data["linker"],
+            link_threads=self._data["link_threads"],
+            split_dwarf=self._data["split_dwarf"],
+            lto=self._data["lto"],
+        )
+
+    @property
+    def pools(
+        self,
+    ) -> typing.Dict[str, int]:
+        """The maximum number of concurrent jobs of each job pool: 'compile'
+        (objects and precompiled headers), 'archive' and 'link' (executables).
+        Heavy jobs, such as links with link-time optimization, can use a lot
+        of memory, so limiting them avoids running out of memory without
+        limiting the other jobs. 0 (only limited by the number of jobs) by
+        default."""
+        return dict(self._data["pools"])
+
+    @property
+    def cache(
+        self,
+    ) -> CacheInfo:
+        """The configuration of the compilation cache, which stores compiled
+        object files and shares them between projects. The cache is disabled
+        by default, and its directory is a user-level directory (see
+        'default_cache_path') unless another path is given. The maximum size
+        is in megabytes. If an URL of a remote cache is given, the local cache
+        is backed by it, and new entries are uploaded to it unless 'upload' is
+        false."""
+
+        data = self._data["cache"]
+        path = os.path.expanduser(data["path"])
+        if not path:
+            path = default_cache_path()
+        elif not os.path.isabs(path):
+            folder = os.path.dirname(self.filepath)
+            path = os.path.join(folder, path)
+
+        return CacheInfo(
+            enabled=data["enabled"],
+            path=path,
+            max_size=data["max_size"],
+            remote=data["remote"],
+            upload=data["upload"],
+        )
@@ -7,6 +7,7 @@ from .endpoints import (
     DictTemplate,
     StringTemplate,
     BoolTemplate,
+    IntegerTemplate,
     ListTemplate,
     RelFolderPathTemplate,
 )
@@ -20,6 +21,9 @@ class TargetInfo:
     library: bool
     sources: typing.List[str]
     include: typing.List[str]
+    unity: bool
+    unity_batch: int
+    pch: str
 
 
 class TargetsParser(FileParser):
@@ -43,6 +47,9 @@ class TargetsParser(FileParser):
                 default=list(),
                 listof=RelFolderPathTemplate(),
             ),
+            unity=BoolTemplate(default=False),
+            unity_batch=IntegerTemplate(range_min=1, default=8),
+            pch=StringTemplate(default=""),
         ),
         min_len=1,
     )
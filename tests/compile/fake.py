@@ -0,0 +1,156 @@
+import time
+import threading
+
+from litemake.compile.compilers import AbstractCompiler
+from litemake.compile.graph import ARCHIVE_MAGIC
+from litemake.exceptions import litemakeCompilationError
+
+import typing
+
+
+class FakeCompiler(AbstractCompiler):
+    """A compiler that doesn't call any real compiler, but only writes the
+    destination files and remembers the order and concurrency of its calls."""
+
+    name = "fake"
+    required_clis = set()
+    pch_extension = ".pch"
+
+    def __init__(
+        self,
+        delay: float = 0.05,
+        fail: typing.Set[str] = None,
+        kill: typing.Set[str] = None,
+    ) -> None:
+        """Sources in 'fail' always fail to compile, and the compiler is killed
+        the first time it compiles sources in 'kill'."""
+        super().__init__()
+        self.delay = delay
+        self.fail = fail or set()
+        self.kill = set(kill or set())
+        self.calls = list()
+        self.batches = list()
+        self.updates = list()
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def _run(self, dest: str, *srcs: str, content: str = None) -> None:
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.active, self.max_active)
+
+        time.sleep(self.delay)
+
+        with self._lock:
+            self.active -= 1
+            self.calls.append(dest)
+
+        if any(src in self.fail for src in srcs):
+            raise litemakeCompilationError("fake", f"failed to generate {dest!r}")
+
+        killed = self.kill.intersection(srcs)
+        if killed:
+            self.kill -= killed
+            raise litemakeCompilationError("fake", "killed", returncode=-9)
+
+        with open(dest, "w") as file:
+            file.write("\n".join(srcs) if content is None else content)
+
+    def obj_cmd(self, src, dest, includes, depfile=None, pch=None) -> typing.List[str]:
+        return [self.name, "obj", src, dest, *includes, *([pch] if pch else [])]
+
+    def pch_cmd(self, header, includes, depfile=None) -> typing.List[str]:
+        return [self.name, "pch", header, *includes]
+
+    def batch_obj_cmd(self, srcs, includes, pch=None) -> typing.List[str]:
+        return [self.name, "batch", *srcs, *includes]
+
+    def preprocess_cmd(
+        self, src, dest, includes, depfile=None, pch=None
+    ) -> typing.List[str]:
+        return [self.name, "preprocess", src, *includes]
+
+    def archive_cmd(self, dest, objs, thin=False) -> typing.List[str]:
+        return [self.name, "thin" if thin else "archive", dest, *objs]
+
+    def archive_update_cmd(self, dest, objs) -> typing.List[str]:
+        return [self.name, "update", dest, *objs]
+
+    def archive_delete_cmd(self, dest, members) -> typing.List[str]:
+        return [self.name, "delete", dest, *members]
+
+    def executable_cmd(self, dest, archives) -> typing.List[str]:
+        return [self.name, "executable", dest, *archives]
+
+    def clear_profiles(self, instrumented) -> None:
+        pass
+
+    def merge_profiles(self, instrumented, optimized) -> typing.List[str]:
+        return list()
+
+    def create_obj(self, src, dest, includes, depfile=None, pch=None) -> None:
+        # The "object file" is a copy of the source file
+        with open(src, "r") as file:
+            self._run(dest, src, content=file.read())
+        if depfile:
+            with open(depfile, "w") as file:
+                file.write(f"{dest}: {src}\n")
+
+    def create_pch(self, header, includes, depfile=None) -> None:
+        dest = f"{header}{self.pch_extension}"
+        with open(header, "r") as file:
+            self._run(dest, header, content=file.read())
+        if depfile:
+            with open(depfile, "w") as file:
+                file.write(f"{dest}: {header}\n")
+
+    def create_objs(self, objs, includes, pch=None) -> None:
+        # A single invocation that fails if one of the sources fails
+        self.batches.append([dest for _, dest, _ in objs])
+        srcs = [src for src, _, _ in objs]
+        if any(src in self.fail for src in srcs):
+            self._run(objs[0][1], *srcs)
+
+        for src, dest, depfile in objs:
+            self.create_obj(src, dest, includes, depfile=depfile)
+
+    def create_archive(self, dest, objs, thin=False) -> None:
+        self._run(dest, *objs, content=_archive(objs, thin))
+
+    def update_archive(self, dest, objs, changed, removed) -> None:
+        self.updates.append((changed, removed))
+        self._run(dest, *changed, content=_archive(objs))
+
+    def create_executable(self, dest, archives) -> None:
+        self._run(dest, *archives, content=_concat(archives))
+
+
+def _concat(paths: typing.List[str]) -> typing.Optional[str]:
+    """The content of all the given files, or `None` if one of them is
+    missing."""
+    try:
+        contents = list()
+        for path in paths:
+            with open(path, "r") as file:
+                contents.append(file.read())
+    except FileNotFoundError:
+        return None
+    return "\n".join(contents)
+
+
+def _archive(objs: typing.List[str], thin: bool = False) -> typing.Optional[str]:
+    """The content of a fake archive of the given objects: a thin archive only
+    contains the paths to the objects."""
+    if thin:
+        return "!<thin>\n" + "\n".join(objs)
+    content = _concat(objs)
+    return None if content is None else ARCHIVE_MAGIC.decode() + content
+
+
+def rescan(*nodes) -> None:
+    """Makes the given nodes forget everything that they have cached about
+    the files on disk, as if a new build has started."""
+    for node in nodes:
+        node.state.stats.clear()
+        node.reset()
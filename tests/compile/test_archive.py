@@ -0,0 +1,176 @@
+import os
+import itertools
+import subprocess
+
+from litemake.compile import NodesCollector, JobScheduler
+from litemake.compile.compilers import GccCompiler
+from litemake.compile.graph import (
+    ArchiveFileNode,
+    ExecutableFileNode,
+    ObjectFileNode,
+)
+from litemake.compile.objcache import ObjectCache
+from litemake.compile.state import BuildState
+
+from .fake import FakeCompiler, rescan
+from .test_hashcache import touch
+from tests.compilers.base import skip_if_missing_clis
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from tests.utils import VirtualProject
+
+
+def build_executable(
+    project: "VirtualProject",
+    compiler: FakeCompiler,
+    sources: typing.List[str],
+    thin: bool = False,
+):
+    state = BuildState(log=project.join("out", "build.log"))
+    exe = ExecutableFileNode(project.join("out", "app"), compiler, state=state)
+    archive = ArchiveFileNode(
+        project.join("out", "app.a"), compiler, parent=exe, state=state, thin=thin
+    )
+    exe.add_dep_archive(archive)
+
+    for source in sources:
+        name, _ = os.path.splitext(source)
+        obj = ObjectFileNode(
+            src=project.add_file(source, f"int {os.path.basename(name)};"),
+            dest=project.join("out", f"{name}.o"),
+            compiler=compiler,
+            includes=list(),
+            parent=archive,
+            state=state,
+        )
+        archive.add_object(obj)
+
+    return exe, archive
+
+
+def build(exe: "ExecutableFileNode") -> dict:
+    rescan(*exe.all_nodes())
+    return dict(JobScheduler(NodesCollector(exe)).run())
+
+
+VERSIONS = itertools.count()
+
+
+def change(obj: "ObjectFileNode") -> None:
+    touch(obj.dest, -20)
+    with open(obj.src, mode="w") as file:
+        file.write(f"int version_{next(VERSIONS)};")
+
+
+def test_only_changed_objects_are_replaced(project: "VirtualProject"):
+    compiler = FakeCompiler(delay=0)
+    exe, archive = build_executable(project, compiler, ["main.c", "math.c"])
+    main, math = archive.dep_objects
+
+    build(exe)
+    assert compiler.updates == list()
+
+    change(math)
+    build(exe)
+    assert compiler.updates == [([math.dest], list())]
+
+    # The updated archive has the same content as a new archive
+    with open(archive.dest) as file:
+        updated = file.read()
+    compiler.create_archive(archive.dest, archive.inputs)
+    with open(archive.dest) as file:
+        assert file.read() == updated
+
+
+def test_removed_objects_are_deleted(project: "VirtualProject"):
+    compiler = FakeCompiler(delay=0)
+    exe, archive = build_executable(project, compiler, ["main.c", "math.c"])
+    main, math = archive.dep_objects
+    build(exe)
+
+    archive.dep_objects.remove(math)
+    build(exe)
+    assert compiler.updates == [(list(), ["math.o"])]
+
+
+def test_archive_is_created_again_if_needed(project: "VirtualProject"):
+    compiler = FakeCompiler(delay=0)
+    sources = ["main.c", "first/math.c", "second/math.c"]
+    exe, archive = build_executable(project, compiler, sources)
+    main = archive.dep_objects[0]
+    build(exe)
+
+    # Members with the same name can't be replaced or removed separately
+    change(main)
+    build(exe)
+    archive.dep_objects.pop()
+    build(exe)
+    assert compiler.updates == list()
+
+    change(main)
+    build(exe)
+    assert compiler.updates == [([main.dest], list())]
+
+    # An archive that has been modified since it was generated
+    with open(archive.dest, mode="a") as file:
+        file.write("modified")
+    change(main)
+    build(exe)
+    assert len(compiler.updates) == 1
+
+
+def test_thin_archive(project: "VirtualProject"):
+    compiler = FakeCompiler(delay=0)
+    exe, archive = build_executable(project, compiler, ["main.c"], thin=True)
+    main = archive.dep_objects[0]
+    build(exe)
+
+    with open(archive.dest) as file:
+        content = file.read()
+
+    # The content of the thin archive doesn't change, but it references a
+    # changed object, and thus the executable is linked again
+    compiler.calls.clear()
+    change(main)
+    build(exe)
+    assert compiler.updates == list()
+    assert compiler.calls == [main.dest, archive.dest, exe.dest]
+    with open(archive.dest) as file:
+        assert file.read() == content
+
+
+def members(archive: str) -> typing.List[str]:
+    output = subprocess.run(["ar", "-t", archive], stdout=subprocess.PIPE).stdout
+    return output.decode().split()
+
+
+@skip_if_missing_clis(GccCompiler)
+def test_update_archive(project: "VirtualProject"):
+    cache = ObjectCache(project.join("cache"))
+    compiler = GccCompiler(cache=cache)
+
+    objs = list()
+    for name in ("first", "second", "third"):
+        src = project.add_file(f"{name}.c", f"int {name}() {{ return 1; }}")
+        objs.append(project.join(f"{name}.o"))
+        compiler.create_obj(src, objs[-1], list())
+
+    dest = project.join("lib.a")
+    compiler.create_archive(dest, objs[:2])
+    assert members(dest) == ["first.o", "second.o"]
+
+    # The entry of the archive in the cache must not be modified by the update
+    entry = cache.entry(compiler.archive_cache_key(objs[:2]))
+    with open(entry, mode="rb") as file:
+        cached = file.read()
+
+    compiler.update_archive(dest, objs[1:], [objs[2]], ["first.o"])
+    assert members(dest) == ["second.o", "third.o"]
+    with open(entry, mode="rb") as file:
+        assert file.read() == cached
+
+    compiler.create_archive(dest, objs, thin=True)
+    with open(dest, mode="rb") as file:
+        assert file.read(8) == b"!<thin>\n"
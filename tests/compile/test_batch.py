@@ -0,0 +1,139 @@
+import os
+
+from litemake.compile import NodesCollector, JobScheduler
+from litemake.compile.compilers import CompilerOptions, GccCompiler
+from litemake.compile.depfile import read_depfile
+from litemake.compile.objcache import ObjectCache
+from litemake.compile.status import NodeFailed, NodePassed, NodeSkipped
+
+from tests.compilers.base import skip_if_missing_clis
+from .fake import FakeCompiler
+from .test_scheduler import build_graph
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from tests.utils import VirtualProject
+
+
+def test_objects_are_batched(project: "VirtualProject"):
+    compiler = FakeCompiler(delay=0)
+    exe = build_graph(project, compiler, amount=12)
+    objects = exe.dep_archives[0].dep_objects
+
+    results = dict(JobScheduler(NodesCollector(exe), jobs=2, batch=4).run())
+
+    assert all(status is NodePassed for status in results.values())
+    assert sorted(d for b in compiler.batches for d in b) == sorted(
+        o.dest for o in objects
+    )
+    assert max(len(b) for b in compiler.batches) == 4
+
+
+def test_small_batches_keep_jobs_busy(project: "VirtualProject"):
+    compiler = FakeCompiler(delay=0)
+    exe = build_graph(project, compiler, amount=4)
+
+    list(JobScheduler(NodesCollector(exe), jobs=2, batch=16).run())
+    assert [len(b) for b in compiler.batches] == [2, 2]
+
+
+def test_failed_batch_is_split(project: "VirtualProject"):
+    bad = project.join("src", "5.c")
+    compiler = FakeCompiler(delay=0, fail={bad})
+    exe = build_graph(project, compiler, amount=8)
+    archive = exe.dep_archives[0]
+
+    results = dict(JobScheduler(NodesCollector(exe), jobs=1, batch=8).run())
+
+    for obj in archive.dep_objects:
+        assert results[obj] is (NodeFailed if obj.src == bad else NodePassed)
+    assert results[archive] is NodeSkipped
+    assert results[exe] is NodeSkipped
+
+    # 8 -> 4 + 4 -> 2 + 2 -> 1 + 1
+    assert [len(b) for b in compiler.batches] == [8, 4, 4, 2, 2]
+
+
+@skip_if_missing_clis(GccCompiler)
+def test_gcc_batch(project: "VirtualProject"):
+    project.add_file("include/value.h", "#define VALUE 1")
+    objs = list()
+    for folder in ("first", "second"):
+        for name in ("main", "other"):
+            src = project.add_file(
+                f"{folder}/{name}.c",
+                f"#include <value.h>\nint {folder}_{name}() {{ return VALUE; }}",
+            )
+            dest = project.join("out", folder, f"{name}.o")
+            objs.append((src, dest, f"{dest}.d"))
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+
+    compiler = GccCompiler()
+    calls = list()
+    original = compiler._exec_cmd
+
+    def exec_cmd(*cmd, cwd=None):
+        calls.append(cmd)
+        return original(*cmd, cwd=cwd)
+
+    compiler._exec_cmd = exec_cmd
+    compiler.create_objs(objs, [project.join("include")])
+
+    # Sources with the same name are compiled in separate invocations
+    assert len(calls) == 2
+    for src, dest, depfile in objs:
+        assert os.path.isfile(dest)
+        assert read_depfile(depfile)[0] == src
+        with open(depfile) as file:
+            assert file.read().startswith(f"{dest}:")
+
+
+@skip_if_missing_clis(GccCompiler)
+def test_debug_info_is_not_batched(project: "VirtualProject"):
+    objs = list()
+    for name in ("first", "second"):
+        src = project.add_file(f"src/{name}.c", f"int {name}() {{ return 1; }}")
+        dest = project.join("out", f"{name}.o")
+        objs.append((src, dest, f"{dest}.d"))
+    os.makedirs(project.join("out"))
+
+    compiler = GccCompiler(options=CompilerOptions(cflags=["-g"]))
+    calls = list()
+    original = compiler._exec_cmd
+
+    def exec_cmd(*cmd, cwd=None):
+        calls.append(cwd)
+        return original(*cmd, cwd=cwd)
+
+    # The debug information records the folder in which the objects are
+    # compiled, so they aren't compiled together in a temporary folder
+    compiler._exec_cmd = exec_cmd
+    compiler.create_objs(objs, list())
+    assert calls == [None, None]
+    for _, dest, _ in objs:
+        with open(dest, mode="rb") as file:
+            assert os.getcwd().encode() in file.read()
+
+
+@skip_if_missing_clis(GccCompiler)
+def test_batches_are_not_cached(project: "VirtualProject"):
+    cache = ObjectCache(project.join("cache"))
+    compiler = GccCompiler(cache=cache)
+
+    def compile(*names: str) -> None:
+        objs = list()
+        for name in names:
+            src = project.add_file(f"src/{name}.c", f"int {name}() {{ return 1; }}")
+            dest = project.join("out", f"{name}.o")
+            objs.append((src, dest, f"{dest}.d"))
+        os.makedirs(project.join("out"), exist_ok=True)
+        compiler.create_objs(objs, list())
+
+    # Objects that are compiled together refer to other paths than objects
+    # that are compiled alone, so they aren't stored under the same keys
+    compile("first", "second")
+    assert cache.stats().size == 0
+
+    compile("third")
+    assert cache.stats().size > 0
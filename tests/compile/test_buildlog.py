@@ -0,0 +1,127 @@
+import os
+
+from litemake.compile import NodesCollector, JobScheduler
+from litemake.compile.buildlog import (
+    LOG_HEADER,
+    RECOMPACT_MIN_LINES,
+    BuildLog,
+    BuildRecord,
+    FileState,
+)
+from litemake.compile.graph import ArchiveFileNode, ObjectFileNode
+from litemake.compile.state import BuildState
+
+from .fake import FakeCompiler
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from tests.utils import VirtualProject
+
+
+def make_record(output: str, mtime: int = 1) -> BuildRecord:
+    return BuildRecord(
+        output=output,
+        state=FileState(mtime=mtime, size=10, digest="abc"),
+        signature="sig",
+        duration=1.5,
+        inputs={"main.c": FileState(mtime=2, size=20), "main.h": FileState(3, 30)},
+    )
+
+
+def test_record_roundtrip():
+    record = make_record("main.o")
+    assert BuildRecord.loads(record.dumps()) == record
+
+
+def test_records_persist(project: "VirtualProject"):
+    path = project.join("out", "build.log")
+
+    log = BuildLog(path)
+    log.record(make_record("a.o", mtime=1))
+    log.record(make_record("b.o", mtime=1))
+    log.record(make_record("a.o", mtime=2))
+    log.close()
+
+    loaded = BuildLog(path)
+    assert len(loaded) == 2
+    assert loaded.get("a.o") == make_record("a.o", mtime=2)
+    assert loaded.get("b.o") == make_record("b.o", mtime=1)
+    assert loaded.get("c.o") is None
+
+
+def test_cut_line_is_ignored(project: "VirtualProject"):
+    path = project.join("build.log")
+
+    log = BuildLog(path)
+    log.record(make_record("a.o"))
+    log.record(make_record("b.o"))
+    log.close()
+
+    with open(path, "r+") as file:
+        content = file.read()
+        file.seek(0)
+        file.truncate()
+        file.write(content[:-10])
+
+    loaded = BuildLog(path)
+    assert "a.o" in loaded
+    assert "b.o" not in loaded
+
+    # New records are appended after the cut line is removed
+    loaded.record(make_record("c.o"))
+    loaded.close()
+    assert set(BuildLog(path)._records) == {"a.o", "c.o"}
+
+
+def test_unknown_format_is_discarded(project: "VirtualProject"):
+    path = project.add_file("build.log", "# some other log\n[1, 2, 3]\n")
+    assert len(BuildLog(path)) == 0
+
+    with open(path) as file:
+        assert file.read() == LOG_HEADER + "\n"
+
+
+def test_log_is_compacted(project: "VirtualProject"):
+    path = project.join("build.log")
+
+    log = BuildLog(path)
+    for mtime in range(RECOMPACT_MIN_LINES):
+        log.record(make_record("a.o", mtime=mtime))
+    log.close()
+
+    loaded = BuildLog(path)
+    assert loaded.get("a.o").state.mtime == RECOMPACT_MIN_LINES - 1
+    with open(path) as file:
+        assert len(file.read().splitlines()) == 2
+
+
+def test_generated_nodes_are_recorded(project: "VirtualProject"):
+    state = BuildState(project.join("out", "build.log"))
+    compiler = FakeCompiler(delay=0)
+
+    archive = ArchiveFileNode(project.join("out", "lib.a"), compiler, state=state)
+    obj = ObjectFileNode(
+        src=project.add_file("main.c", "int main() { return 0; }"),
+        dest=project.join("out", "main.o"),
+        compiler=compiler,
+        includes=list(),
+        parent=archive,
+        state=state,
+    )
+    archive.add_object(obj)
+
+    list(JobScheduler(NodesCollector(archive)).run())
+    state.close()
+
+    log = BuildLog(state.log.path)
+    assert list(log.get(obj.dest).inputs) == [obj.src]
+    assert list(log.get(archive.dest).inputs) == [obj.dest]
+    assert log.get(obj.dest).state.matches(FileState.from_path(obj.dest))
+    assert log.get(obj.dest).duration >= 0
+
+    # Once recorded, the headers are read from the log and not the depfile
+    os.remove(obj.depfile)
+    obj.state = BuildState(state.log.path)
+    assert obj.inputs == [obj.src]
+    assert not obj.outdated
@@ -0,0 +1,130 @@
+from litemake.compile import NodesCollector, JobScheduler
+from litemake.compile.graph import (
+    ArchiveFileNode,
+    ExecutableFileNode,
+    ObjectFileNode,
+)
+from litemake.compile.state import BuildState
+from litemake.compile.status import NodeFailed, NodePassed, NodeSkipped
+
+from .fake import FakeCompiler, rescan
+from .test_hashcache import touch
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from tests.utils import VirtualProject
+
+
+def build_executable(project: "VirtualProject", compiler: FakeCompiler):
+    state = BuildState(log=project.join("out", "build.log"))
+    exe = ExecutableFileNode(project.join("out", "app"), compiler, state=state)
+    archive = ArchiveFileNode(
+        project.join("out", "app.a"), compiler, parent=exe, state=state
+    )
+    exe.add_dep_archive(archive)
+
+    for name in ("main", "math"):
+        obj = ObjectFileNode(
+            src=project.add_file(f"{name}.c", f"int {name};"),
+            dest=project.join("out", f"{name}.o"),
+            compiler=compiler,
+            includes=list(),
+            parent=archive,
+            state=state,
+        )
+        archive.add_object(obj)
+
+    return exe, archive
+
+
+def build(exe: "ExecutableFileNode") -> dict:
+    rescan(*exe.all_nodes())
+    return dict(JobScheduler(NodesCollector(exe)).run())
+
+
+def test_identical_object_cuts_off_parents(project: "VirtualProject"):
+    compiler = FakeCompiler(delay=0)
+    exe, archive = build_executable(project, compiler)
+    main = archive.dep_objects[0]
+
+    build(exe)
+    assert len(compiler.calls) == 4
+
+    # The object is older than its source, but compiling it again produces
+    # the same output, so its parents are marked as passed without being
+    # generated again
+    compiler.calls.clear()
+    touch(main.dest, -20)
+    results = build(exe)
+    assert compiler.calls == [main.dest]
+    assert results == {main: NodePassed, archive: NodePassed, exe: NodePassed}
+
+    # The new state of the inputs is recorded, so nothing is outdated now
+    compiler.calls.clear()
+    assert build(exe) == dict()
+    assert not any(node.outdated for node in exe.all_nodes())
+
+
+def test_changed_object_rebuilds_parents(project: "VirtualProject"):
+    compiler = FakeCompiler(delay=0)
+    exe, archive = build_executable(project, compiler)
+    main = archive.dep_objects[0]
+
+    build(exe)
+    compiler.calls.clear()
+
+    touch(main.dest, -20)
+    project.add_file("main.c", "int main() { return 0; }")
+    build(exe)
+    assert compiler.calls == [main.dest, archive.dest, exe.dest]
+
+
+def test_cutoff_after_failed_build(project: "VirtualProject"):
+    compiler = FakeCompiler(delay=0)
+    exe, archive = build_executable(project, compiler)
+    main, math = archive.dep_objects
+
+    build(exe)
+
+    # The first object changes, but the archive is skipped because the
+    # second object fails
+    project.add_file("main.c", "int main = 1;")
+    project.add_file("math.c", "int math = ;")
+    compiler.fail.add(math.src)
+    results = build(exe)
+    assert results[main] is NodePassed
+    assert results[math] is NodeFailed
+    assert results[archive] is NodeSkipped
+
+    # The second object is fixed, and compiled into its previous output. The
+    # archive still hasn't read the new version of the first object.
+    compiler.fail.clear()
+    compiler.calls.clear()
+    project.add_file("math.c", "int math;")
+    results = build(exe)
+    assert compiler.calls == [math.dest, archive.dest, exe.dest]
+    with open(exe.dest) as file:
+        assert "int main = 1;" in file.read()
+
+
+def test_relink_after_cancelled_build(project: "VirtualProject"):
+    compiler = FakeCompiler(delay=0)
+    exe, archive = build_executable(project, compiler)
+    main = archive.dep_objects[0]
+
+    build(exe)
+
+    # The build is cancelled right after the first object is compiled again
+    project.add_file("main.c", "int main = 1;")
+    rescan(*exe.all_nodes())
+    collector = NodesCollector(exe)
+    assert collector.generate(main) is NodePassed
+    collector.cancel()
+
+    compiler.calls.clear()
+    results = build(exe)
+    assert compiler.calls == [archive.dest, exe.dest]
+    assert results == {archive: NodePassed, exe: NodePassed}
+    with open(exe.dest) as file:
+        assert "int main = 1;" in file.read()
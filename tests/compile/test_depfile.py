@@ -0,0 +1,95 @@
+import os
+
+from litemake.compile.depfile import parse_depfile, read_depfile
+from litemake.compile.graph import ObjectFileNode
+from litemake.compile.compilers import Compiler, GccCompiler
+
+from tests.utils import change_cwd
+from tests.compilers.base import skip_if_missing_clis
+from .fake import rescan
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from tests.utils import VirtualProject
+
+
+def test_parse_single_line():
+    assert parse_depfile("main.o: main.c include/math.h\n") == [
+        "main.c",
+        "include/math.h",
+    ]
+
+
+def test_parse_continued_lines():
+    content = "out/main.o: src/main.c \\\n  include/a.h \\\n  include/b.h\n"
+    assert parse_depfile(content) == ["src/main.c", "include/a.h", "include/b.h"]
+
+
+def test_parse_escaped_spaces_and_dollars():
+    content = "main.o : my\\ file.c cost$$.h\n"
+    assert parse_depfile(content) == ["my file.c", "cost$.h"]
+
+
+def test_parse_windows_paths():
+    content = "C:\\out\\main.o: C:\\src\\main.c C:\\include\\math.h\n"
+    assert parse_depfile(content) == ["C:\\src\\main.c", "C:\\include\\math.h"]
+
+
+def test_parse_phony_targets():
+    # Generated with '-MP': each header is also a target without prerequisites
+    content = "main.o: main.c math.h\n\nmath.h:\n"
+    assert parse_depfile(content) == ["main.c", "math.h"]
+
+
+def test_read_missing_depfile(project: "VirtualProject"):
+    assert read_depfile(project.join("missing.d")) is None
+
+
+@skip_if_missing_clis(GccCompiler)
+def test_header_change_rebuilds_object(project: "VirtualProject"):
+    project.add_file("include/mymath.h", "int add(int, int);")
+    project.add_file("other.h", "int sub(int, int);")
+    src = project.add_file(
+        "math.c",
+        """
+        #include <mymath.h>
+        int add(int a, int b) { return a + b; }
+    """,
+    )
+
+    with change_cwd(project.basepath):
+        node = ObjectFileNode(
+            src=src,
+            dest=project.join("out", "math.o"),
+            compiler=Compiler("gcc"),
+            includes=["include/"],
+            parent=None,
+        )
+        assert node.outdated
+
+        node.generate()
+        rescan(node)
+        assert os.path.isfile(node.depfile)
+        assert not node.outdated
+        assert any(dep.endswith("mymath.h") for dep in node.inputs)
+
+        # A header that isn't included by the source doesn't affect the node
+        mtime = os.path.getmtime(node.dest) + 10
+        os.utime(project.join("other.h"), (mtime, mtime))
+        rescan(node)
+        assert not node.outdated
+
+        os.utime(project.join("include", "mymath.h"), (mtime, mtime))
+        rescan(node)
+        assert node.outdated
+
+        # The header's mtime is in the future, so we fake a newer object
+        node.generate()
+        os.utime(node.dest, (mtime + 1, mtime + 1))
+        rescan(node)
+        assert not node.outdated
+
+        os.remove(project.join("include", "mymath.h"))
+        rescan(node)
+        assert node.outdated
@@ -0,0 +1,128 @@
+import shutil
+
+import pytest
+
+from litemake.folders import ProjectFolder
+from litemake.compile import NodesCollector, JobScheduler
+from litemake.compile.graph import (
+    ArchiveFileNode,
+    CompilationGraph,
+    ObjectFileNode,
+)
+from litemake.compile.status import NodeFailed, NodePassed, NodeSkipped
+from litemake.exceptions import litemakeMissingProgramsError
+
+from tests.utils import change_cwd
+from .fake import FakeCompiler
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from tests.utils import VirtualProject
+
+
+def test_targets_share_objects(project: "VirtualProject"):
+    project.add_file("src/math.c", "int add(int a, int b) { return a + b; }")
+    project.add_file("src/main.c", "int main() { return 0; }")
+    project.add_file("tests/test.c", "int main() { return 0; }")
+    project.add_targets_file(
+        """
+        [lib]
+        library=true
+        sources=["src/math.c"]
+
+        [app]
+        sources=["src/*.c"]
+
+        [test]
+        sources=["src/math.c", "tests/*.c"]
+        include=["include/"]
+    """
+    )
+
+    with change_cwd(project.basepath):
+        graph = ProjectFolder(project.basepath).collect("lib", "app", "test")
+
+    lib, app, test = graph.heads
+    lib_objs = {o.src: o for o in lib.dep_objects}
+    app_objs = {o.src: o for o in app.dep_archives[0].dep_objects}
+    test_objs = {o.src: o for o in test.dep_archives[0].dep_objects}
+
+    # Same source and same configuration -> shared node
+    math_c = project.join("src", "math.c")
+    assert lib_objs[math_c] is app_objs[math_c]
+    assert set(lib_objs[math_c].parents) == {lib, app.dep_archives[0]}
+
+    # Different include paths -> different nodes and destinations
+    assert test_objs[math_c] is not lib_objs[math_c]
+    assert test_objs[math_c].dest != lib_objs[math_c].dest
+
+    # Each node appears only once in the merged graph
+    nodes = list(graph.all_nodes())
+    assert len(nodes) == len(set(nodes))
+    assert len([n for n in nodes if isinstance(n, ObjectFileNode)]) == 4
+
+
+def build_shared_graph(project: "VirtualProject", compiler: FakeCompiler):
+    graph = CompilationGraph()
+    shared = graph.add_object(
+        ObjectFileNode(
+            src=project.add_file("shared.c", "int shared;"),
+            dest=project.join("out", "shared.o"),
+            compiler=compiler,
+            includes=list(),
+            parent=None,
+        )
+    )
+
+    for name in ("first", "second"):
+        archive = ArchiveFileNode(project.join("out", f"{name}.a"), compiler)
+        own = ObjectFileNode(
+            src=project.add_file(f"{name}.c", f"int {name};"),
+            dest=project.join("out", f"{name}.o"),
+            compiler=compiler,
+            includes=list(),
+            parent=archive,
+        )
+        for obj in (shared, graph.add_object(own)):
+            obj.add_parent(archive)
+            archive.add_object(obj)
+        graph.add_head(archive)
+
+    return graph, shared
+
+
+def test_shared_object_compiled_once(project: "VirtualProject"):
+    compiler = FakeCompiler(delay=0)
+    graph, shared = build_shared_graph(project, compiler)
+
+    results = dict(JobScheduler(NodesCollector(graph), jobs=4).run())
+
+    assert all(status is NodePassed for status in results.values())
+    assert len(results) == 5
+    assert compiler.calls.count(shared.dest) == 1
+
+
+def test_shared_object_failure(project: "VirtualProject"):
+    compiler = FakeCompiler(delay=0, fail={project.join("shared.c")})
+    graph, shared = build_shared_graph(project, compiler)
+
+    results = dict(JobScheduler(NodesCollector(graph), jobs=4).run())
+
+    assert results[shared] is NodeFailed
+    for head in graph.heads:
+        assert results[head] is NodeSkipped
+        assert results[head.dep_objects[1]] is NodePassed
+
+
+def test_missing_linker(project: "VirtualProject", monkeypatch):
+    project.add_file("src/main.c", "int main() { return 0; }")
+    project.add_targets_file('[app]\nsources=["src/*.c"]')
+    project.add_settings_file('linker="mold"')
+
+    which = shutil.which
+    monkeypatch.setattr(
+        shutil, "which", lambda cli: None if cli == "ld.mold" else which(cli)
+    )
+    with change_cwd(project.basepath), pytest.raises(litemakeMissingProgramsError):
+        ProjectFolder(project.basepath).collect("app")
@@ -0,0 +1,114 @@
+import os
+import hashlib
+
+import litemake.compile.hashcache
+from litemake.compile import NodesCollector, JobScheduler
+from litemake.compile.graph import ObjectFileNode
+from litemake.compile.hashcache import HashCache, file_digest
+from litemake.compile.state import BuildState
+
+from .fake import FakeCompiler, rescan
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from tests.utils import VirtualProject
+
+
+def touch(path: str, delta: float = 10) -> None:
+    """Moves the modification time of the given file forward."""
+    mtime = os.path.getmtime(path) + delta
+    os.utime(path, (mtime, mtime))
+
+
+def test_file_digest(project: "VirtualProject", monkeypatch):
+    small = project.add_file("small.txt", "hello")
+    large = project.add_file("large.txt", "x" * 4096)
+    expected = hashlib.blake2b(b"x" * 4096, digest_size=16).hexdigest()
+
+    assert file_digest(large) == expected
+    monkeypatch.setattr(litemake.compile.hashcache, "MMAP_THRESHOLD", 1024)
+    assert file_digest(large) == expected
+    assert file_digest(small) != expected
+
+
+def test_unchanged_files_are_not_read(project: "VirtualProject", monkeypatch):
+    reads = list()
+
+    def counting_digest(path: str) -> str:
+        reads.append(path)
+        return file_digest(path)
+
+    monkeypatch.setattr(litemake.compile.hashcache, "file_digest", counting_digest)
+
+    paths = [project.add_file(f"{i}.c", f"int x{i};") for i in range(4)]
+    cache = HashCache(project.join("hashes.json"))
+
+    first = cache.digest_many(paths)
+    assert sorted(reads) == sorted(paths)
+
+    reads.clear()
+    assert cache.digest_many(paths) == first
+    assert reads == list()
+
+    # A file that was only touched is read again, but its digest is the same
+    touch(paths[0])
+    assert cache.digest(paths[0]) == first[paths[0]]
+    assert reads == [paths[0]]
+
+    # The cache survives between runs
+    reads.clear()
+    cache.close()
+    assert HashCache(cache.path).digest_many(paths) == first
+    assert reads == list()
+
+
+def test_missing_file(project: "VirtualProject"):
+    assert HashCache().digest(project.join("missing.c")) is None
+
+
+def build_object(project: "VirtualProject", use_hashes: bool):
+    state = BuildState(
+        log=project.join("out", "build.log"),
+        hashes=project.join("out", "hashes.json"),
+        use_hashes=use_hashes,
+    )
+    obj = ObjectFileNode(
+        src=project.add_file("main.c", "int main() { return 0; }"),
+        dest=project.join("out", "main.o"),
+        compiler=FakeCompiler(delay=0),
+        includes=list(),
+        parent=None,
+        state=state,
+    )
+    list(JobScheduler(NodesCollector(obj)).run())
+    return obj
+
+
+def test_hash_mode_ignores_touched_sources(project: "VirtualProject"):
+    obj = build_object(project, use_hashes=True)
+    assert not obj.outdated
+
+    touch(obj.src)
+    rescan(obj)
+    assert not obj.outdated
+
+    with open(obj.src, "w") as file:
+        file.write("int main() { return 1; }")
+    rescan(obj)
+    assert obj.outdated
+
+
+def test_mtime_mode_rebuilds_touched_sources(project: "VirtualProject"):
+    obj = build_object(project, use_hashes=False)
+    assert not obj.outdated
+
+    touch(obj.src)
+    rescan(obj)
+    assert obj.outdated
+
+    # Switching to hash mode with a record that has no digests falls back to
+    # comparing the modification times
+    obj.state.use_hashes = True
+    rescan(obj)
+    assert obj.outdated
@@ -0,0 +1,125 @@
+import os
+import sys
+
+from litemake.compile import NodesCollector, JobScheduler
+from litemake.compile import jobserver as jobserver_module
+from litemake.compile.jobserver import JobServer, connect_parent, jobserver
+from litemake.compile.buildlog import BuildRecord, FileState
+from litemake.compile.status import NodePassed
+
+from .fake import FakeCompiler
+from .test_scheduler import build_graph
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from tests.utils import VirtualProject
+
+
+def test_makeflags(project: "VirtualProject"):
+    assert JobServer.from_makeflags("") is None
+    assert JobServer.from_makeflags("-j4") is None
+    assert JobServer.from_makeflags("-j4 --jobserver-auth=998,999") is None
+
+    # Descriptors of other files are never used as a jobserver
+    with open(project.add_file("build.log", ""), "r+") as file:
+        fd = file.fileno()
+        assert JobServer.from_makeflags(f"-j4 --jobserver-auth={fd},{fd}") is None
+
+    read_fd, write_fd = os.pipe()
+    try:
+        for flag in ("--jobserver-fds", "--jobserver-auth"):
+            server = JobServer.from_makeflags(f"w -j4 {flag}={read_fd},{write_fd}")
+            assert server.fds == (read_fd, write_fd)
+            assert not os.get_blocking(read_fd)
+            assert server.try_acquire() == b""  # the implicit token
+            assert server.try_acquire() is None  # the pipe is empty
+            server.close()
+            os.fstat(read_fd)  # the pipe of the parent make isn't closed
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+    path = project.join("fifo")
+    os.mkfifo(path)
+    server = JobServer.from_makeflags(f"-j4 --jobserver-auth=fifo:{path}")
+    try:
+        assert server.fds == tuple()
+        os.write(server.write_fd, b"+")
+        assert server.acquire() == b""  # the implicit token
+        assert server.acquire() == b"+"
+    finally:
+        server.close()
+
+
+def test_jobserver_limits_jobs(project: "VirtualProject"):
+    compiler = FakeCompiler()
+    exe = build_graph(project, compiler, amount=8)
+
+    server = JobServer.create(2)
+    try:
+        scheduler = JobScheduler(NodesCollector(exe), jobs=4, jobserver=server)
+        assert all(status is NodePassed for _, status in scheduler.run())
+        assert compiler.max_active == 2
+
+        # All the tokens have been returned
+        os.set_blocking(server.read_fd, False)
+        assert os.read(server.read_fd, 16) == b"+"
+    finally:
+        server.close()
+
+
+def test_jobserver_for_child_tools(monkeypatch, capsys):
+    monkeypatch.delenv("MAKEFLAGS", raising=False)
+    monkeypatch.setattr(jobserver_module, "_parent", None)
+
+    with jobserver(3) as server:
+        assert os.environ["MAKEFLAGS"] == f"-j3 --jobserver-auth={server.auth}"
+
+        # The subprocesses of the compilers inherit the pipe
+        read_fd, _ = server.fds
+        script = f"import os; print(len(os.read({read_fd}, 2)))"
+        assert FakeCompiler()._exec_cmd(sys.executable, "-c", script) == "2\n"
+    assert "MAKEFLAGS" not in os.environ
+
+    # A jobserver of a parent make is used instead of a new one
+    read_fd, write_fd = os.pipe()
+    try:
+        makeflags = f"-j2 --jobserver-auth={read_fd},{write_fd}"
+        monkeypatch.setenv("MAKEFLAGS", makeflags)
+        parent = connect_parent()
+        with jobserver(3) as server:
+            assert server is parent
+            assert os.environ["MAKEFLAGS"] == makeflags
+        os.fstat(read_fd)  # still open for the next builds
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+    # A jobserver that can't be reached is replaced by a new one
+    monkeypatch.setenv("MAKEFLAGS", "-j2 --jobserver-auth=998,999")
+    assert connect_parent() is None
+    assert "jobserver unavailable" in capsys.readouterr().out
+    with jobserver(3) as server:
+        assert server.auth in os.environ["MAKEFLAGS"]
+
+
+def test_tokens_keep_critical_path_order(project: "VirtualProject"):
+    compiler = FakeCompiler(delay=0.01)
+    exe = build_graph(project, compiler, amount=4)
+    objs = exe.dep_archives[0].dep_objects
+    for obj, duration in zip(objs, [1.0, 2.0, 9.0, 3.0]):
+        record = BuildRecord(obj.dest, FileState(0, 0), duration=duration)
+        obj.state.log.record(record)
+
+    # Only the implicit token is available, so a single job runs at a time,
+    # and the nodes still start in order of their critical path
+    server = JobServer.create(1)
+    try:
+        scheduler = JobScheduler(NodesCollector(exe), jobs=4, jobserver=server)
+        results = [node for node, _ in scheduler.run()]
+    finally:
+        server.close()
+
+    assert compiler.max_active == 1
+    assert results[:4] == [objs[2], objs[3], objs[1], objs[0]]
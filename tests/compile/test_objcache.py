@@ -0,0 +1,180 @@
+import os
+import shutil
+
+from litemake.compile.compilers import GccCompiler
+from litemake.compile.compilers.options import CompilerOptions
+from litemake.compile.objcache import ObjectCache, CacheStats, clone_file
+
+from tests.compilers.base import skip_if_missing_clis
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from tests.utils import VirtualProject
+
+
+def test_fetch_and_store(project: "VirtualProject"):
+    cache = ObjectCache(project.join("cache"))
+    obj = project.add_file("main.o", "object")
+    dest = project.join("other.o")
+
+    assert not cache.fetch("a" * 40, dest)
+    cache.store("a" * 40, obj)
+    assert cache.fetch("a" * 40, dest)
+
+    with open(dest) as file:
+        assert file.read() == "object"
+    assert cache.session == CacheStats(hits=1, misses=1, size=len("object"))
+
+    # Statistics are accumulated between runs
+    cache.close()
+    assert cache.session == CacheStats()
+    assert ObjectCache(cache.path).stats() == CacheStats(hits=1, misses=1, size=6)
+
+
+def test_fetch_keeps_other_outputs(project: "VirtualProject"):
+    cache = ObjectCache(project.join("cache"))
+    cache.store("ab" * 20, project.add_file("main.o", "object"))
+
+    first = project.join("first", "main.o")
+    os.makedirs(os.path.dirname(first))
+    assert cache.fetch("ab" * 20, first)
+    os.utime(first, (1, 1))
+
+    # Using the entry again doesn't touch the outputs of other builds
+    assert cache.fetch("ab" * 20, project.join("second.o"))
+    assert os.path.getmtime(first) == 1
+    assert os.stat(first).st_ino != os.stat(cache.entry("ab" * 20)).st_ino
+
+
+def test_clone_replaces_destination(project: "VirtualProject"):
+    src = project.add_file("src.o", "new")
+    dest = project.add_file("dest.o", "old")
+    link = project.join("link.o")
+    os.link(dest, link)
+
+    clone_file(src, dest)
+    with open(dest) as file:
+        assert file.read() == "new"
+
+    # Other links to the previous destination aren't affected
+    with open(link) as file:
+        assert file.read() == "old"
+
+
+def test_cleanup_removes_least_recently_used(project: "VirtualProject"):
+    cache = ObjectCache(project.join("cache"), max_size=30)
+    obj = project.add_file("main.o", "x" * 10)
+
+    keys = [c * 40 for c in "abcd"]
+    for index, key in enumerate(keys):
+        cache.store(key, obj)
+        os.utime(cache.entry(key), (index, index))
+
+    # Using an entry marks it as recently used
+    assert cache.fetch(keys[0], project.join("used.o"))
+
+    cache.close()
+    assert os.path.isfile(cache.entry(keys[0]))
+    assert not os.path.isfile(cache.entry(keys[1]))
+    assert not os.path.isfile(cache.entry(keys[2]))
+    assert os.path.isfile(cache.entry(keys[3]))
+    assert cache.stats().size == 20
+
+
+@skip_if_missing_clis(GccCompiler)
+def test_cache_shared_between_projects(project: "VirtualProject"):
+    cache = ObjectCache(project.join("cache"))
+    compiler = GccCompiler(cache=cache)
+
+    project.add_file("first/include/math.h", "#define VALUE 1")
+    project.add_file("second/include/math.h", "#define VALUE 1")
+    for name in ("first", "second"):
+        project.add_file(
+            f"{name}/main.c",
+            """
+            #include <math.h>
+            int value() { return VALUE; }
+        """,
+        )
+
+    def compile(name: str) -> str:
+        dest = project.join(name, "main.o")
+        compiler.create_obj(
+            src=project.join(name, "main.c"),
+            dest=dest,
+            includes=[project.join(name, "include")],
+            depfile=f"{dest}.d",
+        )
+        return dest
+
+    first = compile("first")
+    assert cache.session.misses == 1
+
+    # The same source in another folder is taken from the cache, and its
+    # dependency file is still generated
+    second = compile("second")
+    assert cache.session.hits == 1
+    with open(first, "rb") as a, open(second, "rb") as b:
+        assert a.read() == b.read()
+    with open(f"{second}.d") as file:
+        assert project.join("second", "include", "math.h") in file.read()
+
+    # A change in an included header changes the key
+    project.add_file("second/include/math.h", "#define VALUE 2")
+    compile("second")
+    assert cache.session.misses == 2
+
+
+@skip_if_missing_clis(GccCompiler)
+def test_archives_are_cached(project: "VirtualProject"):
+    cache = ObjectCache(project.join("cache"))
+    compiler = GccCompiler(cache=cache)
+
+    for name in ("first", "second"):
+        src = project.add_file(f"{name}/math.c", "int add(int a, int b);")
+        compiler.create_obj(src, project.join(name, "math.o"), list())
+        compiler.create_archive(
+            project.join(name, "math.a"), [project.join(name, "math.o")]
+        )
+
+    # Both the object and the archive of the second folder are cache hits
+    assert cache.session.misses == 2
+    assert cache.session.hits == 2
+
+    # The objects are hashed through the hash cache of the compiler
+    assert project.join("second", "math.o") in compiler.hashes._entries
+
+
+@skip_if_missing_clis(GccCompiler)
+def test_debug_info_keys(project: "VirtualProject"):
+    cache = ObjectCache(project.join("cache"))
+    compiler = GccCompiler(cache=cache, options=CompilerOptions(cflags=["-g"]))
+
+    def compile(name: str, content: str) -> None:
+        src = project.add_file(f"{name}/main.c", content)
+        compiler.create_obj(src, project.join(name, "main.o"), list())
+
+    # Objects with debug information refer to the paths and the lines of
+    # their sources, so they aren't shared between folders
+    compile("first", "int value() { return 1; }")
+    compile("second", "int value() { return 1; }")
+    assert cache.session.misses == 2
+
+    compile("first", "\n// moved\nint value() { return 1; }")
+    assert cache.session.misses == 3
+    compile("first", "int value() { return 1; }")
+    assert cache.session.hits == 1
+
+
+@skip_if_missing_clis(GccCompiler)
+def test_compiler_identity(project: "VirtualProject"):
+    # The identity doesn't depend on the path or the modification time of
+    # the compiler, so identical toolchains share the cache
+    copy = project.join("bin", "gcc")
+    os.makedirs(os.path.dirname(copy))
+    shutil.copy(shutil.which("gcc"), copy)
+
+    compiler = GccCompiler()
+    assert compiler.identity(copy) == compiler.identity("gcc")
+    assert compiler.identity("ar") != compiler.identity("gcc")
@@ -0,0 +1,122 @@
+import os
+
+from litemake.folders import ProjectFolder
+from litemake.compile import NodesCollector, JobScheduler
+from litemake.compile.compilers import GplusplusCompiler
+from litemake.compile.graph import ObjectFileNode, PrecompiledHeaderNode
+
+from tests.utils import change_cwd, execute
+from tests.compilers.base import skip_if_missing_clis
+from .fake import FakeCompiler
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from tests.utils import VirtualProject
+
+
+def pch_project(project: "VirtualProject") -> None:
+    project.add_file("include/value.h", "#define VALUE 1")
+    project.add_file(
+        "include/common.h",
+        """
+        #include <stdio.h>
+        #include "value.h"
+    """,
+    )
+    project.add_file("src/value.c", "int value() { return VALUE; }")
+    project.add_file(
+        "src/main.c",
+        """
+        int value();
+        int main() { printf("%d\\n", value()); return 0; }
+    """,
+    )
+    project.add_targets_file(
+        """
+        [app]
+        sources=["src/*.c"]
+        include=["include/"]
+        pch="include/common.h"
+
+        [other]
+        sources=["src/*.c"]
+        include=["include/"]
+        pch="include/common.h"
+
+        [plain]
+        sources=["src/*.c"]
+        include=["include/"]
+    """
+    )
+
+
+def test_objects_depend_on_pch(project: "VirtualProject"):
+    pch_project(project)
+    with change_cwd(project.basepath):
+        graph = ProjectFolder(project.basepath).collect("app", "other", "plain")
+
+    app, other, plain = [head.dep_archives[0].dep_objects for head in graph.heads]
+    pch = app[0].pch
+    assert isinstance(pch, PrecompiledHeaderNode)
+    assert pch.src == project.join("include", "common.h")
+    assert all(obj.dependencies == [pch] for obj in app)
+
+    # Targets with the same configuration share the objects and the header
+    assert app == other
+    assert all(obj.pch is None for obj in plain)
+    assert not set(o.dest for o in app) & set(o.dest for o in plain)
+
+    nodes = list(graph.all_nodes())
+    assert len([n for n in nodes if isinstance(n, PrecompiledHeaderNode)]) == 1
+    assert nodes.index(pch) < min(nodes.index(obj) for obj in app)
+
+
+def test_pch_is_generated_first(project: "VirtualProject"):
+    compiler = FakeCompiler(delay=0)
+    pch = PrecompiledHeaderNode(
+        header=project.add_file("common.h", "int x;"),
+        forwarder=project.join("out", "pch", "common.h"),
+        compiler=compiler,
+        includes=list(),
+    )
+    obj = ObjectFileNode(
+        src=project.add_file("main.c", "int main;"),
+        dest=project.join("out", "main.o"),
+        compiler=compiler,
+        includes=list(),
+        parent=None,
+        pch=pch,
+    )
+    pch.add_parent(obj)
+
+    list(JobScheduler(NodesCollector(obj)).run())
+    assert compiler.calls == [pch.dest, obj.dest]
+    assert pch.dest in obj.inputs
+    assert pch.forwarder in obj.command
+
+
+@skip_if_missing_clis(GplusplusCompiler)
+def test_pch_build(project: "VirtualProject"):
+    pch_project(project)
+    project.run("app")
+    assert execute(project.join("app")) == "1\n"
+
+    with change_cwd(project.basepath):
+        folder = ProjectFolder(project.basepath)
+        graph = folder.collect("app")
+    pch = graph.heads[0].dep_archives[0].dep_objects[0].pch
+    assert os.path.isfile(pch.dest)
+    assert pch.dest.endswith(".gch")
+    assert not pch.outdated
+
+    # A header that is included by the precompiled header invalidates it
+    value_h = project.add_file("include/value.h", "#define VALUE 2")
+    mtime = os.path.getmtime(pch.dest) + 10
+    os.utime(value_h, (mtime, mtime))
+    with change_cwd(project.basepath):
+        graph = ProjectFolder(project.basepath).collect("app")
+    assert graph.heads[0].dep_archives[0].dep_objects[0].pch.outdated
+
+    project.run("app")
+    assert execute(project.join("app")) == "2\n"
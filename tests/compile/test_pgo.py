@@ -0,0 +1,96 @@
+import os
+import sys
+
+import pytest
+
+from litemake.__main__ import pgo, parse_pgo_args
+from litemake.folders import ProjectFolder
+from litemake.compile.compilers import ClangCompiler, CompilerOptions, GccCompiler
+from litemake.exceptions import litemakeCompilationError, litemakePgoError
+
+from tests.utils import change_cwd, execute
+from tests.compilers.base import skip_if_missing_clis
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from tests.utils import VirtualProject
+
+
+def pgo_project(project: "VirtualProject") -> None:
+    project.add_file(
+        "src/main.c",
+        """
+        #include <stdio.h>
+        #include <stdlib.h>
+        int collatz(int n) { return n % 2 ? 3 * n + 1 : n / 2; }
+        int main(int argc, char **argv) {
+            int n = atoi(argv[1]), steps = 0;
+            while (n != 1) { n = collatz(n); steps++; }
+            printf("%d\\n", steps);
+            return 0;
+        }
+    """,
+    )
+    project.add_targets_file('[app]\nsources=["src/*.c"]')
+    project.add_settings_file('compiler="gcc"')
+
+
+def test_parse_pgo_args():
+    args = parse_pgo_args(["app", "-j", "2", "--", "./app", "--bench"])
+    assert args.target == "app"
+    assert args.jobs == 2
+    assert args.command == ["./app", "--bench"]
+
+    with pytest.raises(SystemExit):
+        parse_pgo_args(["app"])
+
+
+def test_llvm_merge_errors(project: "VirtualProject", monkeypatch):
+    options = CompilerOptions(pgo="use", pgo_dir=project.join("pgo"))
+    compiler = ClangCompiler(options=options)
+    with pytest.raises(litemakePgoError, match="didn't write profile data"):
+        compiler.merge_profiles(project.join("instrumented"), project.join("optimized"))
+
+    def fail(*cmd):
+        raise litemakeCompilationError("llvm-profdata", "malformed profile")
+
+    project.add_file("pgo/raw/app.profraw", "")
+    monkeypatch.setattr(compiler, "_exec_cmd", fail)
+    with pytest.raises(litemakePgoError) as error:
+        compiler.merge_profiles(project.join("instrumented"), project.join("optimized"))
+    assert error.value.msg[-1].endswith("malformed profile")
+
+
+@skip_if_missing_clis(GccCompiler)
+def test_pgo_workflow(project: "VirtualProject"):
+    pgo_project(project)
+    app = project.join("app")
+
+    with change_cwd(project.basepath):
+        pgo("app", [app, "27"])
+        optimized = ProjectFolder(project.basepath, pgo="use")
+        instrumented = ProjectFolder(project.basepath, pgo="generate")
+
+    # The stages are built in separate folders, and the profile data of the
+    # instrumented objects is copied next to the optimized objects
+    assert optimized.output.objects != instrumented.output.objects
+    folder = optimized.output.objects
+    data = [name for _, _, names in os.walk(folder) for name in names]
+    assert "main.c.gcda" in data or "main.gcda" in data
+    assert execute([app, "27"]) == "111\n"
+
+    # The same training doesn't change the profile data, so nothing is
+    # compiled again
+    with change_cwd(project.basepath):
+        graph = ProjectFolder(project.basepath, pgo="use").collect("app")
+    obj = graph.heads[0].dep_archives[0].dep_objects[0]
+    assert optimized.output.pgo_stamp in obj.inputs
+    mtime = os.path.getmtime(obj.dest)
+
+    with change_cwd(project.basepath):
+        pgo("app", [app, "27"])
+    assert os.path.getmtime(obj.dest) == mtime
+
+    with change_cwd(project.basepath), pytest.raises(litemakePgoError):
+        pgo("app", [sys.executable, "-c", "exit(1)"])
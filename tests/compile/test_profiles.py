@@ -0,0 +1,87 @@
+import pytest
+
+from litemake.folders import ProjectFolder
+from litemake.compile import NodesCollector
+from litemake.compile.compilers import GccCompiler
+from litemake.exceptions import litemakeUnknownProfileError
+
+from tests.utils import change_cwd, execute
+from tests.compilers.base import skip_if_missing_clis
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from tests.utils import VirtualProject
+
+
+def profiles_project(project: "VirtualProject") -> None:
+    project.add_file(
+        "src/main.c",
+        """
+        #include <stdio.h>
+        int main() {
+        #ifdef NDEBUG
+            printf("release\\n");
+        #else
+            printf("debug\\n");
+        #endif
+            return 0;
+        }
+    """,
+    )
+    project.add_targets_file('[app]\nsources=["src/*.c"]')
+    project.add_settings_file(
+        """
+        compiler="gcc"
+
+        [profiles.fast]
+        flags=["-O3", "-DNDEBUG"]
+        link_flags=["-s"]
+        lto="full"
+    """
+    )
+
+
+def collect(project: "VirtualProject", profile: str = None):
+    with change_cwd(project.basepath):
+        return ProjectFolder(project.basepath, profile=profile).collect("app")
+
+
+def test_profiles_have_separate_outputs(project: "VirtualProject"):
+    profiles_project(project)
+
+    debug, release, fast = [
+        collect(project, name).heads[0] for name in ("debug", "release", "fast")
+    ]
+    obj = fast.dep_archives[0].dep_objects[0]
+    assert "-O3" in obj.command
+    assert "-s" in fast.command
+    assert "-flto-partition=one" in fast.command
+    assert "-flto=auto" not in debug.command
+    assert "-g" in debug.dep_archives[0].dep_objects[0].command
+
+    outputs = [
+        {node.dest for node in head.all_nodes()} for head in (debug, release, fast)
+    ]
+    assert not outputs[0] & outputs[1]
+    assert not outputs[1] & outputs[2]
+    assert all(project.join(".litemake", "fast") in dest for dest in outputs[2])
+
+    with pytest.raises(litemakeUnknownProfileError):
+        collect(project, "unknown")
+
+
+@skip_if_missing_clis(GccCompiler)
+def test_switching_profiles(project: "VirtualProject"):
+    profiles_project(project)
+
+    project.run("app")
+    assert execute(project.join("app")) == "debug\n"
+    project.run("app", profile="release")
+    assert execute(project.join("app")) == "release\n"
+
+    # Switching back to a profile that is up to date doesn't generate anything
+    graph = collect(project, "debug")
+    assert NodesCollector(graph).count_outdated == 0
+    project.run("app", profile="debug")
+    assert execute(project.join("app")) == "debug\n"
@@ -0,0 +1,91 @@
+import pytest
+
+from litemake.compile.cacheserver import CacheServer
+from litemake.compile.objcache import ObjectCache
+from litemake.compile.remote import RemoteCache, RemoteStats
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from tests.utils import VirtualProject
+
+
+@pytest.fixture
+def server(project: "VirtualProject"):
+    server = CacheServer(project.join("remote"), quiet=True)
+    server.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_and_put(project: "VirtualProject", server: CacheServer):
+    key = "ab" * 20
+    remote = RemoteCache(server.url)
+    assert remote.get(key) is None
+
+    remote.put(key, project.add_file("main.o", "object"))
+    remote.close()
+    assert remote.stats == RemoteStats(misses=1, uploads=1)
+
+    # Connections are reused between requests
+    remote = RemoteCache(server.url)
+    for _ in range(3):
+        assert remote.get(key) == b"object"
+    assert remote._idle.qsize() == 1
+    remote.close()
+
+
+def test_read_only_client(project: "VirtualProject", server: CacheServer):
+    remote = RemoteCache(server.url, upload=False)
+    remote.put("ab" * 20, project.add_file("main.o", "object"))
+    remote.close()
+    assert remote.stats == RemoteStats()
+
+
+def test_unreachable_server():
+    remote = RemoteCache("http://localhost:1", timeout=1)
+    assert remote.get("ab" * 20) is None
+    assert not remote.available
+    assert remote.stats.errors == 1
+
+    # The server isn't contacted again
+    assert remote.get("ab" * 20) is None
+    assert remote.stats.errors == 1
+    remote.close()
+
+
+def test_server_stopped_between_requests(project: "VirtualProject", server):
+    key = "ab" * 20
+    remote = RemoteCache(server.url, timeout=1)
+    assert remote.get(key) is None
+    assert remote._idle.qsize() == 1
+
+    # The idle connection fails, and so does a new one, so the remote cache
+    # is given up instead of retried forever
+    server.shutdown()
+    server.server_close()
+    assert remote.get(key) is None
+    assert not remote.available
+    assert remote.stats.errors == 1
+    assert remote._idle.qsize() == 0
+    remote.close()
+
+
+def test_local_cache_backed_by_remote(project: "VirtualProject", server):
+    key = "cd" * 20
+    first = ObjectCache(project.join("first"), remote=RemoteCache(server.url))
+    first.store(key, project.add_file("main.o", "object"))
+    first.close()
+
+    # Another machine (with an empty local cache) downloads the entry once
+    second = ObjectCache(project.join("second"), remote=RemoteCache(server.url))
+    assert second.fetch(key, project.join("a.o"))
+    assert second.fetch(key, project.join("b.o"))
+    assert second.session.hits == 2
+    assert second.session.remote_hits == 1
+    assert second.remote.stats.hits == 1
+    second.close()
+
+    with open(project.join("b.o")) as file:
+        assert file.read() == "object"
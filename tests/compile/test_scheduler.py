@@ -0,0 +1,229 @@
+from litemake.compile import NodesCollector, JobScheduler
+from litemake.compile.compilers import AbstractCompiler
+from litemake.compile.graph import (
+    ArchiveFileNode,
+    ExecutableFileNode,
+    ObjectFileNode,
+)
+from litemake.compile.buildlog import BuildRecord, FileState
+from litemake.compile.resources import ResourceLimits, memory_usage
+from litemake.exceptions import litemakeCompilationError
+from litemake.compile.status import (
+    NodeFailed,
+    NodePassed,
+    NodeSkipped,
+    NodeUnbuilt,
+)
+
+from .fake import FakeCompiler
+
+import time
+import signal
+import typing
+
+if typing.TYPE_CHECKING:
+    from tests.utils import VirtualProject
+
+
+def build_graph(
+    project: "VirtualProject", compiler: AbstractCompiler, amount: int
+) -> ExecutableFileNode:
+    exe = ExecutableFileNode(project.join("out", "main"), compiler)
+    archive = ArchiveFileNode(project.join("out", "main.a"), compiler, parent=exe)
+    exe.add_dep_archive(archive)
+
+    for i in range(amount):
+        src = project.add_file(f"src/{i}.c", f"int func{i}() {{ return {i}; }}")
+        obj = ObjectFileNode(
+            src=src,
+            dest=project.join("out", "objects", f"{i}.o"),
+            compiler=compiler,
+            includes=list(),
+            parent=archive,
+        )
+        archive.add_object(obj)
+
+    return exe
+
+
+def test_concurrent_jobs(project: "VirtualProject"):
+    compiler = FakeCompiler()
+    exe = build_graph(project, compiler, amount=8)
+
+    scheduler = JobScheduler(NodesCollector(exe), jobs=4)
+    results = list(scheduler.run())
+
+    assert compiler.max_active == 4
+    assert all(status is NodePassed for _, status in results)
+    assert [node for node, _ in results][-2:] == [exe.dep_archives[0], exe]
+    assert compiler.calls[-2:] == [exe.dep_archives[0].dest, exe.dest]
+
+
+def test_single_job(project: "VirtualProject"):
+    compiler = FakeCompiler(delay=0)
+    exe = build_graph(project, compiler, amount=4)
+
+    collector = NodesCollector(exe)
+    results = list(JobScheduler(collector, jobs=1).run())
+
+    assert compiler.max_active == 1
+    assert [node for node, _ in results] == collector.outdated_nodes
+
+
+def test_failure_skips_dependents(project: "VirtualProject"):
+    compiler = FakeCompiler(fail={project.join("src", "1.c")})
+    exe = build_graph(project, compiler, amount=4)
+    archive = exe.dep_archives[0]
+
+    results = dict(JobScheduler(NodesCollector(exe), jobs=4).run())
+
+    assert results[archive.dep_objects[1]] is NodeFailed
+    assert results[archive] is NodeSkipped
+    assert results[exe] is NodeSkipped
+    for i in (0, 2, 3):
+        assert results[archive.dep_objects[i]] is NodePassed
+
+    # Skipped nodes should not be generated at all
+    assert archive.dest not in compiler.calls
+    assert exe.dest not in compiler.calls
+
+
+def test_nothing_outdated(project: "VirtualProject"):
+    compiler = FakeCompiler(delay=0)
+    exe = build_graph(project, compiler, amount=3)
+    list(JobScheduler(NodesCollector(exe)).run())
+
+    compiler.calls.clear()
+    assert list(JobScheduler(NodesCollector(exe)).run()) == list()
+    assert compiler.calls == list()
+
+
+def test_critical_path_first(project: "VirtualProject"):
+    compiler = FakeCompiler(delay=0)
+    exe = build_graph(project, compiler, amount=4)
+    archive = exe.dep_archives[0]
+    objs = archive.dep_objects
+
+    # Durations of previous builds are taken from the build log. Nodes that
+    # have never been generated take the average of their type.
+    for obj, duration in zip(objs[:3], [1.0, 2.0, 9.0]):
+        record = BuildRecord(obj.dest, FileState(0, 0), duration=duration)
+        obj.state.log.record(record)
+
+    scheduler = JobScheduler(NodesCollector(exe), jobs=1)
+    assert scheduler.priority[exe] == 1.0
+    assert scheduler.priority[archive] == 2.0
+    assert scheduler.priority[objs[2]] == 11.0
+    assert scheduler.priority[objs[3]] == 6.0
+
+    results = [node for node, _ in scheduler.run()]
+    assert results == [objs[2], objs[3], objs[1], objs[0], archive, exe]
+
+
+def test_job_pools(project: "VirtualProject"):
+    compiler = FakeCompiler()
+    exe = build_graph(project, compiler, amount=8)
+
+    scheduler = JobScheduler(NodesCollector(exe), jobs=4, pools={"compile": 2})
+    assert all(status is NodePassed for _, status in scheduler.run())
+    assert compiler.max_active == 2
+
+
+class SaturatedLimits(ResourceLimits):
+    def saturated(self) -> bool:
+        return True
+
+
+def test_saturated_machine_runs_single_job(project: "VirtualProject"):
+    compiler = FakeCompiler(delay=0.01)
+    exe = build_graph(project, compiler, amount=4)
+
+    scheduler = JobScheduler(NodesCollector(exe), jobs=4, limits=SaturatedLimits())
+    assert all(status is NodePassed for _, status in scheduler.run())
+    assert compiler.max_active == 1
+
+    usage = memory_usage()
+    assert usage is None or 0 <= usage <= 100
+    assert not ResourceLimits().saturated()
+
+
+def test_killed_jobs_are_retried(project: "VirtualProject"):
+    compiler = FakeCompiler(kill={project.join("src", "2.c")})
+    exe = build_graph(project, compiler, amount=8)
+
+    scheduler = JobScheduler(NodesCollector(exe), jobs=8)
+    results = dict(scheduler.run())
+    assert all(status is NodePassed for status in results.values())
+    assert scheduler.killed == 1
+    assert scheduler.jobs < 8
+
+    # The crash messages of compiler drivers are recognized as well
+    error = litemakeCompilationError(
+        "g++", "g++: fatal error: Killed signal terminated program cc1plus"
+    )
+    assert error.killed
+    assert not litemakeCompilationError("g++", "error: expected ';'").killed
+
+
+def test_killed_without_sigkill(monkeypatch):
+    # Windows doesn't have SIGKILL, so only the messages are recognized there
+    monkeypatch.delattr(signal, "SIGKILL")
+    assert not litemakeCompilationError("fake", "error", returncode=-9).killed
+    assert litemakeCompilationError("clang", "unable to execute command: Killed").killed
+
+
+def test_fail_fast_cancels_build(project: "VirtualProject"):
+    compiler = FakeCompiler(fail={project.join("src", "0.c")})
+    exe = build_graph(project, compiler, amount=8)
+    archive = exe.dep_archives[0]
+    objs = archive.dep_objects
+
+    collector = NodesCollector(exe)
+    scheduler = JobScheduler(collector, jobs=2, fail_fast=True)
+    results = dict(scheduler.run())
+
+    assert scheduler.cancelled
+    assert len(results) == len(collector.outdated_nodes)
+    assert results[objs[0]] is NodeFailed
+    assert results[objs[1]] is NodePassed
+    assert all(results[obj] is NodeUnbuilt for obj in objs[2:])
+    assert results[archive] is NodeSkipped
+    assert results[exe] is NodeSkipped
+    assert "failed to generate" in collector.errors[objs[0]].msg[-1]
+
+    # Unbuilt nodes are generated by the next build
+    compiler.fail.clear()
+    results = dict(JobScheduler(NodesCollector(exe), jobs=2, fail_fast=True).run())
+    assert all(status is NodePassed for status in results.values())
+    assert objs[1] not in results
+
+
+class SleepingCompiler(FakeCompiler):
+    """Runs a long subprocess before compiling the sources in 'slow'."""
+
+    def __init__(self, slow: typing.Set[str], **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.slow = slow
+
+    def create_obj(self, src, dest, includes, depfile=None, pch=None) -> None:
+        if src in self.slow:
+            # The shell runs 'sleep' in a subprocess of its own
+            self._exec_cmd("sh", "-c", "sleep 10; true")
+        super().create_obj(src, dest, includes, depfile=depfile, pch=pch)
+
+
+def test_fail_fast_kills_running_compilers(project: "VirtualProject"):
+    slow = project.join("src", "1.c")
+    compiler = SleepingCompiler(
+        slow={slow}, delay=0.2, fail={project.join("src", "0.c")}
+    )
+    exe = build_graph(project, compiler, amount=2)
+    objs = exe.dep_archives[0].dep_objects
+
+    start = time.monotonic()
+    results = dict(JobScheduler(NodesCollector(exe), jobs=2, fail_fast=True).run())
+
+    assert time.monotonic() - start < 5
+    assert results[objs[0]] is NodeFailed
+    assert results[objs[1]] is NodeUnbuilt
+    assert results[exe] is NodeSkipped
@@ -0,0 +1,59 @@
+from litemake.compile import NodesCollector, JobScheduler
+from litemake.compile.graph import ArchiveFileNode, ObjectFileNode
+from litemake.compile.state import BuildState
+
+from .fake import FakeCompiler
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from tests.utils import VirtualProject
+
+
+def build_archive(project: "VirtualProject", state: BuildState, *names: str):
+    compiler = FakeCompiler(delay=0)
+    archive = ArchiveFileNode(project.join("out", "lib.a"), compiler, state=state)
+    for name in names:
+        obj = ObjectFileNode(
+            src=project.add_file(f"{name}.c", f"int {name};"),
+            dest=project.join("out", f"{name}.o"),
+            compiler=compiler,
+            includes=list(),
+            parent=archive,
+            state=state,
+        )
+        archive.add_object(obj)
+    return archive
+
+
+def test_signature_is_recorded(project: "VirtualProject"):
+    state = BuildState(project.join("out", "build.log"))
+    archive = build_archive(project, state, "first", "second")
+    list(JobScheduler(NodesCollector(archive)).run())
+
+    for node in NodesCollector(archive).outdated_nodes + [archive]:
+        assert state.log.get(node.dest).signature == node.signature
+    assert NodesCollector(archive).outdated_nodes == list()
+
+
+def test_changed_command_rebuilds_only_affected_nodes(project: "VirtualProject"):
+    state = BuildState(project.join("out", "build.log"))
+    archive = build_archive(project, state, "first", "second")
+    list(JobScheduler(NodesCollector(archive)).run())
+
+    first, second = archive.dep_objects
+    first.includes = ["include/"]
+
+    assert first.outdated
+    assert not second.outdated
+    assert NodesCollector(archive).outdated_nodes == [first, archive]
+
+
+def test_changed_objects_list_rebuilds_archive(project: "VirtualProject"):
+    state = BuildState(project.join("out", "build.log"))
+    archive = build_archive(project, state, "first", "second")
+    list(JobScheduler(NodesCollector(archive)).run())
+
+    archive.dep_objects.pop()
+    assert archive.outdated
+    assert not any(obj.outdated for obj in archive.dep_objects)
@@ -0,0 +1,73 @@
+import os
+from collections import Counter
+
+import litemake.compile.statcache
+from litemake.compile import NodesCollector, JobScheduler
+from litemake.compile.graph import ArchiveFileNode, ObjectFileNode
+from litemake.compile.state import BuildState
+from litemake.compile.statcache import StatCache
+
+from .fake import FakeCompiler
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from tests.utils import VirtualProject
+
+
+def build_archive(project: "VirtualProject", state: BuildState, amount: int):
+    compiler = FakeCompiler(delay=0)
+    archive = ArchiveFileNode(project.join("out", "lib.a"), compiler, state=state)
+    for i in range(amount):
+        obj = ObjectFileNode(
+            src=project.join(f"{i}.c"),
+            dest=project.join("out", f"{i}.o"),
+            compiler=compiler,
+            includes=list(),
+            parent=archive,
+            state=state,
+        )
+        archive.add_object(obj)
+    return archive
+
+
+def test_stat_cache(project: "VirtualProject"):
+    path = project.add_file("file.txt", "hello")
+    cache = StatCache()
+
+    assert cache.exists(path)
+    assert cache.file_state(path).size == 5
+    assert not cache.exists(project.join("missing.txt"))
+
+    os.remove(path)
+    assert cache.exists(path)
+
+    cache.invalidate(path)
+    assert not cache.exists(path)
+
+
+def test_noop_build_stats_each_file_once(project: "VirtualProject", monkeypatch):
+    for i in range(5):
+        project.add_file(f"{i}.c", f"int x{i};")
+
+    log = project.join("out", "build.log")
+    archive = build_archive(project, BuildState(log), amount=5)
+    list(JobScheduler(NodesCollector(archive)).run())
+    archive.state.close()
+
+    calls = Counter()
+    original = os.stat
+
+    def counting_stat(path, *args, **kwargs):
+        calls[path] += 1
+        return original(path, *args, **kwargs)
+
+    monkeypatch.setattr(litemake.compile.statcache.os, "stat", counting_stat)
+
+    archive = build_archive(project, BuildState(log), amount=5)
+    collector = NodesCollector(archive)
+    assert collector.count_outdated == 0
+    assert collector.outdated_nodes == list()
+
+    assert calls
+    assert max(calls.values()) == 1
@@ -0,0 +1,128 @@
+import os
+
+from litemake.folders import ProjectFolder
+from litemake.compile.compilers import GplusplusCompiler
+from litemake.compile.unity import split_chunks, write_chunk
+
+from tests.utils import change_cwd, execute
+from tests.compilers.base import skip_if_missing_clis
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from tests.utils import VirtualProject
+
+
+def test_split_chunks():
+    sources = ["a.c", "b.cpp", "c.c", "d.c", "e.cpp"]
+    chunks = split_chunks(sources, 2)
+    assert sorted(member for _, members in chunks for member in members) == sorted(
+        sources
+    )
+    assert all(
+        len({os.path.splitext(m)[1] for m in members}) == 1 for _, members in chunks
+    )
+    assert len([members for _, members in chunks if members[0].endswith(".c")]) == 2
+
+    # A new source changes only the chunk it is added to
+    changed = [
+        chunk for chunk in split_chunks(sources + ["f.c"], 2) if chunk not in chunks
+    ]
+    assert len(changed) == 1 and "f.c" in changed[0][1]
+
+
+def test_unchanged_chunk_is_not_written(project: "VirtualProject"):
+    path = project.join("unity", "unity_0.c")
+    assert write_chunk(path, ["a.c", "b.c"])
+    assert not write_chunk(path, ["a.c", "b.c"])
+    assert write_chunk(path, ["a.c"])
+
+    with open(path) as file:
+        assert os.path.abspath("a.c") in file.read()
+
+
+def unity_project(project: "VirtualProject", unity_batch: int) -> None:
+    project.add_file("src/value.h", "#define VALUE 1")
+    for name in ("first", "second", "third"):
+        project.add_file(
+            f"src/{name}.c",
+            f"""
+            #include "value.h"
+            static int {name}_helper() {{ return VALUE; }}
+            int {name}() {{ return {name}_helper(); }}
+        """,
+        )
+
+    project.add_file(
+        "src/main.c",
+        """
+        #include <stdio.h>
+        int first(); int second(); int third();
+        int main() { printf("%d\\n", first() + second() + third()); return 0; }
+    """,
+    )
+
+    project.add_targets_file(
+        f"""
+        [app]
+        sources=["src/*.c"]
+        unity=true
+        unity_batch={unity_batch}
+    """
+    )
+
+
+def test_unity_chunks_replace_sources(project: "VirtualProject"):
+    unity_project(project, unity_batch=3)
+
+    with change_cwd(project.basepath):
+        folder = ProjectFolder(project.basepath)
+        graph = folder.collect("app")
+
+    objects = graph.heads[0].dep_archives[0].dep_objects
+    assert [os.path.basename(o.src) for o in objects] == ["unity_0.c", "unity_1.c"]
+    assert all(o.src.startswith(folder.output.unity) for o in objects)
+    assert sorted(os.path.basename(m) for o in objects for m in o.members) == [
+        "first.c",
+        "main.c",
+        "second.c",
+        "third.c",
+    ]
+
+    # The chunks are written only when they are compiled
+    assert not os.path.exists(folder.output.unity)
+    assert all(o.outdated for o in objects)
+
+
+@skip_if_missing_clis(GplusplusCompiler)
+def test_unity_build(project: "VirtualProject"):
+    unity_project(project, unity_batch=3)
+    project.run("app")
+    assert execute(project.join("app")) == "3\n"
+
+    with change_cwd(project.basepath):
+        graph = ProjectFolder(project.basepath).collect("app")
+    objects = graph.heads[0].dep_archives[0].dep_objects
+    mtimes = [os.path.getmtime(o.dest) for o in objects]
+    assert not any(o.outdated for o in objects)
+
+    # Only the chunk that includes the modified source is compiled again
+    third = project.add_file("src/third.c", "int third() { return 10; }")
+    mtime = max(mtimes) + 10
+    os.utime(third, (mtime, mtime))
+    project.run("app")
+    assert execute(project.join("app")) == "12\n"
+
+    changed = [os.path.getmtime(o.dest) != mtime for o, mtime in zip(objects, mtimes)]
+    assert changed == [third in o.members for o in objects]
+    assert changed.count(True) == 1
+
+    # A new source is added to a single chunk, and the other chunk isn't
+    # compiled again
+    os.utime(third, (0, 0))
+    project.add_file("src/fourth.c", "int fourth() { return 0; }")
+    mtimes = [os.path.getmtime(o.dest) for o in objects]
+    project.run("app")
+    assert execute(project.join("app")) == "12\n"
+    changed = [os.path.getmtime(o.dest) != mtime for o, mtime in zip(objects, mtimes)]
+    assert changed.count(True) == 1
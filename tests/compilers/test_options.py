@@ -0,0 +1,119 @@
+import os
+
+import pytest
+
+from litemake.compile.compilers import CompilerOptions, ClangCompiler, GccCompiler
+
+from .base import _TestCompiler, skip_if_missing_clis
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from tests.utils import VirtualProject
+
+
+def test_link_flags():
+    assert CompilerOptions().link_flags == list()
+    assert CompilerOptions(link_threads=4).link_flags == list()
+    assert CompilerOptions(linker="bfd", split_dwarf=True).link_flags == [
+        "-fuse-ld=bfd"
+    ]
+    assert CompilerOptions(linker="lld", link_threads=4).link_flags == [
+        "-fuse-ld=lld",
+        "-Wl,--threads=4",
+    ]
+    assert CompilerOptions(linker="mold", split_dwarf=True).link_flags == [
+        "-fuse-ld=mold",
+        "-Wl,--gdb-index",
+    ]
+    assert CompilerOptions(linker="gold", link_threads=2).link_flags == [
+        "-fuse-ld=gold",
+        "-Wl,--threads",
+        "-Wl,--thread-count=2",
+    ]
+
+
+def test_selected_linker_is_required():
+    compiler = GccCompiler(options=CompilerOptions(linker="mold"))
+    assert compiler.required_clis == {"gcc", "ar", "ld.mold"}
+    assert GccCompiler.required_clis == {"gcc", "ar"}
+    assert GccCompiler().required_clis == {"gcc", "ar"}
+
+
+GOLD = GccCompiler(options=CompilerOptions(linker="gold", split_dwarf=True))
+
+
+@skip_if_missing_clis(GOLD)
+def test_gold_with_split_dwarf(project: "VirtualProject"):
+    src = project.add_file(
+        "main.c",
+        """
+        #include <stdio.h>
+
+        int main() {
+            printf("Hello from gold!\\n");
+            return 0;
+        }
+    """,
+    )
+
+    main_o = project.join("main.o")
+    main_a = project.join("main.a")
+    main_out = project.join("main.out")
+
+    # Objects with split debug information are compiled in place, so the
+    # '.dwo' file is next to the object
+    GOLD.create_objs([(src, main_o, f"{main_o}.d")], list())
+    assert os.path.isfile(project.join("main.dwo"))
+
+    GOLD.create_archive(main_a, [main_o])
+    GOLD.create_executable(main_out, [main_a])
+    assert _TestCompiler._execute_binary(main_out) == "Hello from gold!\n"
+
+
+def test_gcc_lto_flags():
+    compiler = GccCompiler(options=CompilerOptions(lto="full"))
+    assert "-flto=auto" in compiler.obj_cmd("main.c", "main.o", list())
+    assert "-flto-partition=one" not in compiler.obj_cmd("main.c", "main.o", list())
+    assert "-flto-partition=one" in compiler.executable_cmd("app", ["main.a"])
+
+    # LTO objects are archived with the archiver that understands them
+    assert compiler.archive_cmd("main.a", ["main.o"])[0] == "gcc-ar"
+    assert compiler.required_clis == {"gcc", "gcc-ar"}
+    assert GccCompiler().archive_cmd("main.a", ["main.o"])[0] == "ar"
+
+
+def test_clang_thin_lto_cache():
+    options = CompilerOptions(lto="thin", lto_cache="cache", linker="lld")
+    compiler = ClangCompiler(options=options)
+    assert "-flto=thin" in compiler.obj_cmd("main.c", "main.o", list())
+    assert compiler.executable_cmd("app", ["main.a"])[-2:] == [
+        "-flto=thin",
+        "-Wl,--thinlto-cache-dir=cache",
+    ]
+
+    compiler = ClangCompiler(options=CompilerOptions(lto="full", lto_cache="cache"))
+    assert compiler.executable_cmd("app", ["main.a"])[-1] == "-flto=full"
+
+
+@pytest.mark.parametrize("lto", ["thin", "full"])
+@skip_if_missing_clis(GccCompiler(options=CompilerOptions(lto="thin")))
+def test_gcc_lto_build(project: "VirtualProject", lto: str):
+    compiler = GccCompiler(options=CompilerOptions(lto=lto))
+    main = project.add_file(
+        "main.c",
+        """
+        #include <stdio.h>
+        int square(int);
+        int main() { printf("%d\\n", square(7)); return 0; }
+    """,
+    )
+    square = project.add_file("square.c", "int square(int x) { return x * x; }")
+
+    objs = [project.join("main.o"), project.join("square.o")]
+    compiler.create_objs(
+        [(src, obj, f"{obj}.d") for src, obj in zip((main, square), objs)], list()
+    )
+    compiler.create_archive(project.join("app.a"), objs)
+    compiler.create_executable(project.join("app"), [project.join("app.a")])
+    assert _TestCompiler._execute_binary(project.join("app")) == "49\n"
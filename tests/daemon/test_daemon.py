@@ -0,0 +1,164 @@
+import io
+import os
+from contextlib import contextmanager
+
+import pytest
+
+from litemake.__main__ import forward
+from litemake.daemon import client
+from litemake.daemon.server import DaemonServer
+from litemake.daemon.watcher import FileWatcher
+from litemake.compile.compilers import GccCompiler
+from litemake.exceptions import litemakeError
+
+from tests.utils import change_cwd, execute
+from tests.compilers.base import skip_if_missing_clis
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from tests.utils import VirtualProject
+
+
+skip_if_no_watcher = pytest.mark.skipif(
+    not FileWatcher.available(), reason="file system notifications are required"
+)
+
+
+@contextmanager
+def running_daemon(project: "VirtualProject"):
+    with change_cwd(project.basepath):
+        server = DaemonServer(project.basepath)
+        server.start()
+        try:
+            yield server
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+def daemon_project(project: "VirtualProject") -> None:
+    project.add_file(
+        "src/main.c",
+        """
+        #include <stdio.h>
+        int main() { printf("first\\n"); return 0; }
+    """,
+    )
+    project.add_targets_file('[app]\nsources=["src/*.c"]')
+    project.add_settings_file('compiler="gcc"')
+
+
+@skip_if_no_watcher
+def test_watcher_reports_changes(project: "VirtualProject"):
+    src = project.add_file("src/main.c", "int main;")
+    project.add_file(".hidden/file.c", "int hidden;")
+    project.add_dir("out")
+    watcher = FileWatcher(project.basepath, exclude=[project.join("out")])
+
+    try:
+        assert not watcher.poll()
+
+        project.add_file("src/main.c", "int main = 1;")
+        project.add_file(".hidden/file.c", "int hidden = 1;")
+        changes = watcher.poll()
+        assert changes.modified == {src}
+        assert not changes.files and not changes.folders
+
+        # New folders are watched as soon as they are created
+        sub = project.add_dir("src/sub")
+        assert watcher.poll().folders == {sub}
+        new = project.add_file("src/sub/new.c", "int new;")
+        assert watcher.poll().files == {new}
+
+        # Changes in excluded folders are ignored
+        project.add_file("out/main.o", "object")
+        assert not watcher.poll()
+    finally:
+        watcher.close()
+
+
+def test_no_daemon(project: "VirtualProject"):
+    assert client.connect(project.basepath) is None
+    with change_cwd(project.basepath):
+        assert forward("app") is None
+
+
+def test_private_socket_folder(project: "VirtualProject", monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", project.basepath)
+    folder = project.join(f"litemake-{os.getuid()}")
+
+    assert os.path.dirname(client.socket_path(project.basepath)) == folder
+    assert os.stat(folder).st_mode & 0o777 == 0o700
+
+    # Sockets in a folder that other users can access aren't trusted
+    os.chmod(folder, 0o777)
+    assert client.connect(project.basepath) is None
+    with pytest.raises(litemakeError):
+        DaemonServer(project.basepath)
+
+
+def test_daemon_rejects_other_environment(
+    project: "VirtualProject", monkeypatch, capsys
+):
+    daemon_project(project)
+
+    with running_daemon(project):
+        monkeypatch.setenv(
+            "PATH", os.pathsep.join([project.basepath, os.environ["PATH"]])
+        )
+        with change_cwd(project.basepath):
+            assert forward("app") is None
+        assert "another environment" in capsys.readouterr().out
+
+    # Variables of the terminal don't matter
+    environ = {**os.environ, "COLUMNS": "1"}
+    assert client.environment_digest(environ) == client.environment_digest()
+
+
+@skip_if_no_watcher
+@skip_if_missing_clis(GccCompiler)
+def test_daemon_reuses_graph(project: "VirtualProject"):
+    daemon_project(project)
+    app = project.join("app")
+
+    with running_daemon(project) as server:
+        assert forward() is True
+        assert execute([app]) == "first\n"
+        graph = server.session.graph(server.session.project(), "app")
+        mtime = os.stat(graph.heads[0].dest).st_mtime_ns
+
+        # Nothing has changed, so the same graph is reused, and nothing is
+        # generated again
+        output = io.StringIO()
+        message = {
+            "command": "build",
+            "targets": ["app"],
+            "environment": client.environment_digest(),
+        }
+        answer = client.request(project.basepath, message, output)
+        assert answer == {"result": True}
+        assert server.session.graph(server.session.project(), "app") is graph
+        assert os.stat(graph.heads[0].dest).st_mtime_ns == mtime
+
+        # Modified sources are noticed
+        project.add_file(
+            "src/main.c",
+            """
+            #include <stdio.h>
+            int value();
+            int main() { printf("%d\\n", value()); return 0; }
+        """,
+        )
+        project.add_file("src/value.c", "int value() { return 2; }")
+        assert forward("app") is True
+        assert execute([app]) == "2\n"
+
+        # Errors are raised by the client
+        with pytest.raises(litemakeError):
+            forward("unknown")
+
+        with pytest.raises(litemakeError):
+            DaemonServer(project.basepath)
+
+    assert client.connect(project.basepath) is None
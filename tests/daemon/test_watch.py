@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+from litemake.__main__ import main
+from litemake.daemon.server import BuildSession
+from litemake.daemon.watcher import FileWatcher
+from litemake.compile.compilers import GccCompiler
+
+from tests.utils import change_cwd, execute
+from tests.compilers.base import skip_if_missing_clis
+
+from .test_daemon import daemon_project, skip_if_no_watcher
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from tests.utils import VirtualProject
+
+
+def later(delay: float, func: typing.Callable, *args) -> None:
+    timer = threading.Timer(delay, func, args)
+    timer.start()
+
+
+@skip_if_no_watcher
+@skip_if_missing_clis(GccCompiler)
+def test_watch_rebuilds_on_change(project: "VirtualProject"):
+    daemon_project(project)
+    session = BuildSession(project.basepath)
+
+    with change_cwd(project.basepath):
+        try:
+            assert session.build("app")
+
+            # Installing the executable again doesn't wake the session up
+            assert session.build("app")
+            assert not session.wait(debounce=0.05, timeout=0.3)
+
+            # A burst of changes is merged into a single rebuild
+            later(0.05, project.add_file, "src/value.c", "int value() { return 3; }")
+            later(
+                0.1,
+                project.add_file,
+                "src/main.c",
+                """
+                #include <stdio.h>
+                int value();
+                int main() { printf("%d\\n", value()); return 0; }
+            """,
+            )
+            assert session.wait(debounce=0.2, timeout=5)
+            assert session.build("app")
+            assert execute([project.join("app")]) == "3\n"
+
+            # Changes in the configuration are noticed as well
+            later(0.05, project.add_targets_file, '[other]\nsources=["src/*.c"]')
+            assert session.wait(debounce=0.05, timeout=5)
+            assert session.build("other")
+            assert execute([project.join("other")]) == "3\n"
+        finally:
+            session.close()
+
+
+def test_watch_without_notifications(project: "VirtualProject", monkeypatch, capsys):
+    daemon_project(project)
+    monkeypatch.setattr(FileWatcher, "available", staticmethod(lambda: False))
+
+    with change_cwd(project.basepath), pytest.raises(SystemExit) as error:
+        main(["--watch"])
+    assert error.value.code == 1
+    assert "file system notifications aren't available" in capsys.readouterr().out
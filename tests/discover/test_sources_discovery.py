@@ -0,0 +1,101 @@
+import os
+from glob import glob
+
+import pytest
+
+import litemake.discover
+from litemake.discover import SourcesDiscovery
+
+from tests.utils import change_cwd
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from tests.utils import VirtualProject
+
+
+@pytest.fixture
+def tree(project: "VirtualProject") -> "VirtualProject":
+    for path in (
+        "main.c",
+        "README.md",
+        ".hidden.c",
+        "src/a.c",
+        "src/b.cpp",
+        "src/nested/c.c",
+        "src/nested/deep/d.c",
+        "src/.private/e.c",
+        "tests/test_a.c",
+    ):
+        project.add_file(path, "int x;")
+    project.add_dir("src/empty.c")  # a directory that matches '*.c'
+    return project
+
+
+def expected(pattern: str) -> typing.List[str]:
+    return sorted(p for p in glob(pattern, recursive=True) if os.path.isfile(p))
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [
+        "*.c",
+        "*",
+        ".*",
+        "src/*.c",
+        "src/**/*.c",
+        "**/*.c",
+        "src/**",
+        "src/*/*.c",
+        "src/.private/*.c",
+        "src/nested/deep/d.c",
+        "src/missing.c",
+        "missing/**/*.c",
+        "src/[ab].c*",
+        "*/nested/**/*.c",
+    ],
+)
+def test_same_as_glob(tree: "VirtualProject", pattern: str):
+    discovery = SourcesDiscovery()
+    with change_cwd(tree.basepath):
+        assert discovery.glob(pattern) == expected(pattern)
+    assert discovery.glob(tree.join(pattern)) == expected(tree.join(pattern))
+
+
+def test_glob_many(tree: "VirtualProject"):
+    patterns = [tree.join("src", "**", "*.c"), tree.join("tests", "*.c")]
+    assert SourcesDiscovery().glob_many(patterns) == [expected(p) for p in patterns]
+
+
+def test_only_changed_directories_are_listed(tree: "VirtualProject", monkeypatch):
+    listed = list()
+    original = os.scandir
+
+    def counting_scandir(path):
+        listed.append(os.path.relpath(path, tree.basepath))
+        return original(path)
+
+    monkeypatch.setattr(litemake.discover.os, "scandir", counting_scandir)
+
+    pattern = tree.join("src", "**", "*.c")
+    cache = tree.join("out", "sources.json")
+
+    first = SourcesDiscovery(cache)
+    found = first.glob(pattern)
+    first.save()
+    assert listed
+
+    # Nothing has changed, so nothing is listed again
+    listed.clear()
+    assert SourcesDiscovery(cache).glob(pattern) == found
+    assert listed == list()
+
+    # Only the changed directory is listed again
+    tree.add_file("src/nested/new.c", "int y;")
+    listed.clear()
+    found = SourcesDiscovery(cache).glob(pattern)
+    assert listed == [os.path.join("src", "nested")]
+
+    monkeypatch.undo()
+    assert found == expected(pattern)
+    assert tree.join("src", "nested", "new.c") in found
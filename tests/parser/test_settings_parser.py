@@ -1,5 +1,9 @@
+import pytest
+
 from litemake.parse import SettingsParser
+from litemake.compile.compilers import CompilerOptions
 from litemake.constants import SETTINGS_FILENAME, CACHE_FOLDERNAME
+from litemake.exceptions import litemakeConfigError
 
 from tests.utils import change_cwd
 
@@ -60,3 +64,133 @@ def test_no_settings_file(project: "VirtualProject"):
         assert info.home == project.basepath
         assert info.output == project.join(CACHE_FOLDERNAME)
         assert info.compiler.name == "g++"
+
+
+def test_staleness_method(project: "VirtualProject"):
+    path = project.add_settings_file("staleness='Hash'")
+    assert SettingsParser(path).staleness == "hash"
+
+
+def test_unknown_staleness_method(project: "VirtualProject"):
+    path = project.add_settings_file("staleness='size'")
+    with pytest.raises(litemakeConfigError):
+        SettingsParser(path)
+
+
+def test_cache_settings(project: "VirtualProject", monkeypatch):
+    monkeypatch.setenv("LITEMAKE_CACHE_DIR", project.join("user-cache"))
+
+    info = SettingsParser(project.add_settings_file(""))
+    assert not info.cache.enabled
+    assert info.cache.path == project.join("user-cache")
+
+    path = project.add_settings_file(
+        """
+        [cache]
+        enabled=true
+        path="cache/"
+        max_size=100
+    """
+    )
+    info = SettingsParser(path)
+    assert info.cache.enabled
+    assert info.cache.path == project.join("cache/")
+    assert info.cache.max_size == 100
+
+
+def test_batch_size(project: "VirtualProject"):
+    assert SettingsParser(project.add_settings_file("")).batch_size == 1
+    assert SettingsParser(project.add_settings_file("batch_size=8")).batch_size == 8
+
+    with pytest.raises(litemakeConfigError):
+        SettingsParser(project.add_settings_file("batch_size=0"))
+
+
+def test_thin_archives(project: "VirtualProject"):
+    assert not SettingsParser(project.add_settings_file("")).thin_archives
+    settings = SettingsParser(project.add_settings_file("thin_archives=true"))
+    assert settings.thin_archives
+
+
+def test_compiler_options(project: "VirtualProject"):
+    options = SettingsParser(project.add_settings_file("")).compiler_options
+    assert options == CompilerOptions()
+
+    settings = SettingsParser(
+        project.add_settings_file(
+            """
+            linker="lld"
+            link_threads=8
+            split_dwarf=true
+        """
+        )
+    )
+    assert settings.compiler_options == CompilerOptions(
+        linker="lld", link_threads=8, split_dwarf=True
+    )
+
+    with pytest.raises(litemakeConfigError):
+        SettingsParser(project.add_settings_file('linker="unknown"'))
+
+
+def test_profiles(project: "VirtualProject"):
+    settings = SettingsParser(project.add_settings_file(""))
+    assert settings.profile == "debug"
+    assert set(settings.profiles) == {"debug", "release"}
+    assert "-DNDEBUG" in settings.profiles["release"].flags
+
+    settings = SettingsParser(
+        project.add_settings_file(
+            """
+            profile="asan"
+
+            [profiles.asan]
+            flags=["-fsanitize=address"]
+            link_flags=["-fsanitize=address"]
+
+            [profiles.release]
+            flags=["-O3"]
+        """
+        )
+    )
+    assert settings.profile == "asan"
+    assert settings.profiles["asan"].link_flags == ["-fsanitize=address"]
+    assert settings.profiles["release"].flags == ["-O3"]
+    assert settings.profiles["release"].link_flags == list()
+
+    with pytest.raises(litemakeConfigError):
+        SettingsParser(project.add_settings_file("[profiles.'..']"))
+
+
+def test_lto(project: "VirtualProject"):
+    settings = SettingsParser(project.add_settings_file(""))
+    assert settings.compiler_options.lto == "none"
+
+    settings = SettingsParser(
+        project.add_settings_file(
+            """
+            lto="thin"
+
+            [profiles.release]
+            flags=["-O2"]
+            lto="full"
+        """
+        )
+    )
+    assert settings.compiler_options.lto == "thin"
+    assert settings.profiles["release"].lto == "full"
+    assert settings.profiles["debug"].lto == ""
+
+    with pytest.raises(litemakeConfigError):
+        SettingsParser(project.add_settings_file('lto="fast"'))
+
+
+def test_pools(project: "VirtualProject"):
+    info = SettingsParser(project.add_settings_file(""))
+    assert info.pools == {"compile": 0, "archive": 0, "link": 0}
+
+    info = SettingsParser(project.add_settings_file("[pools]\nlink=2"))
+    assert info.pools["link"] == 2
+
+    with pytest.raises(litemakeConfigError):
+        SettingsParser(project.add_settings_file("[pools]\nlink=-1"))
@@ -34,3 +34,40 @@ def test_target_names(project: "VirtualProject"):
     assert not test.library
     assert test.sources == ["src/**/*.c", "tests/**/*.c"]
     assert test.include == []
+
+
+def test_unity_options(project: "VirtualProject"):
+    path = project.add_targets_file(
+        """
+        [build]
+        sources=["src/*.cpp"]
+
+        [jumbo]
+        sources=["src/*.cpp"]
+        unity=true
+        unity_batch=16
+    """
+    )
+
+    info = TargetsParser(path)
+    assert not info.target("build").unity
+    assert info.target("build").unity_batch == 8
+    assert info.target("jumbo").unity
+    assert info.target("jumbo").unity_batch == 16
+
+
+def test_pch_option(project: "VirtualProject"):
+    path = project.add_targets_file(
+        """
+        [build]
+        sources=["src/*.cpp"]
+
+        [fast]
+        sources=["src/*.cpp"]
+        pch="include/common.h"
+    """
+    )
+
+    info = TargetsParser(path)
+    assert info.target("build").pch == ""
+    assert info.target("fast").pch == "include/common.h"
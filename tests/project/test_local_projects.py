@@ -4,10 +4,14 @@ if typing.TYPE_CHECKING:
     from tests.utils import VirtualProject
 
 
-from tests.utils import execute
+import os
+import pytest
+
+from tests.utils import change_cwd, execute
 
 from tests.compilers.base import skip_if_missing_clis
-from litemake.compile.compilers import GplusplusCompiler
+from litemake.__main__ import main, parse_args
+from litemake.compile.compilers import GccCompiler, GplusplusCompiler
 
 
 @skip_if_missing_clis(GplusplusCompiler)
@@ -37,3 +41,86 @@ def test_basic_hello_world(project: "VirtualProject"):
 
     project.run("build")
     assert execute(project.join("build")) == "Hello from litemake!\n"
+
+
+def test_build_without_daemon_support(monkeypatch):
+    import litemake.__main__ as cli
+
+    def forward(*targets, **options):
+        raise AssertionError("the build must not be forwarded")
+
+    built = list()
+
+    def make(*targets, **options):
+        built.append(targets)
+        return True
+
+    monkeypatch.setattr(cli.client, "available", lambda: False)
+    monkeypatch.setattr(cli, "forward", forward)
+    monkeypatch.setattr(cli, "make", make)
+    main(["app"])
+    assert built == [("app",)]
+
+
+def test_keep_going_by_default():
+    assert parse_args([]).fail_fast is False
+    assert parse_args(["-k"]).fail_fast is False
+    assert parse_args(["--fail-fast"]).fail_fast is True
+
+
+@skip_if_missing_clis(GccCompiler)
+def test_failed_build_exit_status(project: "VirtualProject"):
+    project.add_file("src/main.c", "int main() { return missing; }")
+    project.add_targets_file('[app]\nsources=["src/*.c"]')
+    project.add_settings_file('compiler="gcc"')
+
+    with change_cwd(project.basepath):
+        for args in (["--no-daemon"], ["--no-daemon", "--fail-fast"]):
+            with pytest.raises(SystemExit) as error:
+                main(args)
+            assert error.value.code == 1
+
+        project.add_file("src/main.c", "int main() { return 0; }")
+        main(["--no-daemon"])
+
+
+@skip_if_missing_clis(GccCompiler)
+def test_targets_named_as_commands(project: "VirtualProject"):
+    project.add_file("src/main.c", "int main() { return 0; }")
+    project.add_targets_file(
+        '[daemon]\nsources=["src/*.c"]\n[pgo]\nsources=["src/*.c"]'
+    )
+    project.add_settings_file('compiler="gcc"')
+
+    with change_cwd(project.basepath):
+        main(["--no-daemon", "--", "daemon", "pgo"])
+    assert os.path.isfile(project.join("daemon"))
+    assert os.path.isfile(project.join("pgo"))
+
+
+@skip_if_missing_clis(GccCompiler)
+def test_failed_build_keeps_installed_executable(project: "VirtualProject"):
+    project.add_file(
+        "src/main.c",
+        """
+        #include <stdio.h>
+        #ifdef NDEBUG
+        int main() { puts("release"); }
+        #else
+        int main() { puts("debug"); }
+        #endif
+    """,
+    )
+    project.add_targets_file('[app]\nsources=["src/*.c"]')
+    project.add_settings_file('compiler="gcc"')
+
+    project.run("app", profile="debug")
+    project.run("app", profile="release")
+    assert execute(project.join("app")) == "release\n"
+
+    # The debug executable is outdated, so the failed build doesn't install it
+    project.add_file("src/main.c", "int main() { return missing; }")
+    with change_cwd(project.basepath):
+        with pytest.raises(SystemExit):
+            main(["--no-daemon", "--profile", "debug", "app"])
+    assert execute(project.join("app")) == "release\n"
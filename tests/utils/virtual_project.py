@@ -56,6 +56,6 @@ class VirtualProject:
     def join(self, *paths) -> str:
         return os.path.join(self.basepath, *paths)
 
-    def run(self, *targets: typing) -> None:
+    def run(self, *targets: typing, profile: str = None) -> None:
         with tests.utils.change_cwd(self.basepath):
-            make(*targets)
+            make(*targets, profile=profile)